@@ -1,76 +1,130 @@
-
-from flask import Flask, render_template, Response
-import cv2
-from wsafety.detector import PersonDetector
-from wsafety.gender import GenderEstimator
-from wsafety.risk import compute_risk_events, risk_level
-from wsafety.utils import center_of_box
-from wsafety.viz import draw_frame
-from wsafety.alert import RatioAlert
-from collections import defaultdict, deque
+import argparse
+import os
 import time
 
-app = Flask(__name__)
-
-# Initialize components
-detector = PersonDetector(model_name="yolov8n.pt")
-gender_est = GenderEstimator(providers=["CPUExecutionProvider"])
-ratio_alert = RatioAlert(threshold=3.0, cooldown_seconds=10.0, require_female=True)
-
-# State
-track_gender = defaultdict(lambda: "U")
-track_gender_conf = defaultdict(float)
-track_history = defaultdict(lambda: deque(maxlen=12))
-faces_cache = []
-
-frame_idx = 0
-t_prev = time.time()
-
-def generate_frames():
-    global frame_idx, t_prev
-    for frame in detector.track_stream(source=0, conf=0.35, iou=0.45, tracker="bytetrack.yaml"):
-        if frame is None:
-            continue
-
-        H, W = frame.shape[:2]
-        tracks = detector.current_tracks
+from flask import Flask, render_template, Response, abort, jsonify, request
+from wsafety.cameras import CameraConfig, CameraRegistry, load_alert_settings, load_history_settings
+from wsafety.offline import is_video_file, run_batch
 
-        for tid, tr in tracks.items():
-            track_history[tid].append(center_of_box(tr["xyxy"]))
-
-        if frame_idx % 5 == 0:
-            faces_cache[:] = gender_est.get_faces(frame)
-        gender_est.assign_genders(tracks, faces_cache, track_gender, track_gender_conf)
-
-        male_count = sum(1 for tid in tracks if track_gender[tid] == "M")
-        female_count = sum(1 for tid in tracks if track_gender[tid] == "F")
-        events, score = compute_risk_events(tracks, track_gender, track_history, frame.shape)
-        level = risk_level(score)
-
-        ratio_alert.update(male_count, female_count)
-
-        t_now = time.time()
-        dt = max(1e-6, t_now - t_prev)
-        t_prev = t_now
-        fps = 1.0 / dt
-        t_prev = t_now
-
-        frame_vis = draw_frame(frame, tracks, track_gender, male_count, female_count, events, level, score, fps)
+app = Flask(__name__)
 
-        # Encode frame to JPEG
-        ret, buffer = cv2.imencode('.jpg', frame_vis)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        frame_idx += 1
+# Camera registry: one isolated worker per configured stream (see cameras.example.yaml)
+CONFIG_PATH = os.environ.get("WSAFETY_CAMERAS", "cameras.yaml")
+cameras = CameraRegistry.from_config(CONFIG_PATH)
+
+def _mjpeg(cam_id=None):
+    if cam_id is not None and cam_id not in cameras:
+        abort(404)
+    # ?tier=N starts at a smaller stream tier (0 = full size); ?adaptive=0 pins the client to it;
+    # ?raw=1 sends frames without overlays (at raw_video_fps) for pages that draw them from /overlay
+    tier = request.args.get('tier', 0, type=int)
+    adaptive = request.args.get('adaptive', '1') != '0'
+    worker = cameras.get(cam_id)
+    frames = worker.raw_frames if request.args.get('raw') == '1' else worker.frames
+    return Response(frames(tier, adaptive), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # ?overlay=client: raw video plus overlays drawn in the browser from /overlay metadata
+    client_overlay = request.args.get('overlay') == 'client'
+    return render_template('index.html', camera_ids=cameras.ids(), client_overlay=client_overlay)
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return _mjpeg()
+
+@app.route('/video_feed/<cam_id>')
+def camera_feed(cam_id):
+    return _mjpeg(cam_id)
+
+@app.route('/overlay/<cam_id>')
+def overlay(cam_id):
+    # Server-Sent Events: boxes, genders, counts, risk and events of every analysed frame
+    if cam_id not in cameras:
+        abort(404)
+    return Response(cameras.get(cam_id).overlay_events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/history/<cam_id>')
+def history(cam_id):
+    # Counts, ratio and risk over time plus stored alerts. ?start=&end= are unix seconds, or seconds
+    # relative to now when negative (default: the last hour); ?step=1s|1m|1h (default: by range)
+    if cam_id not in cameras or cameras.history is None:
+        abort(404)
+    now = time.time()
+    start = request.args.get('start', -3600.0, type=float)
+    end = request.args.get('end', 0.0, type=float)
+    start, end = (now + start if start <= 0 else start), (now + end if end <= 0 else end)
+    try:
+        return jsonify(cameras.query_history(cam_id, start, end, request.args.get('step')))
+    except ValueError as exc:
+        abort(400, str(exc))
+
+@app.route('/health')
+def health():
+    return jsonify(cameras.health())
+
+@app.route('/events')
+def events():
+    # Server-Sent Events: live alerts for the panel; ?camera=<id> for one camera
+    cam_id = request.args.get('camera')
+    if cam_id is not None and cam_id not in cameras:
+        abort(404)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(cameras.alert_events(cam_id, last_id), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text exposition: per-stage latency histograms, drops, queue depths, live tracks
+    return Response(cameras.metrics_text(), mimetype='text/plain; version=0.0.4')
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Women safety analytics: live server, or headless batch processing of video files.")
+    ap.add_argument("--source", nargs="+", help="video files to process headless, or one webcam index / stream URL to serve")
+    ap.add_argument("--save", help="annotated video: a file for one source, a directory for several")
+    ap.add_argument("--report", default="reports", help="directory for per-frame counts and risk events (CSV)")
+    ap.add_argument("--model", default="yolov8n.pt")
+    ap.add_argument("--backend", choices=["ultralytics", "onnxruntime"], default="ultralytics", help="detector runtime")
+    ap.add_argument("--quantize", choices=["dynamic", "static"], help="INT8 quantization (onnxruntime backend)")
+    ap.add_argument("--calibration", help="video file or image directory to calibrate --quantize static with")
+    ap.add_argument("--face_every_n", type=int, default=5, help="frames between face analyses of the same track")
+    ap.add_argument("--workers", type=int, default=None, help="parallel chunk processes (default: one per core)")
+    ap.add_argument("--chunk_seconds", type=float, default=120.0, help="length of the chunks files are split into")
+    ap.add_argument("--overlap_seconds", type=float, default=4.0, help="warm-up before each chunk for tracks and genders")
+    ap.add_argument("--port", type=int, default=5000)
+    return ap.parse_args()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    args = parse_args()
+    if args.source and all(is_video_file(s) for s in args.source):
+        run_batch(
+            args.source,
+            save=args.save,
+            report_dir=args.report,
+            workers=args.workers,
+            chunk_seconds=args.chunk_seconds,
+            overlap_seconds=args.overlap_seconds,
+            model=args.model,
+            backend=args.backend,
+            quantize=args.quantize,
+            calibration=args.calibration,
+            face_every_n=args.face_every_n,
+        )
+    else:
+        if args.save:
+            raise SystemExit("--save needs video files as --source")
+        if args.source:
+            if len(args.source) > 1:
+                raise SystemExit("Serve one live source at a time; use cameras.yaml for several")
+            cameras.stop()
+            cfg = CameraConfig(
+                "0",
+                source=args.source[0],
+                model=args.model,
+                backend=args.backend,
+                quantize=args.quantize,
+                calibration=args.calibration,
+                face_every_n=args.face_every_n,
+            )
+            # The config file's cameras are replaced; its alert sinks and history still apply
+            cameras = CameraRegistry([cfg], load_alert_settings(CONFIG_PATH), load_history_settings(CONFIG_PATH))
+        app.run(host='0.0.0.0', port=args.port, debug=True)
@@ -0,0 +1,102 @@
+"""
+Face-to-track matching benchmark: the original per-track loop vs the vectorized one-to-one
+matcher in GenderEstimator.assign_genders, on crowds with overlapping person boxes.
+
+    python benchmarks/bench_assign.py --sizes 10 50 150 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from wsafety import gender as gender_mod  # noqa: E402
+from wsafety.utils import center_of_box, distance, point_in_box  # noqa: E402
+
+
+class StubFace:
+    """Stands in for an InsightFace Face: bbox, gender (0=F, 1=M) and det_score."""
+
+    def __init__(self, bbox, gender, det_score):
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.gender = gender
+        self.det_score = det_score
+
+
+def reference_assign(tracks, faces, track_gender, track_gender_conf):
+    """The original nested loop; returns how many tracks took a face already used by another track."""
+    processed = []
+    for f in faces:
+        x1, y1, x2, y2 = [int(v) for v in f.bbox]
+        g, gconf = gender_mod._map_gender(f)
+        processed.append((((x1 + x2) // 2, (y1 + y2) // 2), g, gconf))
+    used = defaultdict(int)
+    for tid, tr in tracks.items():
+        best, best_i, best_dist = None, None, 1e9
+        tctr = center_of_box(tr["xyxy"])
+        for i, (fctr, g, gconf) in enumerate(processed):
+            if point_in_box(fctr, tr["xyxy"]):
+                d = distance(tctr, fctr)
+                if d < best_dist:
+                    best, best_i, best_dist = (g, gconf), i, d
+        if best is not None:
+            used[best_i] += 1
+            g, gconf = best
+            if g != "U" and (gconf >= track_gender_conf[tid] or track_gender[tid] == "U"):
+                track_gender[tid] = g
+                track_gender_conf[tid] = gconf
+    return sum(n - 1 for n in used.values())
+
+
+def make_crowd(n, W=1920, H=1080, seed=0, spacing=1.0):
+    """n people with a face each in the upper part of the box; spacing < 1 makes boxes overlap more."""
+    rng = random.Random(seed)
+    cols = max(1, int((n * W / H) ** 0.5))
+    tracks, faces = {}, []
+    for k in range(n):
+        r, c = divmod(k, cols)
+        cx = (c + 0.5) * W / cols * spacing + rng.gauss(0, 10)
+        cy = (r + 0.5) * H / max(1, (n + cols - 1) // cols) * spacing + rng.gauss(0, 10)
+        w, h = 90.0, 240.0
+        tracks[1000 + k] = {"xyxy": [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], "conf": 0.9}
+        fx, fy = cx + rng.gauss(0, 6), cy - h * 0.35
+        faces.append(StubFace([fx - 12, fy - 14, fx + 12, fy + 14], rng.choice([0, 1]), rng.uniform(0.5, 0.95)))
+    return tracks, faces
+
+
+def timeit(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 150, 300])
+    ap.add_argument("--spacing", type=float, default=0.6, help="<1 packs people closer (more overlapping boxes)")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    # assign_genders does not touch the model, so skip FaceAnalysis construction
+    est = gender_mod.GenderEstimator.__new__(gender_mod.GenderEstimator)
+    est.memory = None
+    solver = f"lap.lapjv up to {gender_mod.LAP_MAX_SIZE} a side, greedy above" if gender_mod.lap is not None else "greedy"
+    print(f"matcher: {solver}")
+    print(f"{'tracks':>7} {'loop ms':>9} {'vector ms':>10} {'speedup':>8} {'loop dup faces':>15}")
+    for n in args.sizes:
+        tracks, faces = make_crowd(n, spacing=args.spacing)
+        dups = reference_assign(tracks, faces, defaultdict(lambda: "U"), defaultdict(float))
+        t_ref = timeit(lambda: reference_assign(tracks, faces, defaultdict(lambda: "U"), defaultdict(float)), args.repeat)
+        t_new = timeit(lambda: est.assign_genders(tracks, faces, defaultdict(lambda: "U"), defaultdict(float)), args.repeat)
+        print(f"{n:>7} {t_ref:>9.3f} {t_new:>10.3f} {t_ref / t_new:>7.1f}x {dups:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Detection backend benchmark on recorded clips: the default Ultralytics backend against the
+ONNX Runtime backend (person-only export in fp32, and INT8 with dynamic or static quantization)
+at several intra-op thread counts.
+
+Every backend sees the same decoded frames (decoding is not timed) through track_frame, i.e.
+detection plus ByteTrack as the live pipeline runs it, starting fresh trackers per clip.
+Reports frames/s and p50/p99 latency per frame, and agreement with the Ultralytics tracks per frame
+(boxes matched at IoU >= 0.5): precision, recall, mean IoU of the matches and the mean absolute
+difference in person count, the number the risk heuristics depend on.
+
+    python benchmarks/bench_detector.py --video clips/gate.mp4 clips/platform.mp4 --threads 1 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from wsafety.models import registry  # noqa: E402
+from wsafety.utils import iou_xyxy  # noqa: E402
+
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Could not read frames from {path}")
+    return frames
+
+
+def run(detector, clips, conf, iou):
+    """Boxes per frame of every clip, and the seconds each frame took."""
+    boxes, took = [], []
+    for frames in clips:
+        for i, frame in enumerate(frames):
+            t0 = time.perf_counter()
+            tracks = detector.track_frame(frame, conf, iou, persist=i > 0)
+            took.append(time.perf_counter() - t0)
+            boxes.append(tracks.xyxy.copy())
+    return boxes, np.array(took)
+
+
+def agreement(reference, boxes, threshold=0.5):
+    """Precision, recall and mean IoU of greedy per-frame matches, and mean |count difference|."""
+    matched, n_ref, n_out, ious, count_diff = 0, 0, 0, [], []
+    for ref, out in zip(reference, boxes):
+        n_ref += len(ref)
+        n_out += len(out)
+        count_diff.append(abs(len(ref) - len(out)))
+        pairs = sorted(((iou_xyxy(r, o), i, j) for i, r in enumerate(ref) for j, o in enumerate(out)), reverse=True)
+        used_r, used_o = set(), set()
+        for v, i, j in pairs:
+            if v < threshold:
+                break
+            if i in used_r or j in used_o:
+                continue
+            used_r.add(i)
+            used_o.add(j)
+            ious.append(v)
+        matched += len(used_r)
+    return {
+        "precision": matched / n_out if n_out else 1.0,
+        "recall": matched / n_ref if n_ref else 1.0,
+        "iou": float(np.mean(ious)) if ious else 0.0,
+        "count_diff": float(np.mean(count_diff)),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--video", nargs="+", required=True, help="recorded clips")
+    ap.add_argument("--model", default="yolov8n.pt")
+    ap.add_argument("--frames", type=int, default=300, help="frames per clip")
+    ap.add_argument("--variants", nargs="+", default=["fp32", "dynamic", "static"], choices=["fp32", "dynamic", "static"])
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4], help="intra-op thread counts for ONNX Runtime")
+    ap.add_argument("--calibration", help="frames for static quantization (default: the first clip)")
+    ap.add_argument("--conf", type=float, default=0.35)
+    ap.add_argument("--iou", type=float, default=0.45)
+    args = ap.parse_args()
+
+    clips = [load_frames(path, args.frames) for path in args.video]
+    n = sum(len(c) for c in clips)
+    print(f"{n} frames from {len(clips)} clip(s)")
+
+    reference, took = run(registry.person_detector(args.model), clips, args.conf, args.iou)
+    rows = [("ultralytics", "-", took, None)]
+    for variant in args.variants:
+        quantize = None if variant == "fp32" else variant
+        calibration = (args.calibration or args.video[0]) if variant == "static" else None
+        for threads in args.threads:
+            detector = registry.person_detector(args.model, backend="onnxruntime", quantize=quantize, calibration=calibration, intra_op_threads=threads)
+            boxes, took = run(detector, clips, args.conf, args.iou)
+            rows.append((f"onnxruntime/{variant}", str(threads), took, agreement(reference, boxes)))
+
+    print(f"{'backend':>20} {'threads':>7} {'frames/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'precision':>9} {'recall':>7} {'IoU':>6} {'|dcount|':>8}")
+    for name, threads, took, acc in rows:
+        line = f"{name:>20} {threads:>7} {len(took) / took.sum():>9.1f} {np.percentile(took, 50) * 1000:>8.2f} {np.percentile(took, 99) * 1000:>8.2f}"
+        if acc is None:
+            line += f" {'(reference)':>9}"
+        else:
+            line += f" {acc['precision']:>9.3f} {acc['recall']:>7.3f} {acc['iou']:>6.3f} {acc['count_diff']:>8.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
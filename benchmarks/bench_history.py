@@ -0,0 +1,114 @@
+"""
+History store benchmark: what keeping per-camera history costs the frame loop and the writer,
+and how fast the dashboard's range queries are once the database holds a month of data.
+
+Reports the per-frame FrameAggregator.add cost, the cost of one HistoryStore.flush (one second of
+buckets for every camera, rolled up into minutes and hours), the size of the database after
+filling `--days` of per-second history, and query latency for the last hour / day / month at the
+resolution the /history endpoint would pick, and at each fixed resolution.
+
+    python benchmarks/bench_history.py --cameras 8 --days 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from wsafety.history import FrameAggregator, HistoryStore  # noqa: E402
+
+
+def bench_add(frames, fps=30.0):
+    agg = FrameAggregator(deque())
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, (frames, 4)).tolist()
+    t0 = time.perf_counter()
+    for i, (m, f, s, e) in enumerate(values):
+        agg.add(i / fps, m, f, s, e % 2)
+    return (time.perf_counter() - t0) / frames * 1e6
+
+
+def fill(store, cameras, days, batch_seconds=3600):
+    """Per-second buckets for `days` days ending now, written in batches like the writer thread."""
+    rng = np.random.default_rng(1)
+    inboxes = {f"cam{c}": deque() for c in range(cameras)}
+    for cam, inbox in inboxes.items():
+        store.add_inbox(cam, inbox)
+    end = int(time.time())
+    start = end - int(days * 86400)
+    for t0 in range(start, end, batch_seconds):
+        ts = np.arange(t0, min(t0 + batch_seconds, end))
+        for inbox in inboxes.values():
+            male = rng.integers(0, 10, len(ts))
+            female = rng.integers(0, 5, len(ts))
+            score = rng.integers(0, 12, len(ts))
+            for t, m, f, s in zip(ts.tolist(), male.tolist(), female.tolist(), score.tolist()):
+                inbox.append((t, 15, 15 * m, 15 * f, 15 * s, 0, m + 1, f + 1, s + 2))
+        store.flush()
+    return end
+
+
+def bench_flush(store, cameras, rounds=50):
+    """One second of buckets for every camera per flush, as written live."""
+    inboxes = {f"live{c}": deque() for c in range(cameras)}
+    for cam, inbox in inboxes.items():
+        store.add_inbox(cam, inbox)
+    t = int(time.time()) + 10
+    took = []
+    for i in range(rounds):
+        for inbox in inboxes.values():
+            inbox.append((t + i, 15, 45, 15, 60, 0, 3, 1, 5))
+        t0 = time.perf_counter()
+        store.flush()
+        took.append(time.perf_counter() - t0)
+    return np.array(took) * 1000.0
+
+
+def bench_query(store, camera, start, end, step, repeats=20):
+    took = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = store.query(camera, start, end, step)
+        took.append(time.perf_counter() - t0)
+    return float(np.median(took) * 1000.0), len(result["points"]), result["step"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--cameras", type=int, default=8)
+    ap.add_argument("--days", type=float, default=30.0)
+    ap.add_argument("--frames", type=int, default=200_000, help="frames for the per-frame add cost")
+    args = ap.parse_args()
+
+    print(f"FrameAggregator.add: {bench_add(args.frames):.2f} us/frame")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        store = HistoryStore(path, retention={"1s": None, "1m": None, "alerts": None})
+        t0 = time.perf_counter()
+        end = fill(store, 1, args.days)
+        took = time.perf_counter() - t0
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6
+        print(f"filled {args.days:g} days of per-second history for one camera in {took:.1f}s ({size:.0f} MB)")
+
+        flush = bench_flush(store, args.cameras)
+        print(f"flush of one second for {args.cameras} cameras: p50 {np.percentile(flush, 50):.2f} ms, p99 {np.percentile(flush, 99):.2f} ms")
+
+        print(f"{'range':>8} {'step':>5} {'points':>7} {'query ms':>9}")
+        for label, span in (("hour", 3600), ("day", 86400), ("week", 7 * 86400), ("month", int(args.days * 86400))):
+            for step in (None, "1s", "1m", "1h"):
+                if step == "1s" and span > 86400:
+                    continue
+                ms, n, picked = bench_query(store, "cam0", end - span, end, step)
+                print(f"{label:>8} {picked + ('*' if step is None else ''):>5} {n:>7} {ms:>9.2f}")
+        store.stop()
+    print("* resolution picked by /history for the range")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Offline pipeline benchmark: per-stage latency (p50 / p99) and throughput across crowd sizes and
+resolutions, without a camera, model weights or network access.
+
+Stages
+  parse    detector output arrays (with some non-person classes) into current_tracks
+  risk     compute_risk_events on a synthetic crowd
+  assign   GenderEstimator.assign_genders with stub faces
+  ratio    RatioAlert.update
+  draw     draw_frame into a reused buffer
+  encode   JPEG encoding of the rendered frame (stream tier 0)
+  loop     AnalyticsPipeline.process + encode over a moving crowd, with stub face analysis;
+           frames come from --video when given (decoded up front), else synthetic noise
+
+    python benchmarks/bench_pipeline.py --sizes 10 50 150 --resolutions 1280x720 1920x1080
+    python benchmarks/bench_pipeline.py --json base.json                 # save a baseline
+    python benchmarks/bench_pipeline.py --compare base.json --tolerance 1.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from bench_assign import StubFace, make_crowd  # noqa: E402
+from bench_risk import make_scene  # noqa: E402
+from wsafety.alert import RatioAlert  # noqa: E402
+from wsafety.detector import parse_track_arrays  # noqa: E402
+from wsafety.encoder import DEFAULT_TIERS, encode_mjpeg  # noqa: E402
+from wsafety.gender import GenderEstimator  # noqa: E402
+from wsafety.pipeline import AnalyticsPipeline  # noqa: E402
+from wsafety.risk import compute_risk_events, risk_level  # noqa: E402
+from wsafety.tracks import TrackStore  # noqa: E402
+from wsafety.viz import draw_frame  # noqa: E402
+
+STAGES = ("parse", "risk", "assign", "ratio", "draw", "encode", "loop")
+
+
+def stub_estimator(seed=0):
+    """GenderEstimator without InsightFace: a stub face in the upper part of ~70% of the crops."""
+    rng = random.Random(seed)
+    est = GenderEstimator.__new__(GenderEstimator)
+    est.memory = None
+
+    def get_faces_in_crops(frame, boxes, **kwargs):
+        faces = []
+        for x1, y1, x2, y2 in boxes:
+            if rng.random() < 0.3:  # back turned / too small
+                continue
+            fx, fy = (x1 + x2) / 2, y1 + 0.15 * (y2 - y1)
+            faces.append(StubFace([fx - 12, fy - 14, fx + 12, fy + 14], rng.choice([0, 1]), rng.uniform(0.5, 0.95)))
+        return faces
+
+    est.get_faces_in_crops = get_faces_in_crops
+    return est
+
+
+class MovingCrowd:
+    """n people walking around a W x H frame; tracks() returns one frame's parsed detector output."""
+
+    def __init__(self, n, W, H, seed=0):
+        rng = np.random.default_rng(seed)
+        self.W, self.H = W, H
+        self.ids = np.arange(1, n + 1)
+        self.pos = rng.uniform((0, 0), (W, H), size=(n, 2))
+        self.vel = rng.normal(0, 3, size=(n, 2))
+        self.size = np.stack((rng.uniform(30, 90, n), rng.uniform(80, 240, n)), axis=1) * (H / 1080)
+
+    def detections(self):
+        """Raw arrays as the tracker returns them: xyxy, conf, cls (a fifth are not people), ids."""
+        self.pos += self.vel
+        out = (self.pos < 0) | (self.pos > (self.W, self.H))
+        self.vel[out] *= -1
+        self.pos = np.clip(self.pos, 0, (self.W, self.H))
+        half = self.size / 2
+        boxes = np.concatenate((self.pos - half, self.pos + half), axis=1).astype(np.float32)
+        cls = np.where(self.ids % 5 == 0, 2.0, 0.0).astype(np.float32)
+        return boxes, np.full(len(self.ids), 0.9, dtype=np.float32), cls, self.ids.astype(np.float32)
+
+    def tracks(self):
+        return parse_track_arrays(*self.detections())
+
+
+def load_frames(path, W, H, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(cv2.resize(frame, (W, H)))
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Could not read frames from {path}")
+    return frames
+
+
+def synthetic_frames(W, H, count=8, seed=0):
+    rng = np.random.default_rng(seed)
+    base = cv2.GaussianBlur(rng.integers(0, 255, (H, W, 3), dtype=np.uint8), (0, 0), 8)
+    return [np.roll(base, 7 * k, axis=1) for k in range(count)]
+
+
+def measure(fn, iters, warmup=3):
+    """Run fn() iters times; returns per-call milliseconds."""
+    for _ in range(warmup):
+        fn()
+    out = np.empty(iters)
+    for k in range(iters):
+        t0 = time.perf_counter()
+        fn()
+        out[k] = (time.perf_counter() - t0) * 1000.0
+    return out
+
+
+def summarize(ms):
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "per_s": float(1000.0 / max(1e-9, ms.mean())),
+    }
+
+
+def bench_case(n, W, H, iters, video=None, seed=0):
+    results = {}
+    shape = (H, W, 3)
+
+    # Stage inputs (a few scenes cycled so repeated calls do not see identical data)
+    scenes = [make_scene(n, W, H, seed=seed + k) for k in range(4)]
+    crowds = [make_crowd(n, W, H, seed=seed + k) for k in range(4)]
+    frames = load_frames(video, W, H, iters + 3) if video else synthetic_frames(W, H, seed=seed)
+    est = stub_estimator(seed)
+    k = [0]
+
+    def step():
+        k[0] += 1
+        return k[0]
+
+    detections = [MovingCrowd(n, W, H, seed=seed + k).detections() for k in range(4)]
+
+    def run_parse():
+        parse_track_arrays(*detections[step() % len(detections)])
+
+    def run_risk():
+        tracks, genders, hist, _ = scenes[step() % len(scenes)]
+        compute_risk_events(tracks, genders, hist, shape)
+
+    store = TrackStore()
+
+    def run_assign():
+        tracks, faces = crowds[step() % len(crowds)]
+        est.assign_genders(tracks, faces, store.genders, store.confs)
+
+    alert = RatioAlert(threshold=3.0, cooldown_seconds=0.0)
+    counts = [(random.Random(seed + i).randint(0, n), random.Random(-seed - i).randint(0, n // 3 + 1)) for i in range(64)]
+
+    def run_ratio():
+        m, f = counts[step() % len(counts)]
+        alert.update(m, f)
+
+    drawn = [None]
+    buf = np.empty(shape, dtype=np.uint8)
+
+    def run_draw():
+        i = step()
+        tracks, genders, hist, _ = scenes[i % len(scenes)]
+        events, score = compute_risk_events(tracks, genders, hist, shape)
+        males = sum(1 for g in genders.values() if g == "M")
+        drawn[0] = draw_frame(frames[i % len(frames)], tracks, genders, males, len(genders) - males, events, risk_level(score), score, 25.0, out=buf)
+
+    scale, quality = DEFAULT_TIERS[0]
+
+    def run_encode():
+        encode_mjpeg(drawn[0], scale, quality)
+
+    pipeline = AnalyticsPipeline(est, RatioAlert(threshold=3.0, cooldown_seconds=10.0), face_async=False)
+    crowd = MovingCrowd(n, W, H, seed=seed)
+
+    def run_loop():
+        i = step()
+        vis = pipeline.process(frames[i % len(frames)], crowd.tracks())
+        encode_mjpeg(vis, scale, quality)
+
+    # RatioAlert prints on every trigger; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, fn in (("parse", run_parse), ("risk", run_risk), ("assign", run_assign), ("ratio", run_ratio), ("draw", run_draw), ("encode", run_encode), ("loop", run_loop)):
+            results[name] = summarize(measure(fn, iters))
+    return results
+
+
+def compare(report, baseline, tolerance):
+    """Cases where p50 got slower than baseline * tolerance."""
+    slower = []
+    for case, stages in report.items():
+        for stage, r in stages.items():
+            ref = baseline.get(case, {}).get(stage)
+            if ref and r["p50_ms"] > ref["p50_ms"] * tolerance:
+                slower.append(f"{case} {stage}: p50 {r['p50_ms']:.3f} ms vs {ref['p50_ms']:.3f} ms")
+    return slower
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 150])
+    ap.add_argument("--resolutions", nargs="+", default=["1280x720", "1920x1080"])
+    ap.add_argument("--iters", type=int, default=100, help="timed calls per stage")
+    ap.add_argument("--video", help="replay frames from this file through the loop stage")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="baseline JSON from an earlier --json run")
+    ap.add_argument("--tolerance", type=float, default=1.25, help="allowed p50 slowdown vs the baseline")
+    args = ap.parse_args()
+
+    cv2.setNumThreads(1)  # comparable numbers across machines with different core counts
+    report = {}
+    print(f"{'case':>16} {'stage':>7} {'p50 ms':>9} {'p99 ms':>9} {'per s':>9}")
+    for res in args.resolutions:
+        W, H = (int(v) for v in res.lower().split("x"))
+        for n in args.sizes:
+            case = f"{res}/n={n}"
+            report[case] = bench_case(n, W, H, args.iters, video=args.video, seed=args.seed)
+            for stage in STAGES:
+                r = report[case][stage]
+                print(f"{case:>16} {stage:>7} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['per_s']:>9.0f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            slower = compare(report, json.load(fh), args.tolerance)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
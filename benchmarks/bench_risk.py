@@ -0,0 +1,128 @@
+"""
+Risk engine benchmark: checks the engine's small-crowd loops and its array path against the
+original per-pair loops and reports timings for growing crowd sizes. "auto" is what callers get:
+loops below SCALAR_MAX_TRACKS tracks, arrays from there on.
+
+    python benchmarks/bench_risk.py --sizes 10 50 150 300 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wsafety.risk import SCALAR_MAX_TRACKS, compute_risk_events  # noqa: E402
+from wsafety.utils import box_diag, center_of_box, distance  # noqa: E402
+
+
+def reference_risk_events(tracks, genders, centers_hist, frame_shape, approach_check_frames=6):
+    """The original pure-Python implementation, kept as the correctness reference."""
+    H, W = frame_shape[:2]
+    diag_frame = (W**2 + H**2) ** 0.5
+    female_ids = [tid for tid, g in genders.items() if g == "F" and tid in tracks]
+    male_ids = [tid for tid, g in genders.items() if g == "M" and tid in tracks]
+    events, risk_score = [], 0
+    centers = {tid: center_of_box(tr["xyxy"]) for tid, tr in tracks.items()}
+    diags = {tid: box_diag(tr["xyxy"]) for tid, tr in tracks.items()}
+    for fid in female_ids:
+        prox_thresh = max(0.06 * diag_frame, 0.75 * diags[fid])
+        nearby_males = [m for m in male_ids if distance(centers[fid], centers[m]) < prox_thresh]
+        nearby_females = [f for f in female_ids if f != fid and distance(centers[fid], centers[f]) < prox_thresh]
+        if len(nearby_males) >= 2 and len(nearby_females) == 0:
+            events.append(f"Female {fid} surrounded by {len(nearby_males)} males in close proximity")
+            risk_score += 3
+    for mid in male_ids:
+        for fid in female_ids:
+            if len(centers_hist.get(mid, [])) < approach_check_frames or len(centers_hist.get(fid, [])) < approach_check_frames:
+                continue
+            d_now = distance(centers[mid], centers[fid])
+            d_past = distance(centers_hist[mid][0], centers_hist[fid][0])
+            if d_now < 0.05 * diag_frame and d_past - d_now > 0.04 * diag_frame:
+                events.append(f"Male {mid} rapidly approaching Female {fid}")
+                risk_score += 2
+    for tid, tr in tracks.items():
+        x1, y1, x2, y2 = tr["xyxy"]
+        w, h = max(1.0, x2 - x1), max(1.0, y2 - y1)
+        if h / w < 0.55 and w * h > 0.02 * (W * H):
+            events.append(f"Track {tid} possibly lying/fallen")
+            risk_score += 3
+    return events, risk_score
+
+
+def make_scene(n, W=1920, H=1080, seed=0, layout="clustered"):
+    """
+    Crowd with mixed genders, a few lying boxes and short/long histories.
+    layout="clustered" packs people in groups of ~8; "spread" scatters them over the frame.
+    """
+    rng = random.Random(seed)
+    if layout == "spread":
+        clusters = [(rng.uniform(0, W), rng.uniform(0, H)) for _ in range(n)]
+    else:
+        clusters = [(rng.uniform(100, W - 100), rng.uniform(100, H - 100)) for _ in range(max(1, n // 8))]
+    tracks, genders, hist = {}, {}, {}
+    tids = rng.sample(range(1, 10 * n + 10), n)
+    for tid in tids:
+        cx, cy = rng.choice(clusters)
+        if layout != "spread":
+            cx += rng.gauss(0, 40)
+            cy += rng.gauss(0, 40)
+        w, h = rng.uniform(30, 90), rng.uniform(80, 240)
+        if rng.random() < 0.03:
+            w, h = rng.uniform(250, 400), rng.uniform(60, 120)
+        tracks[tid] = {"xyxy": [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], "conf": 0.9}
+        hist[tid] = deque(maxlen=12)
+        start = (int(cx + rng.gauss(0, 120)), int(cy + rng.gauss(0, 120)))
+        for _ in range(rng.choice([3, 8, 12])):
+            hist[tid].append(start)
+    # genders in a different order than tracks, like the app's defaultdict
+    for tid in rng.sample(tids, n):
+        genders[tid] = rng.choice("MMFFU")
+    return tracks, genders, hist, (H, W, 3)
+
+
+def timeit(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 20, 40, 80, 150, 300, 500])
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--layout", choices=["clustered", "spread"], default="clustered")
+    ap.add_argument("--width", type=int, default=1920)
+    ap.add_argument("--height", type=int, default=1080)
+    ap.add_argument("--check_seeds", type=int, default=50, help="random scenes per size for the equivalence check")
+    args = ap.parse_args()
+
+    scalar = {"scalar_max_tracks": 1 << 30}
+    array = {"scalar_max_tracks": 0}
+    print(f"scalar path below {SCALAR_MAX_TRACKS} tracks")
+    print(f"{'tracks':>7} {'loops ms':>10} {'scalar ms':>10} {'array ms':>10} {'auto ms':>10} {'speedup':>8} {'events':>7}")
+    for n in args.sizes:
+        for seed in range(args.check_seeds):
+            scene = make_scene(n, args.width, args.height, seed=seed, layout=args.layout)
+            expected = reference_risk_events(*scene)
+            for path in (scalar, array):
+                got = compute_risk_events(*scene, **path)
+                if got != expected:
+                    raise SystemExit(f"Mismatch at n={n} seed={seed} ({path}):\n  expected {expected}\n  got      {got}")
+        scene = make_scene(n, args.width, args.height, seed=12345, layout=args.layout)
+        t_ref = timeit(lambda: reference_risk_events(*scene), args.repeat)
+        t_scalar = timeit(lambda: compute_risk_events(*scene, **scalar), args.repeat)
+        t_array = timeit(lambda: compute_risk_events(*scene, **array), args.repeat)
+        t_auto = timeit(lambda: compute_risk_events(*scene), args.repeat)
+        print(
+            f"{n:>7} {t_ref:>10.3f} {t_scalar:>10.3f} {t_array:>10.3f} {t_auto:>10.3f} {t_ref / t_auto:>7.1f}x "
+            f"{len(compute_risk_events(*scene)[0]):>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
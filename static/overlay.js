@@ -0,0 +1,92 @@
+// Client-side overlays for /?overlay=client: the server sends unannotated video at a low rate and
+// per-frame metadata (/overlay/<camera>, Server-Sent Events); this draws the same boxes, labels,
+// chips and risk badge as wsafety/viz.py on a canvas over the video, at the metadata's rate.
+(() => {
+    const COLORS = { M: 'rgb(60,220,60)', F: 'rgb(180,80,255)', U: 'rgb(200,200,200)' };
+    const RISK_COLORS = { LOW: 'rgba(0,200,0,0.7)', MEDIUM: 'rgba(255,165,0,0.7)', HIGH: 'rgba(255,0,0,0.7)' };
+    const PAD = 10;
+
+    function chip(ctx, x, y, text, fill, font) {
+        ctx.font = font;
+        const w = ctx.measureText(text).width + 24;
+        const h = 28;
+        ctx.fillStyle = fill;
+        ctx.fillRect(x, y, w, h);
+        ctx.fillStyle = '#fff';
+        ctx.fillText(text, x + 12, y + h - 9);
+        return x + w + 10;
+    }
+
+    function draw(canvas, meta) {
+        const ctx = canvas.getContext('2d');
+        const W = canvas.clientWidth, H = canvas.clientHeight;
+        if (canvas.width !== W || canvas.height !== H) {
+            canvas.width = W;
+            canvas.height = H;
+        }
+        ctx.clearRect(0, 0, W, H);
+        if (!meta) return;
+
+        // Boxes come in frame pixels; the video element may be scaled differently on each axis
+        const sx = W / (meta.size[0] || W), sy = H / (meta.size[1] || H);
+        ctx.lineWidth = 2;
+        ctx.font = '13px Arial';
+        for (const [id, x1, y1, x2, y2, g] of meta.tracks) {
+            const color = COLORS[g] || COLORS.U;
+            ctx.strokeStyle = color;
+            ctx.strokeRect(x1 * sx, y1 * sy, (x2 - x1) * sx, (y2 - y1) * sy);
+            const label = `ID ${id} (${g})`;
+            const lw = ctx.measureText(label).width + 10;
+            const ly = Math.max(0, y1 * sy - 20);
+            ctx.fillStyle = 'rgba(30,30,30,0.6)';
+            ctx.fillRect(x1 * sx, ly, lw, 18);
+            ctx.fillStyle = color;
+            ctx.fillText(label, x1 * sx + 5, ly + 13);
+        }
+
+        const font = '15px Arial';
+        let x = chip(ctx, PAD, PAD, `Men ${meta.male}`, 'rgba(60,220,60,0.75)', font);
+        x = chip(ctx, x, PAD, `Women ${meta.female}`, 'rgba(180,80,255,0.75)', font);
+        if (meta.male > 0 || meta.female > 0) chip(ctx, x, PAD, `Ratio ${meta.male}:${meta.female}`, 'rgba(40,40,40,0.6)', font);
+
+        const risk = `RISK: ${meta.level}  (score=${meta.score})`;
+        ctx.font = font;
+        chip(ctx, W - PAD - ctx.measureText(risk).width - 24, PAD, risk, RISK_COLORS[meta.level] || 'rgba(80,80,80,0.7)', font);
+
+        ctx.font = '13px Arial';
+        const lines = meta.events.slice(0, 3);
+        if (lines.length) {
+            const w = Math.max(...lines.map((e) => ctx.measureText(e).width)) + 24;
+            const h = 22 * lines.length + 10;
+            ctx.fillStyle = 'rgba(20,20,20,0.55)';
+            ctx.fillRect(PAD, H - PAD - h, w, h);
+            ctx.fillStyle = '#fff';
+            lines.forEach((e, i) => ctx.fillText(e, PAD + 12, H - PAD - h + 22 * (i + 1)));
+        }
+
+        const fps = `${meta.fps.toFixed(1)} FPS`;
+        const fw = ctx.measureText(fps).width + 18;
+        ctx.fillStyle = 'rgba(30,30,30,0.45)';
+        ctx.fillRect(W - PAD - fw, H - PAD - 24, fw, 24);
+        ctx.fillStyle = '#fff';
+        ctx.fillText(fps, W - PAD - fw + 9, H - PAD - 8);
+    }
+
+    for (const stage of document.querySelectorAll('.overlay-stage')) {
+        const canvas = stage.querySelector('canvas');
+        let latest = null, pending = false;
+        // Metadata can arrive faster than the screen refreshes: draw only the newest, once per frame
+        const source = new EventSource(stage.dataset.overlay);
+        source.addEventListener('overlay', (e) => {
+            latest = JSON.parse(e.data);
+            if (!pending) {
+                pending = true;
+                requestAnimationFrame(() => {
+                    pending = false;
+                    draw(canvas, latest);
+                });
+            }
+        });
+        source.addEventListener('error', () => draw(canvas, null));
+    }
+})();
@@ -11,16 +11,19 @@ class RatioAlert:
         threshold: float = 3.0,
         cooldown_seconds: float = 10.0,
         require_female: bool = True,
+        verbose: bool = True,
     ):
         """
         threshold: trigger when (male_count / female_count) >= threshold
         cooldown_seconds: minimum time between repeated alerts while condition persists
         require_female: if True, only compute ratio when female_count >= 1.
                         if False, treat F=0 as infinite ratio (will alert if male_count > 0).
+        verbose: print alerts to the terminal
         """
         self.threshold = float(threshold)
         self.cooldown_seconds = float(cooldown_seconds)
         self.require_female = bool(require_female)
+        self.verbose = bool(verbose)
 
         self._last_alert_ts: float = 0.0
         self._above: bool = False  # was condition true last frame?
@@ -28,14 +31,17 @@ class RatioAlert:
     def _now(self) -> float:
         return time.monotonic()
 
-    def _should_print(self) -> bool:
-        return (self._now() - self._last_alert_ts) >= self.cooldown_seconds
+    def _should_print(self, now: float) -> bool:
+        return (now - self._last_alert_ts) >= self.cooldown_seconds
 
-    def update(self, male_count: int, female_count: int) -> Tuple[bool, Optional[str]]:
+    def update(self, male_count: int, female_count: int, now: Optional[float] = None) -> Tuple[bool, Optional[str]]:
         """
         Call this once per frame with current counts.
-        Returns (triggered, message). If triggered is True, it also prints the message.
+        Returns (triggered, message). If triggered is True, it also prints the message (when verbose).
+        now: timestamp of the frame for the cooldown (default: monotonic clock); replays pass recorded times.
         """
+        if now is None:
+            now = self._now()
         # Compute ratio with guardrails
         ratio: Optional[float] = None
         note = ""
@@ -52,8 +58,8 @@ class RatioAlert:
         message = None
 
         # Rising edge or cooldown-based repeat
-        if current_above and (not self._above or self._should_print()):
-            self._last_alert_ts = self._now()
+        if current_above and (not self._above or self._should_print(now)):
+            self._last_alert_ts = now
             triggered = True
             if ratio == float("inf"):
                 ratio_str = "∞"
@@ -66,7 +72,8 @@ class RatioAlert:
                 f"ALERT: High M/F ratio (≥ {self.threshold:.2f}){note} | "
                 f"M={male_count}, F={female_count}, ratio={ratio_str}"
             )
-            print(message)
+            if self.verbose:
+                print(message)
 
         # Update state for next call
         self._above = current_above
@@ -0,0 +1,206 @@
+import threading
+import time
+from typing import Generator, List, Optional
+
+import numpy as np
+from ultralytics import YOLO
+
+from .capture import LatestFrameReader
+from .detector import make_byte_tracker, parse_tracker_output
+from .tracks import TrackBatch
+
+
+class BatchedStream:
+    """
+    One camera fed through a BatchedDetector. Mirrors PersonDetector's interface: iterate
+    track_stream() and read current_tracks after each yielded frame. ByteTrack state is per stream.
+    Set `metrics` to a StageMetrics to record capture / detect / parse latencies and skipped frames.
+    """
+
+    def __init__(self, owner: "BatchedDetector", stream_id: str, source, conf: float = 0.35, tracker: str = "bytetrack.yaml"):
+        self.owner = owner
+        self.stream_id = stream_id
+        self.source = source
+        self.conf = float(conf)
+        self.tracker = tracker
+        self.current_tracks = TrackBatch()
+        self.metrics = None
+
+        self.reader: Optional[LatestFrameReader] = None
+        self.taken_seq = 0  # last capture seq handed to the batcher
+        self.ready_since: Optional[float] = None
+
+        self._cond = threading.Condition()
+        self._result = None  # (frame, ultralytics Results) from the last batch
+
+    def _deliver(self, frame: np.ndarray, result) -> None:
+        with self._cond:
+            self._result = (frame, result)
+            self._cond.notify_all()
+
+    def _on_capture(self) -> None:
+        self.owner._notify()
+        if self.reader is not None and self.reader.ended:
+            with self._cond:
+                self._cond.notify_all()
+
+    def track_stream(self, source=None, conf: Optional[float] = None, iou: Optional[float] = None, tracker: Optional[str] = None) -> Generator[Optional[np.ndarray], None, None]:
+        """
+        Yields BGR frames as batches complete. Arguments override the values given to add_stream;
+        iou is shared by the whole batch and therefore ignored here.
+        """
+        if source is not None:
+            self.source = source
+        if conf is not None:
+            self.conf = float(conf)
+        if tracker is not None:
+            self.tracker = tracker
+
+        byte_tracker = None
+        self.reader = LatestFrameReader(self.source, on_frame=self._on_capture).start()
+        self.taken_seq = 0
+        self.owner._register(self)
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._result is not None or self.reader.ended, timeout=1.0)
+                    item, self._result = self._result, None
+                if item is None:
+                    if self.reader.ended:
+                        return
+                    continue
+
+                frame, result = item
+                t0 = time.perf_counter()
+                if byte_tracker is None:
+                    byte_tracker = make_byte_tracker(self.tracker, frame_rate=int(round(self.reader.fps)))
+                dets = result.boxes.cpu().numpy()
+                if len(dets):
+                    dets = dets[dets.conf >= self.conf]
+                self.current_tracks = parse_tracker_output(byte_tracker.update(dets, frame))
+                if self.metrics is not None:
+                    self.metrics.observe("parse", time.perf_counter() - t0)
+                yield frame
+        finally:
+            self.owner._unregister(self)
+            self.reader.stop()
+
+
+class BatchedDetector:
+    """
+    Runs one YOLO inference over the newest frame of several streams at once.
+
+    A batch is launched when max_batch streams have a new frame, or max_wait_ms after the first
+    stream became ready, whichever comes first. Larger waits trade latency for throughput.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "yolov8n.pt",
+        max_batch: int = 8,
+        max_wait_ms: float = 10.0,
+        iou: float = 0.45,
+        imgsz: int = 640,
+    ):
+        self.model = YOLO(model_name)
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.iou = float(iou)
+        self.imgsz = int(imgsz)
+
+        self._cond = threading.Condition()
+        self._streams: List[BatchedStream] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+        self.frames = 0
+
+    def warm_up(self) -> None:
+        """One dummy inference so model fusing and first-run allocations happen before the first real batch."""
+        blank = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self.model.predict([blank], imgsz=self.imgsz, classes=[0], verbose=False)
+
+    def add_stream(self, stream_id: str, source, conf: float = 0.35, tracker: str = "bytetrack.yaml") -> BatchedStream:
+        return BatchedStream(self, stream_id, source, conf=conf, tracker=tracker)
+
+    def _register(self, stream: BatchedStream) -> None:
+        with self._cond:
+            if stream not in self._streams:
+                self._streams.append(stream)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="batched-detector", daemon=True)
+                self._thread.start()
+
+    def _unregister(self, stream: BatchedStream) -> None:
+        with self._cond:
+            if stream in self._streams:
+                self._streams.remove(stream)
+
+    def _notify(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._notify()
+
+    def _ready(self) -> List[BatchedStream]:
+        now = time.monotonic()
+        ready = []
+        for s in self._streams:
+            if s.reader is not None and s.reader.latest(s.taken_seq) is not None:
+                if s.ready_since is None:
+                    s.ready_since = now
+                ready.append(s)
+        # Longest-waiting streams first so no camera starves when more than max_batch are ready
+        ready.sort(key=lambda s: s.ready_since)
+        return ready
+
+    def _collect(self) -> List[BatchedStream]:
+        with self._cond:
+            while not self._stop.is_set():
+                ready = self._ready()
+                if not ready:
+                    self._cond.wait(0.5)
+                    continue
+                deadline = ready[0].ready_since + self.max_wait
+                remaining = deadline - time.monotonic()
+                if len(ready) >= min(self.max_batch, len(self._streams)) or remaining <= 0:
+                    return ready[: self.max_batch]
+                self._cond.wait(remaining)
+        return []
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            frames = []
+            streams = []
+            for s in batch:
+                latest = s.reader.latest(s.taken_seq)
+                if latest is None:
+                    continue
+                if s.metrics is not None:
+                    # Frames captured since the last batch but never inferred
+                    s.metrics.inc("frames_dropped", max(0, latest[0] - s.taken_seq - 1))
+                    s.metrics.observe("capture", s.reader.read_seconds)
+                s.taken_seq, frame = latest
+                s.ready_since = None
+                frames.append(frame)
+                streams.append(s)
+            if not frames:
+                continue
+
+            conf = min(s.conf for s in streams)
+            t0 = time.perf_counter()
+            try:
+                results = self.model.predict(frames, conf=conf, iou=self.iou, imgsz=self.imgsz, classes=[0], verbose=False)
+            except Exception as exc:
+                print(f"[batched-detector] inference failed: {exc!r}")
+                continue
+            took = time.perf_counter() - t0
+            self.batches += 1
+            self.frames += len(frames)
+            for s, frame, result in zip(streams, frames, results):
+                if s.metrics is not None:
+                    s.metrics.observe("detect", took)  # the whole batch's latency, as each camera sees it
+                s._deliver(frame, result)
@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def is_file_source(source) -> bool:
+    """True for a video file path, False for a camera index or a stream URL (rtsp://, http://, ...)."""
+    return isinstance(source, str) and "://" not in source
+
+
+class LatestFrameReader:
+    """
+    Reads a video source on a background thread and keeps only the newest frame.
+    Consumers poll latest() with the last sequence number they saw; stale frames are dropped.
+    `ended` becomes True once the source stops delivering frames (EOF or disconnect).
+    `read_seconds` holds the duration of the newest read (capture + decode).
+    """
+
+    def __init__(self, source, on_frame: Optional[Callable[[], None]] = None, realtime: Optional[bool] = None):
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        self.source = source
+        self.on_frame = on_frame
+        # Files are paced to their native FPS so they behave like live sources
+        self.realtime = realtime if realtime is not None else is_file_source(source)
+        self.ended = False
+        self.fps = 30.0
+        self.read_seconds = 0.0
+
+        self._lock = threading.Lock()
+        self._frame: Optional[np.ndarray] = None
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "LatestFrameReader":
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.source}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def latest(self, after_seq: int = 0) -> Optional[Tuple[int, np.ndarray]]:
+        """Return (seq, frame) if a frame newer than after_seq is available, else None."""
+        with self._lock:
+            if self._seq <= after_seq or self._frame is None:
+                return None
+            return self._seq, self._frame
+
+    def _run(self) -> None:
+        cap = cv2.VideoCapture(self.source)
+        try:
+            if not cap.isOpened():
+                return
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if fps and fps > 0:
+                self.fps = float(fps)
+            period = 1.0 / self.fps
+            t_next = time.monotonic()
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok or frame is None:
+                    return
+                self.read_seconds = time.perf_counter() - t0
+                with self._lock:
+                    self._frame = frame
+                    self._seq += 1
+                if self.on_frame is not None:
+                    self.on_frame()
+                if self.realtime:
+                    t_next += period
+                    delay = t_next - time.monotonic()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        t_next = time.monotonic()
+        finally:
+            cap.release()
+            self.ended = True
+            if self.on_frame is not None:
+                self.on_frame()
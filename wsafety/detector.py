@@ -1,39 +1,106 @@
-from typing import Dict, Generator, Optional
+import threading
+import time
+from typing import Generator, Optional
 
 import numpy as np
 from ultralytics import YOLO
 
+from .gating import AdaptiveRate, BoxExtrapolator
+from .tracks import TrackBatch
+
+
+def make_byte_tracker(tracker: str = "bytetrack.yaml", frame_rate: int = 30):
+    """
+    Build a standalone ByteTrack instance from an Ultralytics tracker YAML, for callers that run
+    detection themselves (batched or alternative backends) instead of model.track().
+    """
+    from ultralytics.trackers.byte_tracker import BYTETracker
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    try:
+        from ultralytics.utils import YAML
+
+        cfg = YAML.load(check_yaml(tracker))
+    except ImportError:  # older ultralytics
+        from ultralytics.utils import yaml_load
+
+        cfg = yaml_load(check_yaml(tracker))
+    try:
+        return BYTETracker(args=IterableSimpleNamespace(**cfg), frame_rate=frame_rate)
+    except TypeError:  # newer ultralytics: no frame_rate, track_buffer counts frames
+        cfg["track_buffer"] = max(1, int(frame_rate / 30.0 * cfg["track_buffer"]))
+        return BYTETracker(args=IterableSimpleNamespace(**cfg))
+
+
+def parse_track_arrays(xyxy_all, conf_all, cls_all, ids_all) -> TrackBatch:
+    # Keep COCO class 0: 'person'
+    return TrackBatch.from_arrays(xyxy_all, conf_all, cls_all, ids_all, keep_cls=0)
+
+
+def parse_tracker_output(tracked: np.ndarray) -> TrackBatch:
+    """Parse BYTETracker.update rows [x1, y1, x2, y2, id, score, cls, idx] into a TrackBatch."""
+    if len(tracked) == 0:
+        return TrackBatch()
+    return parse_track_arrays(tracked[:, :4], tracked[:, 5], tracked[:, 6], tracked[:, 4])
+
 
 class PersonDetector:
     """
     Wrapper around YOLOv8 with built-in ByteTrack. Use track_stream to iterate frames.
-    After each yield, current_tracks contains dict of {track_id: {"xyxy": [x1,y1,x2,y2], "conf": float}}
+    After each yield, current_tracks holds a TrackBatch: ids, xyxy, conf and cls arrays of the frame's
+    people, also readable as a dict of {track_id: {"xyxy": [x1,y1,x2,y2], "conf": float}}.
+    Set `metrics` to a StageMetrics to record capture / detect / parse latencies.
+    Set `rate` to an AdaptiveRate to run YOLO only as often as the scene needs (see _gated_stream).
     """
 
     def __init__(self, model_name: str = "yolov8n.pt"):
-        self.model = YOLO(model_name)
-        self.current_tracks: Dict[int, dict] = {}
+        self.model = self._load_model(model_name)
+        self.current_tracks = TrackBatch()
+        self.metrics = None
+        self.rate: Optional[AdaptiveRate] = None
+
+    def _load_model(self, model_name: str):
+        """The inference model behind self.model; backends override this."""
+        return YOLO(model_name)
+
+    def warm_up(self, imgsz: int = 640) -> None:
+        """One dummy inference so model fusing and first-run allocations happen before the first real frame."""
+        self.model.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
 
-    def _parse_tracks_from_result(self, result) -> Dict[int, dict]:
-        self.current_tracks = {}
+    def _parse_tracks_from_result(self, result) -> TrackBatch:
         boxes = getattr(result, "boxes", None)
         if boxes is None or boxes.xyxy is None or len(boxes) == 0:
+            self.current_tracks = TrackBatch()
             return self.current_tracks
 
         xyxy_all = boxes.xyxy.cpu().numpy()
         conf_all = boxes.conf.cpu().numpy() if boxes.conf is not None else np.ones((len(xyxy_all),))
-        cls_all = boxes.cls.cpu().numpy().astype(int) if boxes.cls is not None else np.zeros((len(xyxy_all),), dtype=int)
-        ids_all = boxes.id.cpu().numpy().astype(int) if boxes.id is not None else np.arange(len(xyxy_all))
+        cls_all = boxes.cls.cpu().numpy() if boxes.cls is not None else np.zeros((len(xyxy_all),), dtype=int)
+        ids_all = boxes.id.cpu().numpy() if boxes.id is not None else np.arange(len(xyxy_all))
+        self.current_tracks = parse_track_arrays(xyxy_all, conf_all, cls_all, ids_all)
+        return self.current_tracks
 
-        # Keep COCO class 0: 'person'
-        for i in range(len(xyxy_all)):
-            if cls_all[i] != 0:
-                continue
-            tid = int(ids_all[i])
-            self.current_tracks[tid] = {
-                "xyxy": xyxy_all[i].tolist(),
-                "conf": float(conf_all[i]),
-            }
+    def track_frame(
+        self,
+        frame: np.ndarray,
+        conf: float = 0.35,
+        iou: float = 0.45,
+        tracker: str = "bytetrack.yaml",
+        persist: bool = True,
+    ) -> TrackBatch:
+        """
+        Run YOLO + ByteTrack on one frame the caller decoded and return current_tracks.
+        persist=False starts fresh trackers (a new session or video chunk).
+        """
+        t0 = time.perf_counter()
+        result = self.model.track(frame, conf=conf, iou=iou, tracker=tracker, persist=persist, verbose=False)[0]
+        t1 = time.perf_counter()
+        self._parse_tracks_from_result(result)
+        m = self.metrics
+        if m is not None:
+            m.observe("detect", t1 - t0)
+            m.observe("parse", time.perf_counter() - t1)
         return self.current_tracks
 
     def track_stream(
@@ -49,6 +116,9 @@ class PersonDetector:
         """
         if isinstance(source, str) and source.isdigit():
             source = int(source)
+        if self.rate is not None:
+            yield from self._gated_stream(source, conf, iou, tracker)
+            return
 
         results_gen = self.model.track(
             source=source,
@@ -60,11 +130,68 @@ class PersonDetector:
             verbose=False,
         )
 
+        t_wait = time.perf_counter()
         for result in results_gen:
             frame = getattr(result, "orig_img", None)
             if frame is None:
                 yield None
+                t_wait = time.perf_counter()
                 continue
 
-            self._parse_tracks_from_result(result)
-            yield frame
\ No newline at end of file
+            m = self.metrics
+            if m is not None:
+                # Ultralytics reports model time per frame; the rest of the wait is capture and decode
+                t = time.perf_counter()
+                detect = sum((getattr(result, "speed", None) or {}).values()) / 1000.0
+                m.observe("detect", detect)
+                m.observe("capture", max(0.0, t - t_wait - detect))
+                self._parse_tracks_from_result(result)
+                m.observe("parse", time.perf_counter() - t)
+            else:
+                self._parse_tracks_from_result(result)
+            yield frame
+            t_wait = time.perf_counter()
+
+    def _gated_stream(self, source, conf: float, iou: float, tracker: str) -> Generator[Optional[np.ndarray], None, None]:
+        """
+        Capture on a LatestFrameReader and yield the newest frame each time one arrives. With
+        self.rate set, YOLO + ByteTrack run only when the rate asks for it, and in between
+        current_tracks holds boxes extrapolated from the last detections. Without a rate (live
+        sources of the ONNX Runtime backend) every yielded frame is detected.
+        """
+        from .capture import LatestFrameReader
+
+        rate = self.rate
+        if rate is not None:
+            rate.reset()
+        extrapolator = BoxExtrapolator()
+        ready = threading.Event()
+        reader = LatestFrameReader(source, on_frame=ready.set).start()
+        seq = 0
+        persist = False  # the first detection of a session starts fresh trackers
+        try:
+            while True:
+                ready.wait(1.0)
+                ready.clear()
+                latest = reader.latest(seq)
+                if latest is None:
+                    if reader.ended:
+                        return
+                    continue
+                seq, frame = latest
+                now = time.monotonic()
+                m = self.metrics
+                if m is not None:
+                    m.observe("capture", reader.read_seconds)
+
+                if rate is None or rate.should_detect(frame, now, len(self.current_tracks)):
+                    self.track_frame(frame, conf, iou, tracker, persist=persist)
+                    persist = True
+                    extrapolator.observe(self.current_tracks, now)
+                else:
+                    self.current_tracks = extrapolator.predict(now)
+                    if m is not None:
+                        m.inc("detect_skipped")
+                yield frame
+        finally:
+            reader.stop()
@@ -0,0 +1,254 @@
+"""
+Alert delivery off the frame loop.
+
+Pipelines append raw alerts, (ts, kind, level, message) tuples, to a per-camera collections.deque:
+a lock-free append that never waits. AlertDispatcher polls those inboxes on its own thread,
+coalesces repeats of the same alert per camera within a cooldown window and hands each alert to
+every sink. Sinks deliver from their own thread and bounded queue, so a slow webhook only ever
+drops its own alerts (counted in `dropped`) and never delays frames or the other sinks.
+
+An alert is a JSON-ready dict: id, camera, kind ("risk" or "ratio"), level, message, ts and
+repeats (occurrences coalesced into it since the previous alert with the same key).
+"""
+import json
+import queue
+import re
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+from typing import Deque, Dict, Generator, List, Optional
+
+# Raw alerts buffered per camera between polls; the oldest go first if the dispatcher stalls
+ALERT_BACKLOG = 1000
+
+# Parts of a message that change while the situation stays the same ("surrounded by 3 males")
+_KEY_NOISE = re.compile(r"\d+ (males)")
+
+
+def _alert_key(kind: str, message: str) -> str:
+    if kind == "ratio":
+        return kind  # counts move every frame; one high-ratio situation per camera
+    return _KEY_NOISE.sub(r"\1", message)
+
+
+class AlertSink:
+    """Delivers alerts on its own thread from a bounded queue. Subclasses implement deliver()."""
+
+    def __init__(self, max_queue: int = 256):
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"alerts-{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def offer(self, alert: dict) -> None:
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            alert = self.queue.get()
+            if alert is None:
+                return
+            try:
+                self.deliver(alert)
+                self.sent += 1
+            except Exception as exc:
+                self.failed += 1
+                print(f"[alerts] {type(self).__name__} failed: {exc!r}")
+
+    def deliver(self, alert: dict) -> None:
+        raise NotImplementedError
+
+    def stop(self, timeout: float = 2.0) -> None:
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+
+class LogSink(AlertSink):
+    """JSON lines appended to `path`; without a path, one readable line per alert on stdout."""
+
+    def __init__(self, path: Optional[str] = None, max_queue: int = 1024):
+        super().__init__(max_queue)
+        self.path = path
+
+    def deliver(self, alert: dict) -> None:
+        if self.path is None:
+            stamp = time.strftime("%H:%M:%S", time.localtime(alert["ts"]))
+            repeats = f" (x{alert['repeats'] + 1})" if alert["repeats"] else ""
+            print(f"{stamp} [{alert['camera']}] {alert['level']} {alert['message']}{repeats}")
+            sys.stdout.flush()
+            return
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+class WebhookSink(AlertSink):
+    """POSTs every alert as JSON to `url`."""
+
+    def __init__(self, url: str, timeout: float = 3.0, max_queue: int = 256):
+        super().__init__(max_queue)
+        self.url = url
+        self.timeout = float(timeout)
+
+    def deliver(self, alert: dict) -> None:
+        body = json.dumps(alert, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class EventStreamSink(AlertSink):
+    """
+    Keeps the latest `history` alerts for Server-Sent Events clients. Each client follows the
+    history by alert id, so a slow browser misses old alerts instead of holding anything up,
+    and a reconnecting one resumes from its Last-Event-ID.
+    """
+
+    def __init__(self, history: int = 100, max_queue: int = 1024):
+        super().__init__(max_queue)
+        self.history: Deque[dict] = deque(maxlen=max(1, int(history)))
+        self._cond = threading.Condition()
+
+    def deliver(self, alert: dict) -> None:
+        with self._cond:
+            self.history.append(alert)
+            self._cond.notify_all()
+
+    def stream(self, camera: Optional[str] = None, last_id: Optional[int] = None, recent: int = 20, keepalive: float = 15.0) -> Generator[str, None, None]:
+        """SSE text for one client: the `recent` latest alerts (or those after last_id), then live ones."""
+        with self._cond:
+            backlog = [a for a in self.history if camera is None or a["camera"] == camera]
+            newest = self._last_id()
+        if last_id is not None and last_id > newest:
+            last_id = None  # an id this process never issued (e.g. from before a restart)
+        if last_id is not None:
+            backlog = [a for a in backlog if a["id"] > last_id]
+        else:
+            backlog = backlog[-recent:] if recent > 0 else []
+        seen = backlog[-1]["id"] if backlog else (last_id if last_id is not None else newest)
+        for alert in backlog:
+            yield self._format(alert)
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: self._last_id() > seen, timeout=keepalive):
+                    fresh = []
+                else:
+                    fresh = [a for a in self.history if a["id"] > seen]
+            if not fresh:
+                yield ": keepalive\n\n"  # lets the server notice clients that went away
+                continue
+            seen = fresh[-1]["id"]
+            for alert in fresh:
+                if camera is None or alert["camera"] == camera:
+                    yield self._format(alert)
+
+    def _last_id(self) -> int:
+        return self.history[-1]["id"] if self.history else 0
+
+    @staticmethod
+    def _format(alert: dict) -> str:
+        return f"id: {alert['id']}\nevent: alert\ndata: {json.dumps(alert, ensure_ascii=False)}\n\n"
+
+
+class AlertDispatcher:
+    """
+    Drains per-camera inboxes on a background thread, deduplicates and fans alerts out to sinks.
+    Within `cooldown` seconds of an alert, the same alert from the same camera is only counted;
+    the next one after the window carries that count in `repeats`.
+    """
+
+    def __init__(self, sinks: List[AlertSink], cooldown: float = 10.0, poll_interval: float = 0.05):
+        self.sinks = list(sinks)
+        self.cooldown = float(cooldown)
+        self.poll_interval = float(poll_interval)
+        self.emitted: Dict[str, int] = {}
+        self.suppressed: Dict[str, int] = {}
+        self._inboxes: Dict[str, Deque[tuple]] = {}
+        self._recent: Dict[str, Dict[str, list]] = {}  # camera -> key -> [last emitted ts, repeats since]
+        # Ids start from the boot time in ms, so they keep growing across restarts and a browser's
+        # Last-Event-ID from the previous run never hides new alerts
+        self._next_id = int(time.time() * 1000)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict] = None) -> "AlertDispatcher":
+        """Dispatcher for the `alerts` section of cameras.yaml: SSE always, plus log and webhook if set."""
+        settings = settings or {}
+        sinks: List[AlertSink] = [EventStreamSink(history=settings.get("history", 100)), LogSink(settings.get("log"))]
+        if settings.get("webhook"):
+            sinks.append(WebhookSink(settings["webhook"], timeout=settings.get("webhook_timeout", 3.0)))
+        return cls(sinks, cooldown=settings.get("cooldown", 10.0))
+
+    @property
+    def events(self) -> Optional[EventStreamSink]:
+        return next((s for s in self.sinks if isinstance(s, EventStreamSink)), None)
+
+    def add_inbox(self, camera: str, inbox: Deque[tuple]) -> None:
+        self._inboxes[camera] = inbox
+        self.emitted.setdefault(camera, 0)
+        self.suppressed.setdefault(camera, 0)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            for sink in self.sinks:
+                sink.start()
+            self._thread = threading.Thread(target=self._run, name="alerts-dispatcher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self.drain()
+
+    def drain(self) -> None:
+        """Process everything queued so far (the dispatcher thread calls this every poll_interval)."""
+        for camera, inbox in list(self._inboxes.items()):
+            while inbox:
+                ts, kind, level, message = inbox.popleft()
+                alert = self._dedupe(camera, ts, kind, level, message)
+                if alert is not None:
+                    for sink in self.sinks:
+                        sink.offer(alert)
+
+    def _dedupe(self, camera: str, ts: float, kind: str, level: str, message: str) -> Optional[dict]:
+        recent = self._recent.setdefault(camera, {})
+        key = _alert_key(kind, message)
+        entry = recent.get(key)
+        if entry is not None and ts - entry[0] < self.cooldown:
+            entry[1] += 1
+            self.suppressed[camera] = self.suppressed.get(camera, 0) + 1
+            return None
+        repeats = entry[1] if entry is not None else 0
+        recent[key] = [ts, 0]
+        if len(recent) > 256:  # forget situations that ended a while ago
+            for k in [k for k, e in recent.items() if ts - e[0] >= self.cooldown]:
+                del recent[k]
+        alert = {"id": self._next_id, "camera": camera, "kind": kind, "level": level, "message": message, "ts": ts, "repeats": repeats}
+        self._next_id += 1
+        self.emitted[camera] = self.emitted.get(camera, 0) + 1
+        return alert
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self.drain()
+        for sink in self.sinks:
+            sink.stop()
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# (output scale, JPEG quality) per resolution tier; tier 0 is the best
+DEFAULT_TIERS = ((1.0, 80), (0.5, 70), (0.25, 60))
+
+
+def mjpeg_part(jpeg: bytes) -> bytes:
+    return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+
+def encode_mjpeg(frame_vis, scale: float = 1.0, quality: int = 95) -> Optional[bytes]:
+    if scale != 1.0:
+        frame_vis = cv2.resize(frame_vis, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", frame_vis, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return mjpeg_part(buffer.tobytes()) if ok else None
+
+
+class FrameEncoder:
+    """
+    Encodes rendered frames to MJPEG parts on a thread pool, once per frame for each requested tier.
+
+    Render buffers come from acquire(): a buffer stays reserved until all its tiers are encoded.
+    When max_inflight frames are already queued, acquire() returns None and the caller should skip
+    rendering that frame, so a slow encoder drops frames instead of stalling the analytics loop.
+    Parts are published in frame order per tier; a late part for an older frame is discarded.
+    """
+
+    def __init__(self, tiers: Sequence[Tuple[float, int]] = DEFAULT_TIERS, threads: int = 2, max_inflight: int = 2, metrics=None):
+        self.tiers = [(float(s), int(q)) for s, q in tiers]
+        self.metrics = metrics
+        self.max_inflight = max(1, int(max_inflight))
+        self.frames_dropped = 0
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(threads)), thread_name_prefix="jpeg")
+        self._lock = threading.Lock()
+        self._buffers: List[np.ndarray] = []
+        self._busy = set()
+        self._seq = 0
+        self._published = [0] * len(self.tiers)
+
+    def acquire(self, shape, dtype=np.uint8) -> Optional[np.ndarray]:
+        with self._lock:
+            if len(self._busy) >= self.max_inflight:
+                self.frames_dropped += 1
+                if self.metrics is not None:
+                    self.metrics.inc("encode_dropped")
+                return None
+            self._buffers = [b for b in self._buffers if b.shape == tuple(shape)]
+            for b in self._buffers:
+                if id(b) not in self._busy:
+                    return b
+            b = np.empty(shape, dtype=dtype)
+            self._buffers.append(b)
+            return b
+
+    def submit(self, img: np.ndarray, tiers: Sequence[int], publish: Callable[[int, bytes], None]) -> None:
+        """Encode img (a buffer from acquire) for each tier index and call publish(tier, part)."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._busy.add(id(img))
+            if self.metrics is not None:
+                self.metrics.set("encode_queue", len(self._busy))
+        self._pool.submit(self._encode, seq, img, list(tiers), publish)
+
+    def _encode(self, seq: int, img: np.ndarray, tiers: List[int], publish: Callable[[int, bytes], None]) -> None:
+        t0 = time.perf_counter()
+        try:
+            for t in tiers:
+                scale, quality = self.tiers[t]
+                part = encode_mjpeg(img, scale, quality)
+                if part is None:
+                    continue
+                with self._lock:
+                    if seq <= self._published[t]:
+                        continue
+                    self._published[t] = seq
+                publish(t, part)
+        except Exception as exc:
+            print(f"[encoder] {exc!r}")
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe("encode", time.perf_counter() - t0)
+            with self._lock:
+                self._busy.discard(id(img))
+                if self.metrics is not None:
+                    self.metrics.set("encode_queue", len(self._busy))
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .risk import GENDER_CODES
+
+
+class FaceMemory:
+    """
+    Small nearest-neighbour index of recently seen face embeddings with the best gender known for each.
+
+    When ByteTrack loses a person behind an occluder and issues a new id, the new track's first
+    analysed face matches the person's entry here and picks up its gender and confidence at once,
+    instead of starting over from a single noisy estimate (and being re-analysed until confident).
+    Entries live in preallocated arrays: emb (C, D) unit vectors, gender (C,) GENDER_CODES,
+    gconf (C,), last_seen (C,). Entries unseen for `ttl` seconds are evicted; when full, the
+    stalest entry is replaced. Lookups are one matrix-vector product over the live entries.
+    Safe to share between the pipelines of one process.
+    """
+
+    def __init__(self, capacity: int = 512, ttl: float = 30.0, threshold: float = 0.45, smoothing: float = 0.2):
+        """
+        threshold: cosine similarity above which two faces count as the same person
+                   (ArcFace embeddings, as in InsightFace's buffalo packs)
+        smoothing: weight of a new observation in an entry's running embedding
+        """
+        self.capacity = int(capacity)
+        self.ttl = float(ttl)
+        self.threshold = float(threshold)
+        self.smoothing = float(smoothing)
+        self._lock = threading.Lock()
+        self.emb: Optional[np.ndarray] = None  # allocated on first use, once the embedding size is known
+        self.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.gender = np.zeros(self.capacity, dtype=np.int8)
+            self.gconf = np.zeros(self.capacity, dtype=np.float32)
+            self.last_seen = np.full(self.capacity, -np.inf)
+            self.live = np.zeros(self.capacity, dtype=bool)
+            if self.emb is not None:
+                self.emb[:] = 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.live))
+
+    def resolve(self, embs: np.ndarray, codes: np.ndarray, gconfs: np.ndarray, now: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Record the (N, D) embeddings of faces just observed with their (N,) gender codes and
+        confidences, and return (codes, gconfs) where each face takes its matching entry's gender
+        when that is at least as confident. Rows that are all zero (no embedding) pass through.
+        """
+        if now is None:
+            now = time.monotonic()
+        codes = codes.copy()
+        gconfs = gconfs.copy()
+        norms = np.linalg.norm(embs, axis=1)
+        with self._lock:
+            if self.emb is None or self.emb.shape[1] != embs.shape[1]:
+                self.emb = np.zeros((self.capacity, embs.shape[1]), dtype=np.float32)
+                self.live[:] = False
+            self.live &= (now - self.last_seen) < self.ttl
+            for i in np.flatnonzero(norms > 0):
+                q = embs[i] / norms[i]
+                live = np.flatnonzero(self.live)
+                slot = -1
+                if len(live):
+                    sims = self.emb[live] @ q
+                    best = int(np.argmax(sims))
+                    if sims[best] >= self.threshold:
+                        slot = int(live[best])
+                if slot < 0:
+                    slot = self._free_slot()
+                    self.emb[slot] = q
+                    self.gender[slot] = codes[i]
+                    self.gconf[slot] = gconfs[i]
+                    self.live[slot] = True
+                else:
+                    e = (1.0 - self.smoothing) * self.emb[slot] + self.smoothing * q
+                    self.emb[slot] = e / max(float(np.linalg.norm(e)), 1e-12)
+                    self._merge(slot, i, codes, gconfs)
+                self.last_seen[slot] = now
+        return codes, gconfs
+
+    def _merge(self, slot: int, i: int, codes: np.ndarray, gconfs: np.ndarray) -> None:
+        """The more confident of the entry's gender and face i's wins, on both sides."""
+        unknown = GENDER_CODES["U"]
+        if codes[i] != unknown and (gconfs[i] >= self.gconf[slot] or self.gender[slot] == unknown):
+            self.gender[slot] = codes[i]
+            self.gconf[slot] = gconfs[i]
+        elif self.gender[slot] != unknown:
+            codes[i] = self.gender[slot]
+            gconfs[i] = self.gconf[slot]
+
+    def _free_slot(self) -> int:
+        free = np.flatnonzero(~self.live)
+        if len(free):
+            return int(free[0])
+        return int(np.argmin(self.last_seen))
@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from .gender import GenderEstimator
+from .tracks import TrackBatch, as_track_batch
+
+
+class FaceWorker:
+    """
+    Runs face analysis on a background thread so the frame loop never waits on InsightFace.
+
+    The input is a single "latest job" slot: submit() replaces any job that has not started yet.
+    poll() returns the newest finished result as (frame_idx, tracks_snapshot, faces), where the
+    snapshot is the TrackBatch of the frame the faces were found in.
+    """
+
+    def __init__(self, gender_est: GenderEstimator, tile: bool = True, metrics=None):
+        self.gender_est = gender_est
+        self.tile = tile
+        self.metrics = metrics
+        self.jobs_done = 0
+        self.jobs_dropped = 0
+
+        self._cond = threading.Condition()
+        self._job = None
+        self._result = None
+        self._running = False
+        self._generation = 0
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def busy(self) -> bool:
+        """True while a job is queued or being analysed."""
+        return self._job is not None or self._running
+
+    def submit(self, frame_idx: int, frame, tracks: Union[TrackBatch, Dict[int, dict]]) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="face-worker", daemon=True)
+                self._thread.start()
+            if self._job is not None:
+                self.jobs_dropped += 1
+                if self.metrics is not None:
+                    self.metrics.inc("face_jobs_dropped")
+            self._job = (self._generation, frame_idx, frame, as_track_batch(tracks))  # batches are never modified: no copy
+            self._cond.notify_all()
+
+    def poll(self) -> Optional[Tuple[int, TrackBatch, List]]:
+        with self._cond:
+            result, self._result = self._result, None
+        return result
+
+    def reset(self) -> None:
+        """Forget queued and in-flight work (e.g. when the stream restarts and track ids reset)."""
+        with self._cond:
+            self._generation += 1
+            self._job = None
+            self._result = None
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._job is not None or self._stop)
+                if self._stop:
+                    return
+                generation, frame_idx, frame, tracks = self._job
+                self._job = None
+                self._running = True
+            t0 = time.perf_counter()
+            try:
+                faces = self.gender_est.get_faces_in_crops(frame, tracks.xyxy.tolist(), tile=self.tile)
+            except Exception:
+                faces = []
+            if self.metrics is not None:
+                self.metrics.observe("faces", time.perf_counter() - t0)
+                self.metrics.inc("face_jobs")
+            with self._cond:
+                self._running = False
+                self.jobs_done += 1
+                if generation == self._generation:
+                    self._result = (frame_idx, tracks, faces)
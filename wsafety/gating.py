@@ -0,0 +1,139 @@
+import math
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+from .tracks import TrackBatch, as_track_batch
+
+
+class MotionGate:
+    """
+    Cheap change score on a small grayscale copy of the frame: the fraction of pixels that differ
+    from the reference frame by more than `pixel_delta`. The reference is the frame the detector
+    last looked at, so slow movement accumulates until it is worth another detection.
+    """
+
+    def __init__(self, width: int = 160, pixel_delta: int = 18):
+        self.width = int(width)
+        self.pixel_delta = int(pixel_delta)
+        self._ref: Optional[np.ndarray] = None
+        self._pending: Optional[np.ndarray] = None
+
+    def _small(self, frame) -> np.ndarray:
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, int(round(h * self.width / w))))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def score(self, frame) -> float:
+        """Change since the reference in [0, 1]; 1.0 when there is no (compatible) reference."""
+        small = self._small(frame)
+        if self._ref is None or self._ref.shape != small.shape:
+            self._pending = small
+            return 1.0
+        self._pending = small
+        return float(np.count_nonzero(cv2.absdiff(small, self._ref) > self.pixel_delta)) / small.size
+
+    def mark_reference(self) -> None:
+        """Use the frame passed to the last score() call as the new reference (call after detecting)."""
+        self._ref = self._pending
+
+    def reset(self) -> None:
+        self._ref = None
+
+
+class AdaptiveRate:
+    """
+    Picks the detection rate per camera:
+      busy   (motion above threshold, or risk MEDIUM/HIGH, within the last `calm_after` s): max_fps
+      active (people in view, little motion): the geometric mean of min_fps and max_fps
+      idle   (nobody in view, no motion): min_fps
+    max_fps=None means every captured frame when busy.
+    """
+
+    def __init__(
+        self,
+        min_fps: float = 1.0,
+        max_fps: Optional[float] = None,
+        motion_threshold: float = 0.005,
+        calm_after: float = 2.0,
+        risk_level: Optional[Callable[[], str]] = None,
+    ):
+        self.min_fps = max(1e-3, float(min_fps))
+        self.max_fps = float(max_fps) if max_fps else None
+        self.motion_threshold = float(motion_threshold)
+        self.calm_after = float(calm_after)
+        self.risk_level = risk_level
+        self.gate = MotionGate()
+        self.reset()
+
+    def reset(self) -> None:
+        self.gate.reset()
+        self.mode = "busy"
+        self._last_detect = -math.inf
+        self._busy_until = -math.inf
+
+    def interval(self, mode: str) -> float:
+        top = self.max_fps or 30.0
+        if mode == "busy":
+            return 1.0 / self.max_fps if self.max_fps else 0.0
+        if mode == "active":
+            return 1.0 / math.sqrt(self.min_fps * top)
+        return 1.0 / self.min_fps
+
+    def should_detect(self, frame, now: float, n_tracks: int) -> bool:
+        motion = self.gate.score(frame)
+        level = self.risk_level() if self.risk_level is not None else "LOW"
+        if motion >= self.motion_threshold or level in ("MEDIUM", "HIGH"):
+            self._busy_until = now + self.calm_after
+        if now < self._busy_until:
+            self.mode = "busy"
+        elif n_tracks:
+            self.mode = "active"
+        else:
+            self.mode = "idle"
+        if now - self._last_detect < self.interval(self.mode):
+            return False
+        self._last_detect = now
+        self.gate.mark_reference()
+        return True
+
+
+class BoxExtrapolator:
+    """
+    Keeps the last detected box and a smoothed velocity per track, and moves boxes along it between
+    detections so current_tracks, risk and overlays stay continuous. Extrapolation stops after
+    `horizon` seconds; the set of tracks only changes on detection.
+    """
+
+    def __init__(self, horizon: float = 1.0, smoothing: float = 0.5):
+        self.horizon = float(horizon)
+        self.smoothing = float(smoothing)
+        self.reset()
+
+    def reset(self) -> None:
+        self._batch = TrackBatch()  # last detections
+        self._vel = np.zeros((0, 4))
+        self._t = 0.0
+
+    def observe(self, tracks, now: float) -> None:
+        batch = as_track_batch(tracks)
+        vel = np.zeros((len(batch), 4))
+        prev = self._batch
+        if len(prev) and now > self._t:
+            # Rows of tracks that were also in the previous detection
+            order = np.argsort(prev.ids, kind="stable")
+            pos = np.minimum(np.searchsorted(prev.ids, batch.ids, sorter=order), len(order) - 1)
+            cur = np.flatnonzero(prev.ids[order[pos]] == batch.ids)
+            old = order[pos[cur]]
+            inst = (batch.xyxy[cur] - prev.xyxy[old]) / (now - self._t)
+            vel[cur] = self.smoothing * inst + (1.0 - self.smoothing) * self._vel[old]
+        self._batch, self._vel, self._t = batch, vel, now
+
+    def predict(self, now: float) -> TrackBatch:
+        b = self._batch
+        dt = min(max(0.0, now - self._t), self.horizon)
+        return TrackBatch(b.ids, b.xyxy + self._vel * dt, b.conf, b.cls)
@@ -1,8 +1,20 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+import cv2
+import numpy as np
 from insightface.app import FaceAnalysis
 
-from .utils import center_of_box, distance, point_in_box
+from .face_memory import FaceMemory
+from .risk import GENDER_CODES
+from .tracks import GENDER_LETTERS, ConfView, GenderView, TrackBatch, as_track_batch
+
+try:
+    import lap
+except ImportError:  # optional: fall back to greedy matching
+    lap = None
+
+# Matrices larger than this a side are matched greedily; lapjv cost grows cubically
+LAP_MAX_SIZE = 128
 
 
 def _map_gender(face) -> Tuple[str, float]:
@@ -28,12 +40,31 @@ def _map_gender(face) -> Tuple[str, float]:
     return ("M" if g >= 0.5 else "F"), det_score
 
 
+def _shift_face(face, tx: float, ty: float, scale: float, ox: float, oy: float):
+    """Map a face found at (tx, ty) in a crop scaled by `scale` back to frame coordinates (crop origin ox, oy)."""
+    bbox = np.asarray(face.bbox, dtype=np.float32)
+    face.bbox = (bbox - [tx, ty, tx, ty]) / scale + [ox, oy, ox, oy]
+    kps = getattr(face, "kps", None)
+    if kps is not None:
+        face.kps = (np.asarray(kps, dtype=np.float32) - [tx, ty]) / scale + [ox, oy]
+    return face
+
+
 class GenderEstimator:
-    def __init__(self, providers=None, name: str = "buffalo_l", det_size=(640, 640)):
+    def __init__(self, providers=None, name: str = "buffalo_l", det_size=(640, 640), root: str = "~/.insightface", memory_ttl: float = 30.0):
+        """memory_ttl: seconds a face embedding is remembered for re-identification; 0 disables it."""
         if providers is None:
             providers = ["CPUExecutionProvider"]
-        self.app = FaceAnalysis(name=name, providers=providers)
-        self.app.prepare(ctx_id=0, det_size=det_size)
+        self.det_size = tuple(det_size)
+        self.app = FaceAnalysis(name=name, root=root, providers=providers)
+        self.app.prepare(ctx_id=0, det_size=self.det_size)
+        # Embeddings of recently seen faces, so tracks re-issued by ByteTrack keep their gender (see face_memory.py)
+        self.memory: Optional[FaceMemory] = FaceMemory(ttl=memory_ttl) if memory_ttl and memory_ttl > 0 else None
+
+    def warm_up(self) -> None:
+        """Run the face detector once on a blank image so the first real frame does not pay for ONNX Runtime's first run."""
+        w, h = self.det_size
+        self.get_faces(np.zeros((h, w, 3), dtype=np.uint8))
 
     def get_faces(self, frame) -> List:
         """
@@ -44,41 +75,187 @@ class GenderEstimator:
         except Exception:
             return []
 
+    def get_faces_in_crops(
+        self,
+        frame,
+        boxes: Sequence[Sequence[float]],
+        tile: bool = True,
+        cell: int = 160,
+        upper: float = 0.55,
+        max_upscale: float = 2.0,
+    ) -> List:
+        """
+        Run face analysis only on the upper-body crops of the given person boxes.
+        With tile=True the crops are packed into det_size mosaics (cell x cell slots) so a batch of
+        tracks costs one detector pass; otherwise each crop is analysed on its own.
+        Returned faces have bbox/kps mapped back to frame coordinates.
+        """
+        H, W = frame.shape[:2]
+        crops = []  # (x0, y0, crop)
+        for x1, y1, x2, y2 in boxes:
+            bw, bh = x2 - x1, y2 - y1
+            cx1, cx2 = max(0, int(x1 - 0.1 * bw)), min(W, int(x2 + 0.1 * bw))
+            cy1, cy2 = max(0, int(y1 - 0.05 * bh)), min(H, int(y1 + upper * bh))
+            if cx2 - cx1 >= 8 and cy2 - cy1 >= 8:
+                crops.append((cx1, cy1, frame[cy1:cy2, cx1:cx2]))
+
+        faces = []
+        if not tile:
+            for ox, oy, crop in crops:
+                for f in self.get_faces(crop):
+                    faces.append(_shift_face(f, 0, 0, 1.0, ox, oy))
+            return faces
+
+        det_w, det_h = self.det_size
+        cols, rows = max(1, det_w // cell), max(1, det_h // cell)
+        per_tile = cols * rows
+        for start in range(0, len(crops), per_tile):
+            canvas = np.zeros((det_h, det_w, 3), dtype=frame.dtype)
+            slots = []  # (tx, ty, w, h, scale, ox, oy)
+            for k, (ox, oy, crop) in enumerate(crops[start : start + per_tile]):
+                r, c = divmod(k, cols)
+                ch, cw = crop.shape[:2]
+                scale = min(cell / cw, cell / ch, max_upscale)
+                rw, rh = max(1, int(cw * scale)), max(1, int(ch * scale))
+                tx, ty = c * cell, r * cell
+                canvas[ty : ty + rh, tx : tx + rw] = cv2.resize(crop, (rw, rh), interpolation=cv2.INTER_LINEAR)
+                slots.append((tx, ty, rw, rh, scale, ox, oy))
+
+            for f in self.get_faces(canvas):
+                fb = getattr(f, "bbox", None)
+                if fb is None:
+                    continue
+                fx, fy = (fb[0] + fb[2]) / 2, (fb[1] + fb[3]) / 2
+                for tx, ty, rw, rh, scale, ox, oy in slots:
+                    if tx <= fx < tx + rw and ty <= fy < ty + rh:
+                        faces.append(_shift_face(f, tx, ty, scale, ox, oy))
+                        break
+        return faces
+
     def assign_genders(
         self,
-        tracks: Dict[int, dict],
+        tracks: Union[TrackBatch, Dict[int, dict]],
         faces: List,
         track_gender: Dict[int, str],
         track_gender_conf: Dict[int, float],
-    ) -> None:
+    ) -> int:
         """
         Assign genders to tracks by matching detected faces to person boxes.
-        Updates track_gender and track_gender_conf in place.
+        Each face goes to at most one track: among boxes containing the face center, the
+        assignment minimising total center distance wins. With a face memory, a matched face that
+        belongs to a recently seen person brings that person's more confident gender along.
+        Updates track_gender and track_gender_conf in place; returns how many matched faces took
+        their gender from the memory.
         """
-        # Preprocess faces: (face_center, gender, gconf)
-        processed = []
-        for f in faces:
-            fb = getattr(f, "bbox", None)
-            if fb is None:
-                continue
-            x1, y1, x2, y2 = [int(v) for v in fb]
-            fctr = ((x1 + x2) // 2, (y1 + y2) // 2)
-            g, gconf = _map_gender(f)
-            processed.append((fctr, g, gconf))
-
-        # For each track, find nearest face center that lies inside its bbox
-        for tid, tr in tracks.items():
-            best = None
-            best_dist = 1e9
-            tctr = center_of_box(tr["xyxy"])
-            for fctr, g, gconf in processed:
-                if point_in_box(fctr, tr["xyxy"]):
-                    d = distance(tctr, fctr)
-                    if d < best_dist:
-                        best = (g, gconf)
-                        best_dist = d
-            if best is not None:
-                g, gconf = best
-                if g != "U" and (gconf >= track_gender_conf[tid] or track_gender[tid] == "U"):
-                    track_gender[tid] = g
-                    track_gender_conf[tid] = gconf
\ No newline at end of file
+        if not tracks or not faces:
+            return 0
+        centers, codes, gconfs, embs = _face_arrays(faces)
+        if len(centers) == 0:
+            return 0
+
+        batch = as_track_batch(tracks)
+        tids = batch.ids
+        t_idx, f_idx = match_faces_to_tracks(batch.xyxy, centers)
+        if len(t_idx) == 0:
+            return 0
+        codes, gconfs = codes[f_idx], gconfs[f_idx]
+        inherited = 0
+        if self.memory is not None and embs is not None:
+            seen_codes, seen_gconfs = self.memory.resolve(embs[f_idx], codes, gconfs)
+            inherited = int(np.count_nonzero((seen_codes != codes) | (seen_gconfs != gconfs)))
+            codes, gconfs = seen_codes, seen_gconfs
+        _apply_matches(tids[t_idx], codes, gconfs, track_gender, track_gender_conf)
+        return inherited
+
+
+def _face_arrays(faces: List) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    (F,2) int face centers, (F,) gender codes and (F,) confidences for faces with a bbox, plus
+    their (F, D) embeddings (zero rows where missing), or None when no face carries one.
+    """
+    bboxes, codes, gconfs, embs = [], [], [], []
+    for f in faces:
+        fb = getattr(f, "bbox", None)
+        if fb is None:
+            continue
+        g, gconf = _map_gender(f)
+        bboxes.append([int(v) for v in fb])
+        codes.append(GENDER_CODES[g])
+        gconfs.append(gconf)
+        embs.append(getattr(f, "embedding", None))
+    fb = np.array(bboxes, dtype=np.int64).reshape(-1, 4)
+    centers = (fb[:, :2] + fb[:, 2:]) // 2
+    emb = None
+    dim = next((len(e) for e in embs if e is not None), 0)
+    if dim:
+        emb = np.zeros((len(embs), dim), dtype=np.float32)
+        for i, e in enumerate(embs):
+            if e is not None:
+                emb[i] = e
+    return centers, np.array(codes, dtype=np.int8), np.array(gconfs, dtype=np.float64), emb
+
+
+def match_faces_to_tracks(boxes: np.ndarray, face_centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    One-to-one matching of face centers to person boxes (xyxy). A pair is allowed when the face
+    center lies inside the box; its cost is the distance to the box center. The masked distance
+    matrix of the boxes and faces with a candidate is solved with lap.lapjv when available (up to
+    LAP_MAX_SIZE a side), otherwise greedily by ascending distance.
+    Returns (track_rows, face_rows) of the matched pairs.
+    """
+    fx, fy = face_centers[None, :, 0], face_centers[None, :, 1]
+    inside = (boxes[:, None, 0] <= fx) & (fx <= boxes[:, None, 2]) & (boxes[:, None, 1] <= fy) & (fy <= boxes[:, None, 3])
+    if not inside.any():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Same integer box centers as utils.center_of_box
+    tc = ((boxes[:, :2] + boxes[:, 2:]) / 2).astype(np.int64)
+    d = tc[:, None, :] - face_centers[None, :, :]
+    dist = np.sqrt((d * d).sum(axis=2))
+
+    # Boxes and faces without a candidate only make the problem bigger
+    rows, cols = np.flatnonzero(inside.any(axis=1)), np.flatnonzero(inside.any(axis=0))
+    if lap is not None and max(len(rows), len(cols)) <= LAP_MAX_SIZE:
+        inside, dist = inside[np.ix_(rows, cols)], dist[np.ix_(rows, cols)]
+        # Leaving a pair unmatched costs more than any matching's total distance, so more pairs always
+        # win; a limit near the distances (not a huge constant) keeps lapjv's float sums exact
+        limit = float(dist[inside].sum()) + 1.0
+        _, x, _ = lap.lapjv(np.where(inside, dist, 2 * limit), extend_cost=True, cost_limit=limit)
+        t_idx = np.flatnonzero(x >= 0)
+        f_idx = x[t_idx]
+        ok = inside[t_idx, f_idx]
+        return rows[t_idx[ok]], cols[f_idx[ok]]
+
+    t_cand, f_cand = np.nonzero(inside)
+    order = np.argsort(dist[t_cand, f_cand], kind="stable")
+    t_used, f_used = set(), set()
+    t_idx, f_idx = [], []
+    for t, f in zip(t_cand[order].tolist(), f_cand[order].tolist()):
+        if t not in t_used and f not in f_used:
+            t_used.add(t)
+            f_used.add(f)
+            t_idx.append(t)
+            f_idx.append(f)
+    return np.array(t_idx, dtype=np.int64), np.array(f_idx, dtype=np.int64)
+
+
+def _apply_matches(tids: np.ndarray, codes: np.ndarray, gconfs: np.ndarray, track_gender, track_gender_conf) -> None:
+    """Keep a face's gender when it is known and at least as confident as the track's current one (or the track is "U")."""
+    known = codes != GENDER_CODES["U"]
+    tids, codes, gconfs = tids[known], codes[known], gconfs[known]
+    if len(tids) == 0:
+        return
+
+    if isinstance(track_gender, GenderView) and isinstance(track_gender_conf, ConfView):
+        # TrackStore-backed: update the slot arrays in one go
+        store = track_gender._store
+        slots = np.fromiter((store.slot(int(t)) for t in tids), dtype=np.int64, count=len(tids))
+        take = (gconfs.astype(np.float32) >= store.gconf[slots]) | (store.gender[slots] == GENDER_CODES["U"])
+        store.gender[slots[take]] = codes[take]
+        store.gconf[slots[take]] = gconfs[take]
+        return
+
+    for tid, code, gconf in zip(tids.tolist(), codes.tolist(), gconfs.tolist()):
+        if gconf >= track_gender_conf[tid] or track_gender[tid] == "U":
+            track_gender[tid] = GENDER_LETTERS[code]
+            track_gender_conf[tid] = gconf
@@ -0,0 +1,299 @@
+"""
+Per-camera history of counts, ratio and risk for staffing and incident review, in SQLite.
+
+Pipelines fold every frame into an in-memory per-second bucket (FrameAggregator): a few additions
+per frame, whatever the frame rate. Finished buckets go through a per-camera collections.deque,
+like alerts (see dispatch.py), and HistoryStore writes them from its own thread, batched into one
+transaction per flush_interval. Each batch is upserted into three tables with identical columns,
+one row per camera and second, minute and hour:
+
+    t            bucket start (unix seconds)
+    frames       frames analysed in the bucket
+    male_sum, female_sum, score_sum, events    sums over those frames
+    male_max, female_max, score_max            maxima
+
+Upserts add sums and take maxima, so minute and hour rollups are kept up to date incrementally
+and a bucket delivered in two parts still adds up. Rows are keyed (camera, t) in WITHOUT ROWID
+tables, so a range query reads one contiguous stretch of the primary key: a month at hourly
+resolution is 720 rows. Alerts (deduplicated, see AlertDispatcher) are kept in an alerts table.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Deque, Dict, List, Optional
+
+from .dispatch import AlertSink
+from .risk import risk_level
+
+# Buckets buffered per camera between flushes; an hour at one bucket per second
+HISTORY_BACKLOG = 3600
+
+# Table and bucket width in seconds per resolution, finest first
+RESOLUTIONS = (("1s", 1), ("1m", 60), ("1h", 3600))
+
+_COLUMNS = ("frames", "male_sum", "female_sum", "score_sum", "events", "male_max", "female_max", "score_max")
+_SUMS = _COLUMNS[:5]
+_MAXES = _COLUMNS[5:]
+
+
+def _table(step: str) -> str:
+    return f"history_{step}"
+
+
+class FrameAggregator:
+    """
+    Accumulates per-frame values into the current second and appends each finished bucket to `out`
+    as (t, frames, male_sum, female_sum, score_sum, events, male_max, female_max, score_max).
+    """
+
+    def __init__(self, out: Deque[tuple]):
+        self.out = out
+        self._t: Optional[int] = None
+        self._acc = [0] * len(_COLUMNS)
+
+    def add(self, ts: float, male: int, female: int, score: int, events: int) -> None:
+        t = int(ts)
+        if t != self._t:
+            self.flush()
+            self._t = t
+        a = self._acc
+        a[0] += 1
+        a[1] += male
+        a[2] += female
+        a[3] += score
+        a[4] += events
+        if male > a[5]:
+            a[5] = male
+        if female > a[6]:
+            a[6] = female
+        if score > a[7]:
+            a[7] = score
+
+    def flush(self) -> None:
+        """Emit the bucket in progress (e.g. when the stream stops)."""
+        if self._t is not None and self._acc[0]:
+            self.out.append((self._t,) + tuple(self._acc))
+        self._t = None
+        self._acc = [0] * len(_COLUMNS)
+
+
+class HistoryStore:
+    """
+    Writes per-camera buckets from their inboxes to SQLite on a background thread and answers range
+    queries. Rows older than `retention` (seconds per resolution, and for "alerts"; None keeps them)
+    are pruned hourly. The database is only opened (and created) by start(), a write or a query.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 1.0,
+        retention: Optional[Dict[str, Optional[float]]] = None,
+    ):
+        self.path = path
+        self.flush_interval = float(flush_interval)
+        self.retention = {"1s": 7 * 86400.0, "1m": 90 * 86400.0, "1h": None, "alerts": 90 * 86400.0}
+        self.retention.update(retention or {})
+        self.written = 0  # buckets stored
+        self._inboxes: Dict[str, Deque[tuple]] = {}
+        self._alerts: List[dict] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._pruned = 0.0
+        self._db: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict] = None) -> Optional["HistoryStore"]:
+        """Store for the `history` section of cameras.yaml, or None when its path is unset."""
+        settings = settings or {}
+        if not settings.get("path"):
+            return None
+        days = settings.get("retention_days") or {}
+        retention = {key: (None if d is None else float(d) * 86400.0) for key, d in days.items()}
+        return cls(settings["path"], flush_interval=settings.get("flush_interval", 1.0), retention=retention)
+
+    def _open(self) -> sqlite3.Connection:
+        """The writer connection, opening the file and creating the tables on first use."""
+        with self._lock:
+            if self._db is not None:
+                return self._db
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")  # readers never wait for the writer
+            db.execute("PRAGMA synchronous=NORMAL")
+            cols = ", ".join(f"{c} INTEGER NOT NULL" for c in _COLUMNS)
+            with db:
+                for step, _ in RESOLUTIONS:
+                    db.execute(f"CREATE TABLE IF NOT EXISTS {_table(step)} (camera TEXT NOT NULL, t INTEGER NOT NULL, {cols}, PRIMARY KEY (camera, t)) WITHOUT ROWID")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS alerts (camera TEXT NOT NULL, ts REAL NOT NULL, kind TEXT, level TEXT, message TEXT, repeats INTEGER)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS alerts_camera_ts ON alerts (camera, ts)")
+            self._db = db
+            return db
+
+    def add_inbox(self, camera: str, inbox: Deque[tuple]) -> None:
+        self._inboxes[camera] = inbox
+
+    def record_alert(self, alert: dict) -> None:
+        with self._lock:
+            self._alerts.append(alert)
+
+    def start(self) -> None:
+        self._open()
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as exc:
+                print(f"[history] write failed: {exc!r}")
+
+    def flush(self) -> int:
+        """Write everything queued so far in one transaction; returns the number of buckets."""
+        rows = []
+        for camera, inbox in list(self._inboxes.items()):
+            while inbox:
+                rows.append((camera,) + inbox.popleft())
+        with self._lock:
+            alerts, self._alerts = self._alerts, []
+        if not rows and not alerts:
+            return 0
+        db = self._open()
+        with db:
+            for step, width in RESOLUTIONS:
+                self._upsert(db, step, rows if width == 1 else self._rollup(rows, width))
+            db.executemany(
+                "INSERT INTO alerts VALUES (?, ?, ?, ?, ?, ?)",
+                [(a["camera"], a["ts"], a["kind"], a["level"], a["message"], a["repeats"]) for a in alerts],
+            )
+        self.written += len(rows)
+        now = time.time()
+        if now - self._pruned >= 3600:
+            self._pruned = now
+            self.prune(now)
+        return len(rows)
+
+    @staticmethod
+    def _rollup(rows: List[tuple], width: int) -> List[tuple]:
+        # Merge the batch's buckets per (camera, coarser bucket) before touching the table
+        merged: Dict[tuple, list] = {}
+        for row in rows:
+            key = (row[0], row[1] - row[1] % width)
+            acc = merged.get(key)
+            if acc is None:
+                merged[key] = list(row[2:])
+                continue
+            for i in range(len(_SUMS)):
+                acc[i] += row[2 + i]
+            for i in range(len(_SUMS), len(_COLUMNS)):
+                acc[i] = max(acc[i], row[2 + i])
+        return [key + tuple(acc) for key, acc in merged.items()]
+
+    @staticmethod
+    def _upsert(db: sqlite3.Connection, step: str, rows: List[tuple]) -> None:
+        updates = ", ".join([f"{c} = {c} + excluded.{c}" for c in _SUMS] + [f"{c} = max({c}, excluded.{c})" for c in _MAXES])
+        marks = ", ".join("?" * (2 + len(_COLUMNS)))
+        sql = f"INSERT INTO {_table(step)} (camera, t, {', '.join(_COLUMNS)}) VALUES ({marks}) ON CONFLICT (camera, t) DO UPDATE SET {updates}"
+        db.executemany(sql, rows)
+
+    def prune(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        db = self._open()
+        with db:
+            for step, _ in RESOLUTIONS:
+                keep = self.retention.get(step)
+                if keep:
+                    db.execute(f"DELETE FROM {_table(step)} WHERE t < ?", (int(now - keep),))
+            keep = self.retention.get("alerts")
+            if keep:
+                db.execute("DELETE FROM alerts WHERE ts < ?", (now - keep,))
+
+    # Queries (any thread)
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self._open()  # the tables exist before the first query
+            db = self._local.db = sqlite3.connect(self.path, timeout=10.0)
+        return db
+
+    @staticmethod
+    def pick_step(start: float, end: float, max_points: int = 2000) -> str:
+        """The finest resolution that covers [start, end) in at most max_points buckets."""
+        for step, width in RESOLUTIONS:
+            if (end - start) / width <= max_points:
+                return step
+        return RESOLUTIONS[-1][0]
+
+    def query(self, camera: str, start: float, end: float, step: Optional[str] = None) -> dict:
+        """
+        Buckets of `camera` with start <= t < end at resolution `step` ("1s", "1m" or "1h"; by default
+        the finest with at most 2000 points), start floored to the bucket width so the first bucket
+        is whole. Returns {"camera", "step", "points"} where each point
+        has t, frames, male / female / score averages and maxima, ratio (male per female, None without
+        females), level (at the bucket's worst score) and events.
+        """
+        step = step or self.pick_step(start, end)
+        width = dict(RESOLUTIONS).get(step)
+        if width is None:
+            raise ValueError(f"step must be one of {[s for s, _ in RESOLUTIONS]}")
+        start = int(start) - int(start) % width
+        cur = self._reader().execute(
+            f"SELECT t, {', '.join(_COLUMNS)} FROM {_table(step)} WHERE camera = ? AND t >= ? AND t < ? ORDER BY t",
+            (camera, start, int(end)),
+        )
+        points = []
+        for t, frames, male, female, score, events, male_max, female_max, score_max in cur:
+            points.append(
+                {
+                    "t": t,
+                    "frames": frames,
+                    "male": round(male / frames, 2),
+                    "female": round(female / frames, 2),
+                    "male_max": male_max,
+                    "female_max": female_max,
+                    "ratio": round(male / female, 2) if female else None,
+                    "score": round(score / frames, 2),
+                    "score_max": score_max,
+                    "level": risk_level(score_max),
+                    "events": events,
+                }
+            )
+        return {"camera": camera, "step": step, "points": points}
+
+    def alerts(self, camera: str, start: float, end: float, limit: int = 1000) -> List[dict]:
+        """The newest `limit` stored alerts of `camera` with start <= ts < end, oldest first."""
+        cur = self._reader().execute(
+            "SELECT ts, kind, level, message, repeats FROM alerts WHERE camera = ? AND ts >= ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+            (camera, start, end, int(limit)),
+        )
+        rows = cur.fetchall()
+        rows.reverse()
+        return [{"ts": ts, "kind": kind, "level": level, "message": message, "repeats": repeats} for ts, kind, level, message, repeats in rows]
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5.0)
+        self.flush()
+
+
+class HistorySink(AlertSink):
+    """Stores every alert the dispatcher emits in a HistoryStore (written with its next batch)."""
+
+    def __init__(self, store: HistoryStore, max_queue: int = 1024):
+        super().__init__(max_queue)
+        self.store = store
+
+    def deliver(self, alert: dict) -> None:
+        self.store.record_alert(alert)
@@ -1,2 +1,2 @@
 # Makes wsafety a package
-__all__ = ["detector", "gender", "risk", "utils", "viz"]
\ No newline at end of file
+__all__ = ["detector", "gender", "risk", "utils", "viz", "pipeline", "stream", "cameras", "workers", "batching", "capture", "scheduler", "face_worker", "tracks", "face_memory", "encoder", "metrics", "recording", "gating", "models", "offline", "dispatch", "history", "ort_detector"]
\ No newline at end of file
@@ -0,0 +1,119 @@
+import bisect
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+# Fixed metric names: the layout below is shared with worker processes through shared memory
+STAGES = ("capture", "detect", "parse", "faces", "assign", "risk", "render", "encode", "frame")
+COUNTERS = ("frames", "frames_dropped", "detect_skipped", "encode_dropped", "face_jobs", "face_jobs_dropped", "face_memory_hits")
+GAUGES = ("live_tracks", "fps", "face_queue", "encode_queue", "model_load_seconds")
+# Latency histogram upper bounds in seconds (Prometheus "le"), the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, math.inf)
+
+_STAGE_WIDTH = len(BUCKETS) + 2  # bucket counts, sum, count
+_STAGE_INDEX = {name: i * _STAGE_WIDTH for i, name in enumerate(STAGES)}
+_COUNTER_INDEX = {name: len(STAGES) * _STAGE_WIDTH + i for i, name in enumerate(COUNTERS)}
+_GAUGE_INDEX = {name: len(STAGES) * _STAGE_WIDTH + len(COUNTERS) + i for i, name in enumerate(GAUGES)}
+
+
+class StageMetrics:
+    """
+    Per-camera stage latencies, counters and gauges in one flat float64 array.
+
+    observe() costs a bisect and three array writes, cheap enough to leave on in production.
+    Pass a multiprocessing RawArray('d', StageMetrics.SIZE) as `buf` to share the numbers with the
+    parent process: the worker writes, the parent reads for /metrics without any messaging.
+    Histograms are cumulative like Prometheus expects; rolling views come from rate() over a window.
+    """
+
+    SIZE = len(STAGES) * _STAGE_WIDTH + len(COUNTERS) + len(GAUGES)
+
+    def __init__(self, buf=None):
+        self.values = np.frombuffer(buf, dtype=np.float64) if buf is not None else np.zeros(self.SIZE)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        base = _STAGE_INDEX[stage]
+        v = self.values
+        v[base + bisect.bisect_left(BUCKETS, seconds)] += 1
+        v[base + len(BUCKETS)] += seconds
+        v[base + len(BUCKETS) + 1] += 1
+
+    def inc(self, counter: str, n: float = 1) -> None:
+        self.values[_COUNTER_INDEX[counter]] += n
+
+    def set(self, gauge: str, value: float) -> None:
+        self.values[_GAUGE_INDEX[gauge]] = value
+
+    def count(self, stage: str) -> int:
+        return int(self.values[_STAGE_INDEX[stage] + len(BUCKETS) + 1])
+
+    def mean(self, stage: str) -> Optional[float]:
+        base = _STAGE_INDEX[stage]
+        n = self.values[base + len(BUCKETS) + 1]
+        return float(self.values[base + len(BUCKETS)] / n) if n else None
+
+    def counter(self, name: str) -> float:
+        return float(self.values[_COUNTER_INDEX[name]])
+
+    def gauge(self, name: str) -> float:
+        return float(self.values[_GAUGE_INDEX[name]])
+
+    def reset(self) -> None:
+        self.values[:] = 0
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**kw) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in kw.items()) + "}"
+
+
+def render_prometheus(
+    per_camera: Dict[str, StageMetrics],
+    extra: Optional[Dict[str, Dict[str, float]]] = None,
+    counters: Optional[Dict[str, Dict[str, float]]] = None,
+) -> str:
+    """
+    Prometheus text exposition for all cameras.
+    extra: {metric_name: {cam_id: value}} gauges kept outside StageMetrics (e.g. viewer counts).
+    counters: {metric_name: {cam_id: value}} cumulative counts kept outside StageMetrics (e.g. alerts
+    sent), exposed as wsafety_<name>_total.
+    """
+    lines = [
+        "# HELP wsafety_stage_seconds Per-frame latency of each pipeline stage, cumulative since the app started (use rate()).",
+        "# TYPE wsafety_stage_seconds histogram",
+    ]
+    snaps = {cam: m.values.copy() for cam, m in per_camera.items()}
+    for cam, v in snaps.items():
+        for stage, base in _STAGE_INDEX.items():
+            total = v[base + len(BUCKETS) + 1]
+            if not total:
+                continue
+            cumulative = np.cumsum(v[base : base + len(BUCKETS)])
+            for le, c in zip(BUCKETS, cumulative):
+                lines.append(f"wsafety_stage_seconds_bucket{_labels(camera=cam, stage=stage, le=_fmt(le))} {_fmt(c)}")
+            lines.append(f"wsafety_stage_seconds_sum{_labels(camera=cam, stage=stage)} {_fmt(v[base + len(BUCKETS)])}")
+            lines.append(f"wsafety_stage_seconds_count{_labels(camera=cam, stage=stage)} {_fmt(total)}")
+
+    for name, idx in _COUNTER_INDEX.items():
+        lines.append(f"# TYPE wsafety_{name}_total counter")
+        lines.extend(f"wsafety_{name}_total{_labels(camera=cam)} {_fmt(v[idx])}" for cam, v in snaps.items())
+    for name, idx in _GAUGE_INDEX.items():
+        lines.append(f"# TYPE wsafety_{name} gauge")
+        lines.extend(f"wsafety_{name}{_labels(camera=cam)} {_fmt(v[idx])}" for cam, v in snaps.items())
+    for name, values in (counters or {}).items():
+        lines.append(f"# TYPE wsafety_{name}_total counter")
+        lines.extend(f"wsafety_{name}_total{_labels(camera=cam)} {_fmt(val)}" for cam, val in values.items())
+    for name, values in (extra or {}).items():
+        lines.append(f"# TYPE wsafety_{name} gauge")
+        lines.extend(f"wsafety_{name}{_labels(camera=cam)} {_fmt(val)}" for cam, val in values.items())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Downloaded weights, InsightFace model packs and exported detector artifacts live here, so
+# restarts (and containers with the directory mounted) skip downloads and exports.
+CACHE_DIR = os.environ.get("WSAFETY_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "wsafety"))
+
+
+class ModelRegistry:
+    """
+    Process-wide, lazily filled cache of models.
+
+    Detectors carry per-stream tracking state, so every camera gets its own PersonDetector, but
+    the weights and exported artifacts behind it are resolved once and kept on disk.
+    GenderEstimators are shared by every camera of the process with the same settings, including
+    their FaceMemory: on purpose, so a person walking from one camera's view into another's keeps
+    their gender (the memory is keyed by face embedding, not by per-camera track id).
+    Models are warmed up with a dummy inference before they are handed out; load_seconds records
+    how long each one took to load and warm up.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.load_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._gender: Dict[Tuple, object] = {}
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, "exports.json")
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _remember(self, index: dict, key: str, path: str) -> None:
+        index[key] = path
+        with open(self._index_path(), "w", encoding="utf-8") as fh:
+            json.dump(index, fh, indent=2)
+
+    def weights_path(self, model_name: str) -> str:
+        """Local weights file; bare names (e.g. yolov8n.pt) are downloaded into the cache directory."""
+        if os.path.dirname(model_name) or os.path.exists(model_name):
+            return model_name
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return os.path.join(self.cache_dir, model_name)
+
+    def detector_path(self, model_name: str, export: Optional[str] = None, imgsz: int = 640, dynamic: bool = False) -> str:
+        """
+        Path to load a YOLO model from. With `export` (e.g. "onnx", "openvino") the weights are
+        exported once and the artifact is reused by later starts; dynamic=True allows batched input.
+        """
+        weights = self.weights_path(model_name)
+        if not export:
+            return weights
+        key = f"{os.path.abspath(weights)}|{export}|{imgsz}|{int(dynamic)}"
+        with self._export_lock:
+            index = self._read_index()
+            path = index.get(key)
+            if path and os.path.exists(path):
+                return path
+            from ultralytics import YOLO
+
+            t0 = time.perf_counter()
+            exported = YOLO(weights).export(format=export, imgsz=imgsz, dynamic=dynamic)
+            # One artifact per (format, size, dynamic); the file name is kept because Ultralytics
+            # recognises some formats by it (e.g. *_openvino_model)
+            exported = str(exported).rstrip("/\\")
+            variant = os.path.join(self.cache_dir, "exports", f"{export}-{imgsz}{'-dynamic' if dynamic else ''}")
+            path = os.path.join(variant, os.path.basename(exported))
+            os.makedirs(variant, exist_ok=True)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            shutil.move(exported, path)
+            self._remember(index, key, path)
+            print(f"[models] exported {model_name} to {path} in {time.perf_counter() - t0:.1f}s")
+            return path
+
+    def onnx_detector_path(self, model_name: str, imgsz: int = 640, quantize: Optional[str] = None, calibration: Optional[str] = None) -> str:
+        """
+        Person-only ONNX export of a YOLO model for the onnxruntime backend, INT8-quantized with
+        `quantize` ("dynamic", or "static" calibrated on `calibration` frames); built once and cached.
+        """
+        from .ort_detector import person_only, quantize_model
+
+        exported = model_name if model_name.endswith(".onnx") else self.detector_path(model_name, "onnx", imgsz)
+        calib = ""
+        if quantize == "static" and calibration:
+            calib = f"{os.path.abspath(calibration)}@{int(os.path.getmtime(calibration))}"
+        key = f"{os.path.abspath(exported)}|person|{quantize or 'fp32'}|{calib}"
+        with self._export_lock:
+            index = self._read_index()
+            path = index.get(key)
+            if path and os.path.exists(path):
+                return path
+            t0 = time.perf_counter()
+            stem = os.path.splitext(os.path.basename(exported))[0]
+            variant = os.path.join(self.cache_dir, "exports", f"onnxruntime-{imgsz}")
+            os.makedirs(variant, exist_ok=True)
+            path = os.path.join(variant, f"{stem}-person.onnx")
+            if quantize:
+                # Calibration sets get their own file so switching between them needs no rebuild
+                tag = f"{quantize}-{hashlib.sha1(calib.encode()).hexdigest()[:8]}" if calib else quantize
+                person, path = path, os.path.join(variant, f"{stem}-person-{tag}.onnx")
+                person_only(exported, person)
+                quantize_model(person, path, quantize, calibration, imgsz)
+            else:
+                person_only(exported, path)
+            self._remember(index, key, path)
+            print(f"[models] built {os.path.basename(path)} from {model_name} in {time.perf_counter() - t0:.1f}s")
+            return path
+
+    def insightface_root(self, name: str) -> str:
+        """InsightFace's own ~/.insightface when the pack is already there, else the cache directory."""
+        legacy = os.path.join(os.path.expanduser("~"), ".insightface")
+        if os.path.isdir(os.path.join(legacy, "models", name)):
+            return legacy
+        return os.path.join(self.cache_dir, "insightface")
+
+    def person_detector(
+        self,
+        model_name: str,
+        export: Optional[str] = None,
+        warmup: bool = True,
+        backend: str = "ultralytics",
+        quantize: Optional[str] = None,
+        calibration: Optional[str] = None,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+    ):
+        """
+        A PersonDetector; backend="onnxruntime" runs the person-only ONNX export (quantized with
+        `quantize`) on ONNX Runtime with the given thread counts instead of loading the model in Ultralytics.
+        """
+        t0 = time.perf_counter()
+        if backend == "onnxruntime":
+            from .ort_detector import OrtPersonDetector
+
+            path = self.onnx_detector_path(model_name, quantize=quantize, calibration=calibration)
+            detector = OrtPersonDetector(path, intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+        else:
+            from .detector import PersonDetector
+
+            detector = PersonDetector(model_name=self.detector_path(model_name, export))
+        if warmup:
+            detector.warm_up()
+        self.load_seconds[f"detector:{model_name}"] = time.perf_counter() - t0
+        return detector
+
+    def batched_detector(self, model_name: str, export: Optional[str] = None, warmup: bool = True, **kwargs):
+        from .batching import BatchedDetector
+
+        t0 = time.perf_counter()
+        detector = BatchedDetector(model_name=self.detector_path(model_name, export, dynamic=True), **kwargs)
+        if warmup:
+            detector.warm_up()
+        self.load_seconds[f"batched:{model_name}"] = time.perf_counter() - t0
+        return detector
+
+    def gender_estimator(self, providers=None, name: str = "buffalo_l", det_size=(640, 640), warmup: bool = True, memory_ttl: float = 30.0):
+        key = (tuple(providers or ()), name, tuple(det_size), float(memory_ttl or 0))
+        with self._lock:
+            est = self._gender.get(key)
+            if est is None:
+                from .gender import GenderEstimator
+
+                t0 = time.perf_counter()
+                est = GenderEstimator(providers=providers, name=name, det_size=det_size, root=self.insightface_root(name), memory_ttl=memory_ttl)
+                if warmup:
+                    est.warm_up()
+                self._gender[key] = est
+                self.load_seconds[f"gender:{name}"] = time.perf_counter() - t0
+            return est
+
+
+# One registry per process: worker processes fill their own on first use
+registry = ModelRegistry()
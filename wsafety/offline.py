@@ -0,0 +1,314 @@
+"""
+Headless batch processing of recorded video, using every core.
+
+Each file is split into time chunks that run in parallel worker processes. A chunk starts
+`overlap_seconds` early: those warm-up frames go through detection, tracking and face analysis
+but are not reported, so ByteTrack and the per-track genders have converged by the chunk's first
+reported frame. Results are merged in order, per source:
+
+    <save>                   annotated video (a file for one source, a directory for several)
+    <report>/<stem>.frames.csv   per frame: chunk, frame, time, persons, male, female, risk score and level
+    <report>/<stem>.events.csv   risk events and ratio alerts with their frame and time
+
+Track ids restart in every chunk (the tracker does), so reports qualify them with the chunk.
+
+    python app.py --source archive/*.mp4 --save annotated/ --workers 8
+"""
+import csv
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v", ".webm", ".mpg", ".mpeg", ".ts", ".wmv")
+
+# Models of a pool worker, loaded once by _init_worker and reused for every chunk it runs
+_models: dict = {}
+
+
+def is_video_file(source) -> bool:
+    return isinstance(source, str) and "://" not in source and os.path.isfile(source)
+
+
+def probe_video(path: str) -> Tuple[int, float, Tuple[int, int]]:
+    """(frame count, fps, (width, height)) of a video file."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Could not open {path}")
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if n <= 0:  # some containers do not store a frame count
+            n = 0
+            while cap.grab():
+                n += 1
+    finally:
+        cap.release()
+    return n, fps if fps > 0 else 30.0, size
+
+
+def plan_chunks(n_frames: int, chunk_frames: int, overlap_frames: int) -> List[Tuple[int, int, int]]:
+    """(warm_start, start, end) per chunk; frames [warm_start, start) only warm the trackers up."""
+    chunk_frames = max(1, int(chunk_frames))
+    return [(max(0, start - overlap_frames), start, min(n_frames, start + chunk_frames)) for start in range(0, n_frames, chunk_frames)]
+
+
+def _init_worker(options: dict) -> None:
+    from .models import registry
+
+    # Split the cores between workers instead of every process spinning up a thread per core
+    threads = options["threads"]
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _models["detector"] = registry.person_detector(
+        options["model"],
+        export=options["export"],
+        backend=options["backend"],
+        quantize=options["quantize"],
+        calibration=options["calibration"],
+        intra_op_threads=threads,
+    )
+    _models["gender"] = registry.gender_estimator(providers=options["providers"])
+
+
+def _seek(cap, frame_idx: int) -> None:
+    if frame_idx <= 0:
+        return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_idx:  # inexact seeking: decode up to the frame
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(frame_idx):
+            cap.grab()
+
+
+def process_chunk(job: tuple) -> dict:
+    """
+    Run one chunk in a pool worker. job = (source index, chunk index, path, fps, warm_start, start,
+    end, part path or None, options). Returns the chunk's per-frame rows and events.
+    """
+    from .alert import RatioAlert
+    from .pipeline import AnalyticsPipeline
+
+    src_idx, chunk, path, fps, warm_start, start, end, part_path, options = job
+    detector = _models["detector"]
+    if _models["gender"].memory is not None:
+        _models["gender"].memory.clear()  # chunks must not depend on which worker ran what before
+    pipeline = AnalyticsPipeline(
+        _models["gender"],
+        RatioAlert(threshold=options["ratio_threshold"], cooldown_seconds=options["ratio_cooldown"], verbose=False),
+        face_every_n=options["face_every_n"],
+        face_async=False,  # every scheduled face job finishes on its frame: results do not depend on timing
+    )
+    rows, events = [], []
+    writer = None
+    cap = cv2.VideoCapture(path)
+    t0 = time.perf_counter()
+    try:
+        _seek(cap, warm_start)
+        for i in range(warm_start, end):
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                break
+            ts = i / fps
+            tracks = detector.track_frame(frame, options["conf"], options["iou"], options["tracker"], persist=i > warm_start)
+            report = i >= start
+            vis = pipeline.process(frame, tracks, render=report and part_path is not None, now=ts)
+            if not report:
+                continue
+            if vis is not None:
+                if writer is None:
+                    h, w = vis.shape[:2]
+                    writer = cv2.VideoWriter(part_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+                writer.write(vis)
+            p = pipeline
+            rows.append((chunk, i, round(ts, 3), len(tracks), p.male_count, p.female_count, p.risk_score, p.risk_level))
+            events.extend((chunk, i, round(ts, 3), ev) for ev in p.events)
+            if p.ratio_message:
+                events.append((chunk, i, round(ts, 3), p.ratio_message))
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+        pipeline.close()
+    return {
+        "source": src_idx,
+        "chunk": chunk,
+        "rows": rows,
+        "events": events,
+        "part": part_path if writer is not None else None,
+        "seconds": time.perf_counter() - t0,
+        "frames": end - warm_start,
+    }
+
+
+def _concat_parts(parts: List[str], out_path: str, fps: float) -> None:
+    """Join chunk videos in order: losslessly with ffmpeg when available, else by re-encoding."""
+    if not parts:
+        return
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        listing = out_path + ".parts.txt"
+        with open(listing, "w", encoding="utf-8") as fh:
+            fh.writelines(f"file '{os.path.abspath(p)}'\n" for p in parts)
+        try:
+            cmd = [ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", listing, "-c", "copy", out_path]
+            if subprocess.run(cmd).returncode == 0:
+                return
+        finally:
+            os.remove(listing)
+    writer = None
+    for part in parts:
+        cap = cv2.VideoCapture(part)
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+            writer.write(frame)
+        cap.release()
+    if writer is not None:
+        writer.release()
+
+
+class _SourceOutput:
+    """Merges one source's chunk results, which arrive in order, into its report files and video."""
+
+    def __init__(self, path: str, n_chunks: int, fps: float, report_dir: str, save_path: Optional[str]):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        os.makedirs(report_dir, exist_ok=True)
+        self.path = path
+        self.n_chunks = n_chunks
+        self.fps = fps
+        self.save_path = save_path
+        self.parts: List[str] = []
+        self.done = 0
+        self._frames_fh = open(os.path.join(report_dir, f"{stem}.frames.csv"), "w", newline="", encoding="utf-8")
+        self._events_fh = open(os.path.join(report_dir, f"{stem}.events.csv"), "w", newline="", encoding="utf-8")
+        self._frames = csv.writer(self._frames_fh)
+        self._events = csv.writer(self._events_fh)
+        self._frames.writerow(("chunk", "frame", "time", "persons", "male", "female", "risk_score", "risk_level"))
+        self._events.writerow(("chunk", "frame", "time", "event"))
+        if not n_chunks:
+            self._finish()
+
+    def add(self, result: dict) -> None:
+        self._frames.writerows(result["rows"])
+        self._events.writerows(result["events"])
+        if result["part"]:
+            self.parts.append(result["part"])
+        self.done += 1
+        if self.done == self.n_chunks:
+            self._finish()
+
+    def _finish(self) -> None:
+        self._frames_fh.close()
+        self._events_fh.close()
+        if self.save_path:
+            _concat_parts(self.parts, self.save_path, self.fps)
+
+
+def run_batch(
+    sources: List[str],
+    save: Optional[str] = None,
+    report_dir: str = "reports",
+    workers: Optional[int] = None,
+    chunk_seconds: float = 120.0,
+    overlap_seconds: float = 4.0,
+    model: str = "yolov8n.pt",
+    export: Optional[str] = None,
+    backend: str = "ultralytics",
+    quantize: Optional[str] = None,
+    calibration: Optional[str] = None,
+    face_every_n: int = 5,
+    conf: float = 0.35,
+    iou: float = 0.45,
+    tracker: str = "bytetrack.yaml",
+    providers=None,
+    ratio_threshold: float = 3.0,
+    ratio_cooldown: float = 10.0,
+) -> Dict[str, int]:
+    """
+    Process video files in parallel chunks and write their reports (and annotated videos with
+    `save`). Returns the number of frames reported per source.
+    """
+    if len(sources) > 1 and save and os.path.splitext(save)[1].lower() in VIDEO_EXTENSIONS:
+        raise ValueError("--save must be a directory when several sources are given")
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    options = {
+        "model": model,
+        "export": export,
+        "backend": backend,
+        "quantize": quantize,
+        "calibration": calibration,
+        "face_every_n": face_every_n,
+        "conf": conf,
+        "iou": iou,
+        "tracker": tracker,
+        "providers": providers or ["CPUExecutionProvider"],
+        "ratio_threshold": ratio_threshold,
+        "ratio_cooldown": ratio_cooldown,
+        "threads": max(1, (os.cpu_count() or 1) // workers),
+    }
+
+    # Export (if asked) once up front, so pool workers only load the cached artifact
+    if backend == "onnxruntime":
+        from .models import registry
+
+        registry.onnx_detector_path(model, quantize=quantize, calibration=calibration)
+    elif export:
+        from .models import registry
+
+        registry.detector_path(model, export)
+
+    tmp = tempfile.mkdtemp(prefix="wsafety-batch-")
+    jobs, outputs = [], []
+    for src_idx, path in enumerate(sources):
+        n_frames, fps, _ = probe_video(path)
+        chunks = plan_chunks(n_frames, int(round(chunk_seconds * fps)), int(round(overlap_seconds * fps)))
+        save_path = None
+        if save:
+            if len(sources) == 1 and os.path.splitext(save)[1]:
+                save_path = save
+            else:
+                save_path = os.path.join(save, os.path.splitext(os.path.basename(path))[0] + ".mp4")
+            os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+        outputs.append(_SourceOutput(path, len(chunks), fps, report_dir, save_path))
+        for chunk, (warm_start, start, end) in enumerate(chunks):
+            part = os.path.join(tmp, f"{src_idx:04d}-{chunk:05d}.mp4") if save_path else None
+            jobs.append((src_idx, chunk, path, fps, warm_start, start, end, part, options))
+        print(f"[batch] {path}: {n_frames} frames at {fps:.1f} fps in {len(chunks)} chunk(s)")
+
+    reported = {path: 0 for path in sources}
+    t0 = time.perf_counter()
+    try:
+        if not jobs:
+            return reported
+        with mp.get_context("spawn").Pool(min(workers, len(jobs)), initializer=_init_worker, initargs=(options,)) as pool:
+            # imap keeps job order, so every source's chunks are merged in sequence while later ones run
+            for result in pool.imap(process_chunk, jobs):
+                out = outputs[result["source"]]
+                out.add(result)
+                reported[out.path] += len(result["rows"])
+                print(
+                    f"[batch] {out.path} chunk {result['chunk'] + 1}/{out.n_chunks}: "
+                    f"{result['frames'] / max(result['seconds'], 1e-9):.1f} frames/s"
+                )
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    total = sum(reported.values())
+    took = time.perf_counter() - t0
+    print(f"[batch] {total} frames from {len(sources)} file(s) in {took:.1f}s ({total / max(took, 1e-9):.1f} frames/s)")
+    return reported
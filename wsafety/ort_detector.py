@@ -0,0 +1,287 @@
+"""
+YOLOv8 person detection on ONNX Runtime, for CPU nodes without PyTorch inference.
+
+The model is an ONNX export of the YOLO weights reduced to its person output (see
+ModelRegistry.onnx_detector_path), optionally quantized to INT8. OrtPersonDetector does its own
+letterboxing, decoding and NMS, and feeds the detections to the same ByteTrack as the Ultralytics
+backend, so callers see the same track_frame / track_stream / current_tracks interface.
+
+Quantization (cached next to the export):
+    dynamic   INT8 weights, activations quantized per batch at run time; no data needed, but
+              ONNX Runtime's integer convolutions are slow on x86 (slower than fp32)
+    static    INT8 weights and activations (QDQ), calibrated on frames from `calibration`
+              (a video file or a directory of images); usually the fastest on CPU
+The detection head's box decoding stays in float in both cases: quantizing it costs more
+accuracy than it saves time.
+"""
+import os
+import time
+from typing import Generator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .detector import PersonDetector, make_byte_tracker, parse_tracker_output
+from .tracks import TrackBatch
+
+QUANTIZE_MODES = ("dynamic", "static")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def letterbox(frame: np.ndarray, imgsz: int = 640) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Resize keeping the aspect ratio and pad to imgsz x imgsz (grey, centred), as Ultralytics does for
+    fixed-size exports. Returns (1x3xSxS float32 RGB blob in [0, 1], gain, (pad_x, pad_y)).
+    """
+    h, w = frame.shape[:2]
+    gain = min(imgsz / h, imgsz / w)
+    nw, nh = int(round(w * gain)), int(round(h * gain))
+    px, py = (imgsz - nw) / 2.0, (imgsz - nh) / 2.0
+    img = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nw, nh) != (w, h) else frame
+    top, left = int(round(py - 0.1)), int(round(px - 0.1))
+    img = cv2.copyMakeBorder(img, top, imgsz - nh - top, left, imgsz - nw - left, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return cv2.dnn.blobFromImage(img, 1.0 / 255.0, swapRB=True), gain, (left, top)
+
+
+def decode_persons(
+    output: np.ndarray,
+    gain: float,
+    pad: Tuple[float, float],
+    shape: Tuple[int, int],
+    conf: float = 0.35,
+    iou: float = 0.45,
+    max_det: int = 300,
+) -> np.ndarray:
+    """
+    Person detections from a YOLOv8 output of shape (1, 4 + classes, anchors) (the person-only export
+    has one class row) as rows [x1, y1, x2, y2, conf, cls] in frame pixels, after NMS.
+    """
+    pred = output[0]
+    scores = pred[4]
+    keep = scores >= conf
+    if not keep.any():
+        return np.zeros((0, 6), dtype=np.float32)
+    cx, cy, w, h = pred[:4, keep]
+    scores = scores[keep]
+    x1, y1 = cx - w / 2, cy - h / 2
+    idx = cv2.dnn.NMSBoxes(np.stack([x1, y1, w, h], axis=1).tolist(), scores.tolist(), conf, iou, top_k=max_det)
+    idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+    boxes = np.stack([x1[idx], y1[idx], x1[idx] + w[idx], y1[idx] + h[idx]], axis=1)
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / gain).clip(0, shape[1])
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / gain).clip(0, shape[0])
+    dets = np.zeros((len(idx), 6), dtype=np.float32)
+    dets[:, :4] = boxes
+    dets[:, 4] = scores[idx]
+    return dets
+
+
+def calibration_frames(source: str, count: int = 64) -> List[np.ndarray]:
+    """Up to `count` frames spread over a video file, or the images of a directory."""
+    if os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        step = max(1, len(names) // count)
+        frames = [cv2.imread(os.path.join(source, n)) for n in names[::step][:count]]
+        return [f for f in frames if f is not None]
+    cap = cv2.VideoCapture(source)
+    try:
+        n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(1, n // count) if n > 0 else 1
+        frames = []
+        i = 0
+        while len(frames) < count:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if i % step == 0:
+                frames.append(frame)
+            i += 1
+        return frames
+    finally:
+        cap.release()
+
+
+def person_only(src: str, dst: str) -> None:
+    """Copy of a YOLOv8 ONNX export whose output keeps the box rows and the person score only."""
+    import onnx
+    from onnx import helper, numpy_helper
+
+    model = onnx.load(src)
+    graph = model.graph
+    out = graph.output[0]
+    full = out.name + "_all_classes"
+    for node in graph.node:
+        node.output[:] = [full if o == out.name else o for o in node.output]
+    consts = {"starts": [0], "ends": [5], "axes": [1]}
+    for name, value in consts.items():
+        graph.initializer.append(numpy_helper.from_array(np.array(value, dtype=np.int64), f"person_only_{name}"))
+    graph.node.append(helper.make_node("Slice", [full] + [f"person_only_{n}" for n in consts], [out.name], name="person_only"))
+    dims = out.type.tensor_type.shape.dim
+    if len(dims) > 1:
+        dims[1].ClearField("dim_param")
+        dims[1].dim_value = 5
+    onnx.checker.check_model(model)
+    onnx.save(model, dst)
+
+
+def _head_nodes(path: str) -> List[str]:
+    # Nodes of the last module (the Detect head) except its convolutions: DFL, box decoding, concat
+    import onnx
+
+    graph = onnx.load(path).graph
+    prefixes = [n.name.split("/")[1] for n in graph.node if n.name.startswith("/model.")]
+    if not prefixes:
+        return []
+    head = max(prefixes, key=lambda p: int(p.split(".")[1]) if p.split(".")[1].isdigit() else -1)
+    return [n.name for n in graph.node if n.name.startswith(f"/{head}/") and (n.op_type != "Conv" or "/dfl/" in n.name)] + ["person_only"]
+
+
+def quantize_model(src: str, dst: str, mode: str, calibration: Optional[str] = None, imgsz: int = 640) -> None:
+    """INT8 copy of a float ONNX detector; static mode calibrates activations on `calibration` frames."""
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"quantize must be one of {QUANTIZE_MODES}")
+    exclude = _head_nodes(src)
+    if mode == "dynamic":
+        quantize_dynamic(src, dst, weight_type=QuantType.QInt8, nodes_to_exclude=exclude)
+        return
+    if not calibration:
+        raise ValueError("static quantization needs calibration frames (a video file or image directory)")
+    frames = calibration_frames(calibration)
+    if not frames:
+        raise ValueError(f"no calibration frames could be read from {calibration}")
+
+    class _Frames(CalibrationDataReader):
+        def __init__(self, input_name: str):
+            self._blobs = iter(letterbox(f, imgsz)[0] for f in frames)
+            self._name = input_name
+
+        def get_next(self):
+            blob = next(self._blobs, None)
+            return None if blob is None else {self._name: blob}
+
+    import onnx
+
+    input_name = onnx.load(src).graph.input[0].name
+    quantize_static(
+        src,
+        dst,
+        _Frames(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        nodes_to_exclude=exclude,
+    )
+
+
+class OrtPersonDetector(PersonDetector):
+    """
+    PersonDetector running a (person-only, optionally INT8) ONNX export on ONNX Runtime; self.model
+    is the InferenceSession. intra_op_threads parallelise each operator and inter_op_threads run
+    independent branches of the graph concurrently (0 leaves ONNX Runtime's default); with several
+    cameras per node, give each a share of the cores. Tracking is ByteTrack from the tracker YAML,
+    as with the Ultralytics backend.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        imgsz: int = 640,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        providers=None,
+    ):
+        self.imgsz = int(imgsz)
+        self.intra_op_threads = int(intra_op_threads or 0)
+        self.inter_op_threads = int(inter_op_threads or 0)
+        self.providers = providers or ["CPUExecutionProvider"]
+        self.model_path = model_path
+        super().__init__(model_path)
+        self.input_name = self.model.get_inputs()[0].name
+        self._tracker = None
+        self._tracker_cfg = None
+
+    def _load_model(self, model_name: str):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = self.intra_op_threads
+        opts.inter_op_num_threads = self.inter_op_threads
+        if self.inter_op_threads > 1:
+            opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        return ort.InferenceSession(model_name, sess_options=opts, providers=self.providers)
+
+    def warm_up(self, imgsz: Optional[int] = None) -> None:
+        """One dummy inference on an imgsz x imgsz frame (default: the model's input size), letterboxed like real frames."""
+        size = int(imgsz or self.imgsz)
+        self.detect(np.zeros((size, size, 3), dtype=np.uint8))
+
+    def detect(self, frame: np.ndarray, conf: float = 0.35, iou: float = 0.45) -> np.ndarray:
+        """Person detections of one BGR frame as rows [x1, y1, x2, y2, conf, cls] (no tracking)."""
+        blob, gain, pad = letterbox(frame, self.imgsz)
+        output = self.model.run(None, {self.input_name: blob})[0]
+        return decode_persons(output, gain, pad, frame.shape[:2], conf, iou)
+
+    def track_frame(
+        self,
+        frame: np.ndarray,
+        conf: float = 0.35,
+        iou: float = 0.45,
+        tracker: str = "bytetrack.yaml",
+        persist: bool = True,
+    ) -> TrackBatch:
+        from ultralytics.engine.results import Boxes
+
+        t0 = time.perf_counter()
+        dets = self.detect(frame, conf, iou)
+        t1 = time.perf_counter()
+        if self._tracker is None or not persist or self._tracker_cfg != tracker:
+            self._tracker = make_byte_tracker(tracker)
+            self._tracker_cfg = tracker
+        self.current_tracks = parse_tracker_output(self._tracker.update(Boxes(dets, frame.shape[:2]), frame))
+        m = self.metrics
+        if m is not None:
+            m.observe("detect", t1 - t0)
+            m.observe("parse", time.perf_counter() - t1)
+        return self.current_tracks
+
+    def track_stream(
+        self,
+        source: str,
+        conf: float = 0.35,
+        iou: float = 0.45,
+        tracker: str = "bytetrack.yaml",
+    ) -> Generator[Optional[np.ndarray], None, None]:
+        """
+        Yields BGR frames with current_tracks updated. As with the Ultralytics backend, files are read
+        frame by frame as fast as detection allows and every frame is detected, while live sources
+        are captured on a LatestFrameReader and detection takes the newest frame. With `rate` set,
+        any source goes through the gated stream (paced files, detection as often as needed).
+        """
+        from .capture import is_file_source
+
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        if self.rate is None and is_file_source(source):
+            yield from self._file_stream(source, conf, iou, tracker)
+            return
+        yield from self._gated_stream(source, conf, iou, tracker)
+
+    def _file_stream(self, source: str, conf: float, iou: float, tracker: str) -> Generator[Optional[np.ndarray], None, None]:
+        cap = cv2.VideoCapture(source)
+        persist = False  # fresh trackers per file, as model.track(stream=True) starts them
+        try:
+            while True:
+                t0 = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok or frame is None:
+                    return
+                if self.metrics is not None:
+                    self.metrics.observe("capture", time.perf_counter() - t0)
+                self.track_frame(frame, conf, iou, tracker, persist=persist)
+                persist = True
+                yield frame
+        finally:
+            cap.release()
@@ -0,0 +1,242 @@
+import time
+from typing import Deque, Dict, Optional, Union
+
+import numpy as np
+
+from .alert import RatioAlert
+from .face_worker import FaceWorker
+from .gender import GenderEstimator
+from .history import FrameAggregator
+from .metrics import StageMetrics
+from .recording import TrackRecorder, new_recording_dir
+from .risk import GENDER_CODES, compute_risk_events_array, risk_level
+from .scheduler import GenderScheduler
+from .tracks import GENDER_LETTERS, TrackBatch, TrackStore, as_track_batch
+from .viz import draw_frame
+
+
+class AnalyticsPipeline:
+    """
+    Per-camera analytics state: gender per track, center history, face scheduling and FPS.
+    Call process() once per frame with the detector's current_tracks (a TrackBatch, or a dict in the
+    old format); returns the annotated frame, drawn into `out` or else into a buffer that is reused
+    by the next call.
+    Per-track state lives in a TrackStore; track_gender / track_gender_conf / track_history are
+    dict-like views over it. Stage latencies and counters go to `metrics` (a StageMetrics).
+    The latest frame's results stay readable as male_count, female_count, events, risk_score,
+    risk_level and ratio_message; with `alerts`, risk events and ratio alerts are also appended
+    there for an AlertDispatcher (see dispatch.py); with `history`, per-second buckets of the counts
+    and risk go there for a HistoryStore (see history.py). overlay() describes the latest frame for
+    clients that draw the overlays themselves.
+    """
+
+    def __init__(
+        self,
+        gender_est: GenderEstimator,
+        ratio_alert: RatioAlert,
+        face_every_n: int = 5,
+        face_scheduler: GenderScheduler = None,
+        face_async: bool = True,
+        track_ttl: float = 5.0,
+        approach_check_frames: int = 6,
+        metrics: StageMetrics = None,
+        record_dir: Optional[str] = None,
+        alerts: Optional[Deque[tuple]] = None,
+        history: Optional[Deque[tuple]] = None,
+    ):
+        """
+        face_every_n: minimum frames between face analyses of the same unresolved track
+        face_scheduler: overrides the default GenderScheduler built from face_every_n
+        face_async: run face analysis on a FaceWorker thread instead of inside process()
+        track_ttl: seconds after which an unseen track's state is evicted
+        metrics: where stage timings are recorded (shared memory for process workers)
+        record_dir: record tracks and genders of every frame under this directory (see recording.py),
+                    one recording per stream session
+        alerts: deque receiving (ts, kind, level, message) per risk event and ratio alert
+        history: deque receiving a bucket of counts and risk per second (see history.FrameAggregator)
+        """
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.gender_est = gender_est
+        self.ratio_alert = ratio_alert
+        self.face_every_n = max(1, int(face_every_n))
+        self.face_scheduler = face_scheduler or GenderScheduler(retry_every_n=self.face_every_n)
+        self.face_worker = FaceWorker(gender_est, metrics=self.metrics) if face_async else None
+        self.approach_check_frames = int(approach_check_frames)
+        self.store = TrackStore(ttl=track_ttl)
+        self.record_dir = record_dir
+        self.recorder: Optional[TrackRecorder] = None
+        self.alerts = alerts
+        self.history = FrameAggregator(history) if history is not None else None
+        self._vis_buf = None
+        self.reset()
+
+    def _close_recorder(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+
+    def reset(self) -> None:
+        # Track ids restart with the stream, so a new session starts a new recording
+        self._close_recorder()
+        if self.history is not None:
+            self.history.flush()
+        self.store.clear()
+        self.track_gender = self.store.genders
+        self.track_gender_conf = self.store.confs
+        self.track_history = self.store.centers_hist
+        self.face_scheduler.reset()
+        if self.face_worker is not None:
+            self.face_worker.reset()
+        self.frame_idx = 0
+        self.male_count = self.female_count = 0
+        self.events = []
+        self.risk_score = 0
+        self.risk_level = "LOW"
+        self.ratio_message = None
+        self._latest = (np.zeros(0, dtype=np.int64), np.zeros((0, 4)), np.zeros(0, dtype=np.int8), (0, 0))
+        self.t_prev = None
+        self._dt_avg = None
+        self.fps = 0.0
+
+    def close(self) -> None:
+        if self.face_worker is not None:
+            self.face_worker.stop()
+        self._close_recorder()
+        if self.history is not None:
+            self.history.flush()
+
+    def _update_genders_sync(self, frame, tracks: TrackBatch) -> None:
+        # Face analysis only on upper-body crops of tracks that still need a (better) gender
+        todo = self.face_scheduler.select(self.frame_idx, tracks, self.track_gender, self.track_gender_conf)
+        if todo:
+            todo = tracks.select(todo)
+            t0 = time.perf_counter()
+            faces = self.gender_est.get_faces_in_crops(frame, todo.xyxy.tolist())
+            t1 = time.perf_counter()
+            hits = self.gender_est.assign_genders(todo, faces, self.track_gender, self.track_gender_conf)
+            self.metrics.observe("faces", t1 - t0)
+            self.metrics.observe("assign", time.perf_counter() - t1)
+            self.metrics.inc("face_jobs")
+            self.metrics.inc("face_memory_hits", hits or 0)
+
+    def _update_genders_async(self, frame, tracks: TrackBatch) -> None:
+        # Apply the newest finished analysis. Faces are matched against the boxes of the frame they
+        # were found in (the job snapshot), not today's boxes, so movement since then does not matter.
+        result = self.face_worker.poll()
+        if result is not None:
+            _, snapshot, faces = result
+            live = snapshot.take(np.isin(snapshot.ids, tracks.ids))
+            if len(live):
+                t0 = time.perf_counter()
+                hits = self.gender_est.assign_genders(live, faces, self.track_gender, self.track_gender_conf)
+                self.metrics.observe("assign", time.perf_counter() - t0)
+                self.metrics.inc("face_memory_hits", hits or 0)
+
+        # Schedule the next job only when the worker is free, so selection sees the latest genders
+        if not self.face_worker.busy:
+            todo = self.face_scheduler.select(self.frame_idx, tracks, self.track_gender, self.track_gender_conf)
+            if todo:
+                self.face_worker.submit(self.frame_idx, frame, tracks.select(todo))
+        self.metrics.set("face_queue", int(self.face_worker.busy))
+
+    def process(self, frame, tracks: Union[TrackBatch, Dict[int, dict]], out=None, render: bool = True, now: Optional[float] = None):
+        """
+        Update analytics for one frame; with render=False nothing is drawn and None is returned.
+        now: frame time in seconds (default: monotonic clock); offline runs pass the video position
+        so track expiry, FPS and alert cooldowns follow the footage rather than processing speed.
+        """
+        m = self.metrics
+        t_start = time.perf_counter()
+        if now is None:
+            now = time.monotonic()
+        tracks = as_track_batch(tracks)
+        slots = self.store.update(tracks, now)
+
+        if self.face_worker is not None:
+            self._update_genders_async(frame, tracks)
+        else:
+            self._update_genders_sync(frame, tracks)
+
+        st = self.store
+        codes = st.gender[slots]
+        male_count = int(np.count_nonzero(codes == GENDER_CODES["M"]))
+        female_count = int(np.count_nonzero(codes == GENDER_CODES["F"]))
+        boxes = tracks.xyxy
+        if self.record_dir is not None:
+            if self.recorder is None:
+                self.recorder = TrackRecorder(new_recording_dir(self.record_dir), frame.shape)
+            self.recorder.write(time.time(), st.ids[slots], boxes, tracks.conf, codes, st.gconf[slots])
+        t_risk = time.perf_counter()
+        events, score = compute_risk_events_array(
+            st.ids[slots],
+            boxes,
+            codes,
+            st.oldest_centers(slots),
+            st.hist_len[slots] >= self.approach_check_frames,
+            frame.shape,
+        )
+        level = self.risk_level = risk_level(score)
+        m.observe("risk", time.perf_counter() - t_risk)
+        self.male_count, self.female_count = male_count, female_count
+        self.events, self.risk_score = events, score
+        self._latest = (st.ids[slots], boxes, codes, frame.shape[:2])
+
+        _, self.ratio_message = self.ratio_alert.update(male_count, female_count, now=now)
+        if self.history is not None:
+            self.history.add(time.time(), male_count, female_count, score, len(events))
+        if self.alerts is not None and (events or self.ratio_message):
+            # deque.append is atomic: delivery happens on the dispatcher's thread, never here
+            stamp = time.time()
+            for ev in events:
+                self.alerts.append((stamp, "risk", level, ev))
+            if self.ratio_message:
+                self.alerts.append((stamp, "ratio", level, self.ratio_message))
+
+        # Smoothed over recent frames rather than a single, jittery frame delta
+        if self.t_prev is not None:
+            dt = max(1e-6, now - self.t_prev)
+            self._dt_avg = dt if self._dt_avg is None else 0.9 * self._dt_avg + 0.1 * dt
+            self.fps = 1.0 / self._dt_avg
+        self.t_prev = now
+        fps = self.fps
+
+        frame_vis = None
+        if render:
+            t_render = time.perf_counter()
+            if out is None:
+                if self._vis_buf is None or self._vis_buf.shape != frame.shape:
+                    self._vis_buf = np.empty_like(frame)
+                out = self._vis_buf
+            frame_vis = draw_frame(frame, tracks, self.track_gender, male_count, female_count, events, level, score, fps, out=out)
+            m.observe("render", time.perf_counter() - t_render)
+        st.evict(now)
+        self.frame_idx += 1
+
+        m.observe("frame", time.perf_counter() - t_start)
+        m.inc("frames")
+        m.set("live_tracks", len(tracks))
+        m.set("fps", fps)
+        return frame_vis
+
+    def overlay(self) -> dict:
+        """
+        The latest frame's analytics as a JSON-ready dict: tracks as [id, x1, y1, x2, y2, gender]
+        rows in frame pixels, frame size [w, h], counts, risk level and score, events and FPS.
+        """
+        ids, boxes, codes, (h, w) = self._latest
+        tracks = np.column_stack((ids, boxes.astype(np.int64))).tolist()
+        for row, code in zip(tracks, codes.tolist()):
+            row.append(GENDER_LETTERS[code])
+        return {
+            "frame": self.frame_idx - 1,
+            "ts": time.time(),
+            "size": [w, h],
+            "tracks": tracks,
+            "male": self.male_count,
+            "female": self.female_count,
+            "level": self.risk_level,
+            "score": self.risk_score,
+            "events": self.events,
+            "ratio": self.ratio_message,
+            "fps": round(self.fps, 1),
+        }
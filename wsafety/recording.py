@@ -0,0 +1,228 @@
+"""
+Compact recordings of per-frame tracks and genders, and a fast replay through the risk heuristics.
+
+A recording is a directory of raw little-endian column files plus meta.json:
+
+    frames: ts.bin (float64 wall-clock), row_end.bin (int64, exclusive end row of each frame)
+    rows:   tid.bin (int64), box.bin (float32 x4), conf.bin (float32),
+            gender.bin (int8 GENDER_CODES), gconf.bin (float32)
+
+Every column is appended in place and opened with np.memmap, so a day of footage loads instantly.
+A recording covers one stream session: track ids restart with the tracker, so do recordings.
+
+    python -m wsafety.recording recordings/gate/20240101-080000
+"""
+import argparse
+import json
+import os
+import time
+from typing import Callable, Generator, List, Optional, Tuple
+
+import numpy as np
+
+from .alert import RatioAlert
+from .risk import GENDER_CODES, compute_risk_events_array
+
+FRAME_COLUMNS = {"ts": (np.float64, ()), "row_end": (np.int64, ())}
+ROW_COLUMNS = {
+    "tid": (np.int64, ()),
+    "box": (np.float32, (4,)),
+    "conf": (np.float32, ()),
+    "gender": (np.int8, ()),
+    "gconf": (np.float32, ()),
+}
+VERSION = 1
+
+
+def new_recording_dir(root: str) -> str:
+    """Timestamped directory under root that does not exist yet."""
+    base = os.path.join(root, time.strftime("%Y%m%d-%H%M%S"))
+    path, k = base, 1
+    while os.path.exists(path):
+        path, k = f"{base}-{k}", k + 1
+    return path
+
+
+class TrackRecorder:
+    """
+    Appends one frame of tracks at a time to a recording directory.
+    Rows are buffered and flushed every `flush_frames` frames; rows are written before the frame
+    table, so a recording cut short by a crash still reads back consistently up to its last flush.
+    """
+
+    def __init__(self, path: str, frame_shape=None, camera: Optional[str] = None, flush_frames: int = 100):
+        self.path = path
+        self.flush_frames = max(1, int(flush_frames))
+        self.frames = 0
+        self.rows = 0
+        os.makedirs(path, exist_ok=True)
+        meta = {"version": VERSION, "camera": camera, "frame_shape": list(frame_shape[:2]) if frame_shape is not None else None, "created": time.time()}
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "ab") for name in (*ROW_COLUMNS, *FRAME_COLUMNS)}
+        self._pending: dict = {name: [] for name in (*ROW_COLUMNS, *FRAME_COLUMNS)}
+        self._pending_frames = 0
+
+    def write(self, ts: float, tids, boxes, confs, genders, gconfs) -> None:
+        """One frame: (N,) track ids, (N,4) xyxy boxes, (N,) confs, gender codes and gender confidences."""
+        n = len(tids)
+        p = self._pending
+        p["tid"].append(np.asarray(tids, dtype=np.int64).reshape(n))
+        p["box"].append(np.asarray(boxes, dtype=np.float32).reshape(n, 4))
+        p["conf"].append(np.asarray(confs, dtype=np.float32).reshape(n))
+        p["gender"].append(np.asarray(genders, dtype=np.int8).reshape(n))
+        p["gconf"].append(np.asarray(gconfs, dtype=np.float32).reshape(n))
+        self.rows += n
+        p["ts"].append(np.array([ts], dtype=np.float64))
+        p["row_end"].append(np.array([self.rows], dtype=np.int64))
+        self.frames += 1
+        self._pending_frames += 1
+        if self._pending_frames >= self.flush_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending_frames:
+            return
+        for name in (*ROW_COLUMNS, *FRAME_COLUMNS):
+            chunks = self._pending[name]
+            if chunks:
+                self._files[name].write(np.concatenate(chunks).tobytes())
+                self._files[name].flush()
+            chunks.clear()
+        self._pending_frames = 0
+
+    def close(self) -> None:
+        self.flush()
+        for fh in self._files.values():
+            fh.close()
+
+
+class Recording:
+    """
+    Read-only, memory-mapped view of a recording.
+    Frame columns (ts, row_end) have one entry per frame; row columns one entry per track per frame.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as fh:
+            self.meta = json.load(fh)
+        ts = self._map("ts", *FRAME_COLUMNS["ts"])
+        row_end = self._map("row_end", *FRAME_COLUMNS["row_end"])
+        rows = {name: self._map(name, *spec) for name, spec in ROW_COLUMNS.items()}
+        # Keep only frames whose rows were fully written
+        n_rows = min(len(c) for c in rows.values())
+        n_frames = int(np.searchsorted(row_end[: min(len(ts), len(row_end))], n_rows, side="right"))
+        self.ts = ts[:n_frames]
+        self.row_end = row_end[:n_frames]
+        n_rows = int(self.row_end[-1]) if n_frames else 0
+        self.tid = rows["tid"][:n_rows]
+        self.box = rows["box"][:n_rows]
+        self.conf = rows["conf"][:n_rows]
+        self.gender = rows["gender"][:n_rows]
+        self.gconf = rows["gconf"][:n_rows]
+        self.row_start = np.concatenate(([0], self.row_end[:-1])).astype(np.int64)
+
+    def _map(self, name: str, dtype, tail: tuple) -> np.ndarray:
+        fn = os.path.join(self.path, f"{name}.bin")
+        itemsize = np.dtype(dtype).itemsize * int(np.prod(tail, dtype=np.int64))
+        n = os.path.getsize(fn) // itemsize if os.path.exists(fn) else 0
+        if n == 0:
+            return np.zeros((0, *tail), dtype=dtype)
+        return np.memmap(fn, dtype=dtype, mode="r", shape=(n, *tail))
+
+    @property
+    def frame_shape(self) -> Tuple[int, int]:
+        shape = self.meta.get("frame_shape")
+        return tuple(shape) if shape else (1080, 1920)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def frame_of_rows(self) -> np.ndarray:
+        """(rows,) frame index of every row."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.row_end - self.row_start)
+
+    def history(self, history: int = 12) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per row, the oldest center in the track's last `history` appearances and how many appearances
+        that history holds, matching what TrackStore keeps live. Returns (past (rows, 2), hist_len (rows,)).
+        """
+        box = np.asarray(self.box, dtype=np.float64)
+        centers = np.stack(((box[:, 0] + box[:, 2]) / 2, (box[:, 1] + box[:, 3]) / 2), axis=1).astype(np.int64)
+        n = len(centers)
+        if n == 0:
+            return centers, np.zeros(0, dtype=np.int64)
+        order = np.lexsort((np.arange(n), np.asarray(self.tid)))  # by track, then time
+        sorted_tid = np.asarray(self.tid)[order]
+        first = np.r_[True, sorted_tid[1:] != sorted_tid[:-1]]
+        group_start = np.maximum.accumulate(np.where(first, np.arange(n), 0))
+        k = np.arange(n) - group_start  # appearance index within the track
+        back = np.minimum(k, history - 1)
+        past = np.empty_like(centers)
+        past[order] = centers[order[np.arange(n) - back]]
+        hist_len = np.empty(n, dtype=np.int64)
+        hist_len[order] = back + 1
+        return past, hist_len
+
+
+def replay(
+    recording: Recording,
+    ratio_alert: Optional[RatioAlert] = None,
+    risk_fn: Callable = compute_risk_events_array,
+    approach_check_frames: int = 6,
+    history: int = 12,
+) -> Generator[Tuple[int, float, List[str], int, Optional[str]], None, None]:
+    """
+    Re-run the risk heuristics (and the ratio alert, on recorded timestamps) over a recording.
+    Yields (frame_idx, ts, events, score, ratio_message) per frame. risk_fn can be swapped for a
+    modified heuristic with compute_risk_events_array's signature.
+    """
+    past, hist_len = recording.history(history)
+    hist_ok = hist_len >= approach_check_frames
+    shape = recording.frame_shape
+    tid = np.asarray(recording.tid)
+    box = np.asarray(recording.box, dtype=np.float64)
+    gender = np.asarray(recording.gender)
+
+    frame_rows = recording.frame_of_rows()
+    males = np.bincount(frame_rows[gender == GENDER_CODES["M"]], minlength=len(recording))
+    females = np.bincount(frame_rows[gender == GENDER_CODES["F"]], minlength=len(recording))
+
+    for i, (s, e) in enumerate(zip(recording.row_start.tolist(), recording.row_end.tolist())):
+        events, score = risk_fn(tid[s:e], box[s:e], gender[s:e], past[s:e], hist_ok[s:e], shape)
+        message = None
+        if ratio_alert is not None:
+            _, message = ratio_alert.update(int(males[i]), int(females[i]), now=float(recording.ts[i]))
+        yield i, float(recording.ts[i]), events, score, message
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a track recording through the risk heuristics.")
+    ap.add_argument("path", help="recording directory")
+    ap.add_argument("--ratio_threshold", type=float, default=3.0)
+    ap.add_argument("--ratio_cooldown", type=float, default=10.0)
+    ap.add_argument("--events", action="store_true", help="print every event")
+    args = ap.parse_args()
+
+    rec = Recording(args.path)
+    alert = RatioAlert(threshold=args.ratio_threshold, cooldown_seconds=args.ratio_cooldown, verbose=False)
+    t0 = time.perf_counter()
+    n_events = n_alerts = high = 0
+    for i, ts, events, score, message in replay(rec, alert):
+        n_events += len(events)
+        n_alerts += message is not None
+        high += score >= 5
+        if args.events:
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+            for ev in events:
+                print(f"{stamp} frame {i}: {ev}")
+            if message:
+                print(f"{stamp} frame {i}: {message}")
+    took = time.perf_counter() - t0
+    print(f"{len(rec)} frames, {len(rec.tid)} track rows in {took:.2f}s ({len(rec) / max(took, 1e-9):.0f} frames/s)")
+    print(f"events: {n_events}, HIGH-risk frames: {high}, ratio alerts: {n_alerts}")
+
+
+if __name__ == "__main__":
+    main()
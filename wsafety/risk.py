@@ -1,7 +1,16 @@
 from collections import deque
-from typing import Deque, Dict, List, Tuple
+from typing import Deque, Dict, List, Optional, Tuple
 
-from .utils import box_diag, center_of_box, distance
+import numpy as np
+
+# Integer gender codes used by the array engine
+GENDER_CODES = {"U": 0, "M": 1, "F": 2}
+
+# Above this many gendered tracks the pairwise tests use a uniform grid instead of dense matrices
+GRID_MIN_TRACKS = 200
+
+# Below this many tracks plain Python loops beat building arrays (see benchmarks/bench_risk.py)
+SCALAR_MAX_TRACKS = 40
 
 
 def compute_risk_events(
@@ -10,73 +19,264 @@ def compute_risk_events(
     centers_hist: Dict[int, Deque[Tuple[int, int]]],
     frame_shape,
     approach_check_frames: int = 6,
+    scalar_max_tracks: int = SCALAR_MAX_TRACKS,
 ) -> Tuple[List[str], int]:
     """
     Heuristics to flag potentially risky situations:
       - Lone woman surrounded by multiple men nearby
       - Rapid approach of a man towards a woman
       - Possibly fallen person (very low h/w aspect ratio)
+    Builds arrays from the dicts and runs compute_risk_events_array (which runs crowds smaller than
+    scalar_max_tracks as plain loops).
     """
-    H, W = frame_shape[:2]
-    diag_frame = (W**2 + H**2) ** 0.5
+    tids = list(tracks)
+    row = {tid: i for i, tid in enumerate(tids)}
+    boxes = np.array([tracks[tid]["xyxy"] for tid in tids], dtype=np.float64).reshape(-1, 4)
+
+    # Iterate genders in its own order, as the event order depends on it
+    female_rows = [row[tid] for tid, g in genders.items() if g == "F" and tid in row]
+    male_rows = [row[tid] for tid, g in genders.items() if g == "M" and tid in row]
+    codes = np.zeros(len(tids), dtype=np.int8)
+    codes[female_rows] = GENDER_CODES["F"]
+    codes[male_rows] = GENDER_CODES["M"]
+
+    past = np.zeros((len(tids), 2), dtype=np.int64)
+    hist_ok = np.zeros(len(tids), dtype=bool)
+    for i, tid in enumerate(tids):
+        hist = centers_hist.get(tid)
+        if hist is not None and len(hist) >= approach_check_frames:
+            hist_ok[i] = True
+            past[i] = hist[0]
 
-    female_ids = [tid for tid, g in genders.items() if g == "F" and tid in tracks]
-    male_ids = [tid for tid, g in genders.items() if g == "M" and tid in tracks]
+    return compute_risk_events_array(
+        np.array(tids, dtype=np.int64),
+        boxes,
+        codes,
+        past,
+        hist_ok,
+        frame_shape,
+        male_rows=np.array(male_rows, dtype=np.int64),
+        female_rows=np.array(female_rows, dtype=np.int64),
+        scalar_max_tracks=scalar_max_tracks,
+    )
 
+
+def _risk_events_scalar(ids, boxes, male_rows, female_rows, past, frame_shape) -> Tuple[List[str], int]:
+    """
+    compute_risk_events_array as plain loops over Python lists, for small crowds.
+    past: per row, the oldest center of the track's history, or None when it is too short.
+    """
+    H, W = frame_shape[:2]
+    diag_frame = (W**2 + H**2) ** 0.5
+    close_thresh = 0.05 * diag_frame
+    approach_thresh = 0.04 * diag_frame
     events: List[str] = []
     risk_score = 0
-
-    centers = {tid: center_of_box(tr["xyxy"]) for tid, tr in tracks.items()}
-    diags = {tid: box_diag(tr["xyxy"]) for tid, tr in tracks.items()}
+    # Same truncation as utils.center_of_box
+    centers = [(int((b[0] + b[2]) / 2), int((b[1] + b[3]) / 2)) for b in boxes]
 
     # 1) Lone woman surrounded by multiple men in close proximity
-    for fid in female_ids:
-        f_center = centers[fid]
-        f_diag = diags[fid]
-        prox_thresh = max(0.06 * diag_frame, 0.75 * f_diag)
-
-        nearby_males = []
-        nearby_females = []
-        for mid in male_ids:
-            if distance(f_center, centers[mid]) < prox_thresh:
-                nearby_males.append(mid)
-        for fid2 in female_ids:
-            if fid2 == fid:
+    for f in female_rows:
+        fx, fy = centers[f]
+        b = boxes[f]
+        thresh = max(0.06 * diag_frame, 0.75 * ((b[2] - b[0]) ** 2 + (b[3] - b[1]) ** 2) ** 0.5)
+        near_m = 0
+        for m in male_rows:
+            mx, my = centers[m]
+            if ((fx - mx) ** 2 + (fy - my) ** 2) ** 0.5 < thresh:
+                near_m += 1
+        if near_m < 2:
+            continue
+        lone = True
+        for o in female_rows:
+            if o != f:
+                ox, oy = centers[o]
+                if ((fx - ox) ** 2 + (fy - oy) ** 2) ** 0.5 < thresh:
+                    lone = False
+                    break
+        if lone:
+            events.append(f"Female {int(ids[f])} surrounded by {near_m} males in close proximity")
+            risk_score += 3
+
+    # 2) Rapid approach: man->woman distance decreases fast and is currently close
+    for m in male_rows:
+        pm = past[m]
+        if pm is None:
+            continue
+        mx, my = centers[m]
+        for f in female_rows:
+            pf = past[f]
+            if pf is None:
                 continue
-            if distance(f_center, centers[fid2]) < prox_thresh:
-                nearby_females.append(fid2)
+            fx, fy = centers[f]
+            d_now = ((mx - fx) ** 2 + (my - fy) ** 2) ** 0.5
+            if d_now < close_thresh and ((pm[0] - pf[0]) ** 2 + (pm[1] - pf[1]) ** 2) ** 0.5 - d_now > approach_thresh:
+                events.append(f"Male {int(ids[m])} rapidly approaching Female {int(ids[f])}")
+                risk_score += 2
 
-        if len(nearby_males) >= 2 and len(nearby_females) == 0:
-            events.append(f"Female {fid} surrounded by {len(nearby_males)} males in close proximity")
+    # 3) Possibly fallen person: height/width ratio very small on a large box
+    for r, b in enumerate(boxes):
+        w = max(1.0, b[2] - b[0])
+        h = max(1.0, b[3] - b[1])
+        if h / w < 0.55 and w * h > 0.02 * (W * H):
+            events.append(f"Track {int(ids[r])} possibly lying/fallen")
             risk_score += 3
 
-    # 2) Rapid approach: man->woman distance decreases fast and is currently close
-    for mid in male_ids:
-        for fid in female_ids:
-            if len(centers_hist.get(mid, [])) < approach_check_frames or len(centers_hist.get(fid, [])) < approach_check_frames:
+    return events, risk_score
+
+
+def _box_centers(boxes: np.ndarray) -> np.ndarray:
+    # Same truncation as utils.center_of_box
+    return np.stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2), axis=1).astype(np.int64)
+
+
+def _pair_dist(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    d = a[:, None, :] - b[None, :, :]
+    return np.sqrt((d * d).sum(axis=2))
+
+
+def _row_dist(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    d = a - b
+    return np.sqrt((d * d).sum(axis=1))
+
+
+def _grid_pairs(points: np.ndarray, cell: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All ordered index pairs (i, j), i != j, whose points fall in the same or adjacent grid cells.
+    With cell >= threshold this is a superset of the pairs closer than the threshold.
+    """
+    cxy = np.floor(points / cell).astype(np.int64)
+    cxy -= cxy.min(axis=0)
+    ny = int(cxy[:, 1].max()) + 3
+    key = (cxy[:, 0] + 1) * ny + (cxy[:, 1] + 1)
+    order = np.argsort(key, kind="stable")
+    skeys = key[order]
+    idx = np.arange(len(points))
+
+    srcs, dsts = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            q = key + dx * ny + dy
+            lo = np.searchsorted(skeys, q, side="left")
+            cnt = np.searchsorted(skeys, q, side="right") - lo
+            total = int(cnt.sum())
+            if total == 0:
                 continue
-            d_now = distance(centers[mid], centers[fid])
-            d_past = distance(centers_hist[mid][0], centers_hist[fid][0])
+            starts = np.cumsum(cnt) - cnt
+            offs = np.arange(total) - np.repeat(starts, cnt)
+            srcs.append(np.repeat(idx, cnt))
+            dsts.append(order[np.repeat(lo, cnt) + offs])
+    src = np.concatenate(srcs)
+    dst = np.concatenate(dsts)
+    keep = src != dst
+    return src[keep], dst[keep]
 
-            decrease = d_past - d_now
-            close_thresh = 0.05 * diag_frame
-            approach_thresh = 0.04 * diag_frame
 
-            if d_now < close_thresh and decrease > approach_thresh:
-                events.append(f"Male {mid} rapidly approaching Female {fid}")
-                risk_score += 2
+def compute_risk_events_array(
+    ids: np.ndarray,
+    boxes: np.ndarray,
+    gender_codes: np.ndarray,
+    past_centers: np.ndarray,
+    hist_ok: np.ndarray,
+    frame_shape,
+    male_rows: Optional[np.ndarray] = None,
+    female_rows: Optional[np.ndarray] = None,
+    grid_min_tracks: int = GRID_MIN_TRACKS,
+    scalar_max_tracks: int = SCALAR_MAX_TRACKS,
+) -> Tuple[List[str], int]:
+    """
+    Array version of compute_risk_events.
+      ids: (N,) track ids; boxes: (N,4) xyxy; gender_codes: (N,) GENDER_CODES values
+      past_centers: (N,2) oldest center in each track's history; hist_ok: (N,) history is long enough
+      male_rows / female_rows: row order used for events (default: ascending rows)
+    Fewer than scalar_max_tracks rows run as plain loops, where NumPy's per-call overhead dominates.
+    """
+    H, W = frame_shape[:2]
+    diag_frame = (W**2 + H**2) ** 0.5
+    close_thresh = 0.05 * diag_frame
+    approach_thresh = 0.04 * diag_frame
 
-    # 3) Possibly fallen person: height/width ratio very small on a large box
-    for tid, tr in tracks.items():
-        x1, y1, x2, y2 = tr["xyxy"]
-        w = max(1.0, x2 - x1)
-        h = max(1.0, y2 - y1)
-        aspect = h / w
-        area = w * h
-        if aspect < 0.55 and area > 0.02 * (W * H):
-            events.append(f"Track {tid} possibly lying/fallen")
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    gender_codes = np.asarray(gender_codes)
+    if male_rows is None:
+        male_rows = np.flatnonzero(gender_codes == GENDER_CODES["M"])
+    if female_rows is None:
+        female_rows = np.flatnonzero(gender_codes == GENDER_CODES["F"])
+    male_rows = np.asarray(male_rows, dtype=np.int64)
+    female_rows = np.asarray(female_rows, dtype=np.int64)
+    n_m, n_f = len(male_rows), len(female_rows)
+
+    if len(boxes) < scalar_max_tracks:
+        past = [tuple(p) if ok else None for p, ok in zip(np.asarray(past_centers).tolist(), np.asarray(hist_ok).tolist())]
+        return _risk_events_scalar(np.asarray(ids).tolist(), boxes.tolist(), male_rows.tolist(), female_rows.tolist(), past, frame_shape)
+
+    events: List[str] = []
+    risk_score = 0
+
+    centers = _box_centers(boxes)
+    wh = boxes[:, 2:] - boxes[:, :2]
+    f_thresh = np.maximum(0.06 * diag_frame, 0.75 * np.sqrt((wh[female_rows] ** 2).sum(axis=1)))
+
+    approach_hits = np.zeros((0, 2), dtype=np.int64)  # (male pos, female pos)
+    if n_f and n_m + n_f >= grid_min_tracks:
+        # Sparse path: candidate pairs from a grid with cells as large as the widest threshold
+        rows = np.concatenate((female_rows, male_rows))
+        src, dst = _grid_pairs(centers[rows].astype(np.float64), float(max(f_thresh.max(), close_thresh)))
+        d = _row_dist(centers[rows[src]], centers[rows[dst]])
+
+        # 1) Surrounded: src is a female, dst any gendered track
+        from_f = src < n_f
+        near = from_f & (d < f_thresh[np.minimum(src, n_f - 1)])
+        n_near_m = np.bincount(src[near & (dst >= n_f)], minlength=n_f)
+        n_near_f = np.bincount(src[near & (dst < n_f)], minlength=n_f)
+
+        # 2) Rapid approach: src is a male, dst a female
+        mf = (~from_f) & (dst < n_f)
+        m_pos, f_pos, d_now = src[mf] - n_f, dst[mf], d[mf]
+        ok = hist_ok[male_rows[m_pos]] & hist_ok[female_rows[f_pos]] & (d_now < close_thresh)
+        m_pos, f_pos, d_now = m_pos[ok], f_pos[ok], d_now[ok]
+        d_past = _row_dist(past_centers[male_rows[m_pos]], past_centers[female_rows[f_pos]])
+        hit = (d_past - d_now) > approach_thresh
+        approach_hits = np.stack((m_pos[hit], f_pos[hit]), axis=1)
+        approach_hits = approach_hits[np.lexsort((approach_hits[:, 1], approach_hits[:, 0]))]
+    elif n_f:
+        cf = centers[female_rows]
+        d_fm = _pair_dist(cf, centers[male_rows])
+        d_ff = _pair_dist(cf, cf)
+        np.fill_diagonal(d_ff, np.inf)
+        n_near_m = (d_fm < f_thresh[:, None]).sum(axis=1)
+        n_near_f = (d_ff < f_thresh[:, None]).sum(axis=1)
+
+        if n_m:
+            d_now = d_fm.T
+            d_past = _pair_dist(past_centers[male_rows], past_centers[female_rows])
+            hit = (
+                hist_ok[male_rows][:, None]
+                & hist_ok[female_rows][None, :]
+                & (d_now < close_thresh)
+                & ((d_past - d_now) > approach_thresh)
+            )
+            approach_hits = np.argwhere(hit)
+
+    # 1) Lone woman surrounded by multiple men in close proximity
+    if n_f:
+        for pos in np.flatnonzero((n_near_m >= 2) & (n_near_f == 0)):
+            events.append(f"Female {int(ids[female_rows[pos]])} surrounded by {int(n_near_m[pos])} males in close proximity")
             risk_score += 3
 
+    # 2) Rapid approach: man->woman distance decreases fast and is currently close
+    for m_pos, f_pos in approach_hits:
+        events.append(f"Male {int(ids[male_rows[m_pos]])} rapidly approaching Female {int(ids[female_rows[f_pos]])}")
+        risk_score += 2
+
+    # 3) Possibly fallen person: height/width ratio very small on a large box
+    w = np.maximum(1.0, wh[:, 0])
+    h = np.maximum(1.0, wh[:, 1])
+    fallen = ((h / w) < 0.55) & ((w * h) > 0.02 * (W * H))
+    for r in np.flatnonzero(fallen):
+        events.append(f"Track {int(ids[r])} possibly lying/fallen")
+        risk_score += 3
+
     return events, risk_score
 
 
@@ -85,4 +285,4 @@ def risk_level(score: int) -> str:
         return "HIGH"
     if score >= 2:
         return "MEDIUM"
-    return "LOW"
\ No newline at end of file
+    return "LOW"
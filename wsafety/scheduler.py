@@ -0,0 +1,82 @@
+from typing import Dict, List, Union
+
+from .tracks import TrackBatch, as_track_batch
+
+
+class GenderScheduler:
+    """
+    Decides which tracks get face analysis on a given frame.
+
+    Unresolved tracks ("U") are analysed first, oldest first, at most every `retry_every_n` frames each.
+    Resolved tracks below `conf_target` are re-checked every `recheck_every_n` frames, lowest
+    confidence and longest-unchecked first. Confident tracks are never re-analysed.
+    At most `max_per_frame` tracks are picked per frame (one face-analysis tile).
+    """
+
+    def __init__(
+        self,
+        conf_target: float = 0.75,
+        retry_every_n: int = 5,
+        recheck_every_n: int = 30,
+        max_per_frame: int = 16,
+        min_box_height: float = 48.0,
+        forget_after: int = 300,
+    ):
+        self.conf_target = float(conf_target)
+        self.retry_every_n = max(1, int(retry_every_n))
+        self.recheck_every_n = max(1, int(recheck_every_n))
+        self.max_per_frame = max(1, int(max_per_frame))
+        self.min_box_height = float(min_box_height)
+        self.forget_after = int(forget_after)
+        self.reset()
+
+    def reset(self) -> None:
+        self.first_seen: Dict[int, int] = {}
+        self.last_seen: Dict[int, int] = {}
+        self.last_checked: Dict[int, int] = {}
+        self._last_forget = 0
+
+    def select(
+        self,
+        frame_idx: int,
+        tracks: Union[TrackBatch, Dict[int, dict]],
+        track_gender: Dict[int, str],
+        track_gender_conf: Dict[int, float],
+    ) -> List[int]:
+        unresolved = []
+        rechecks = []
+        batch = as_track_batch(tracks)
+        tall = ((batch.xyxy[:, 3] - batch.xyxy[:, 1]) >= self.min_box_height).tolist()
+        for tid, ok in zip(batch.ids.tolist(), tall):
+            self.first_seen.setdefault(tid, frame_idx)
+            self.last_seen[tid] = frame_idx
+            if not ok:
+                continue
+            since = frame_idx - self.last_checked.get(tid, -(10**9))
+            g = track_gender.get(tid, "U")
+            if g == "U":
+                if since >= self.retry_every_n:
+                    unresolved.append((self.first_seen[tid], tid))
+            else:
+                conf = track_gender_conf.get(tid, 0.0)
+                if conf < self.conf_target and since >= self.recheck_every_n:
+                    rechecks.append((conf, -since, tid))
+
+        unresolved.sort()
+        rechecks.sort()
+        picked = [tid for _, tid in unresolved[: self.max_per_frame]]
+        picked += [tid for _, _, tid in rechecks[: self.max_per_frame - len(picked)]]
+        for tid in picked:
+            self.last_checked[tid] = frame_idx
+
+        if frame_idx - self._last_forget >= self.forget_after:
+            self._last_forget = frame_idx
+            self._forget(frame_idx)
+        return picked
+
+    def _forget(self, frame_idx: int) -> None:
+        stale = [tid for tid, seen in self.last_seen.items() if frame_idx - seen > self.forget_after]
+        for tid in stale:
+            self.first_seen.pop(tid, None)
+            self.last_seen.pop(tid, None)
+            self.last_checked.pop(tid, None)
@@ -0,0 +1,356 @@
+import functools
+import json
+import threading
+import time
+from typing import Callable, Generator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .detector import PersonDetector
+from .encoder import DEFAULT_TIERS, FrameEncoder
+from .pipeline import AnalyticsPipeline
+
+
+class FrameHub:
+    """
+    Fan-out of the newest published item to any number of subscribers.
+    Subscribers always receive the latest item; a slow subscriber skips items instead of
+    holding back the producer.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item: Optional[bytes] = None
+        self._seq = 0
+        self._subscribers = 0
+        self._closed = False
+        self._t_last = 0.0
+        self.period = 0.0  # smoothed seconds between published items
+        self.on_subscribe: Optional[Callable[[], None]] = None
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    def publish(self, item: bytes) -> None:
+        now = time.monotonic()
+        with self._cond:
+            if self._t_last:
+                dt = min(now - self._t_last, 1.0)
+                self.period = dt if not self.period else 0.9 * self.period + 0.1 * dt
+            self._t_last = now
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self) -> None:
+        with self._cond:
+            self._closed = False
+
+    def subscribe(self, timeout: float = 5.0, fresh: bool = False) -> Generator[bytes, None, None]:
+        """
+        Yields published items until the hub is closed or the consumer stops iterating.
+        Waits at most `timeout` seconds per item before re-checking the hub state.
+        fresh: skip the item already held by the hub and wait for the next one.
+        """
+        with self._cond:
+            self._subscribers += 1
+            last_seq = self._seq if fresh else 0
+        try:
+            if self.on_subscribe is not None:
+                self.on_subscribe()
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != last_seq or self._closed, timeout=timeout)
+                    if self._seq == last_seq:
+                        if self._closed:
+                            return
+                        continue
+                    last_seq = self._seq
+                    item = self._item
+                yield item
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+
+class TieredHub:
+    """
+    One FrameHub per encoding tier (see encoder.DEFAULT_TIERS; tier 0 is full quality).
+    Each tier is encoded once per frame and the same bytes object goes to every subscriber of it.
+
+    frames() adapts each client's tier to its throughput: the time the server takes to write a
+    part is measured between yields; a client that repeatedly needs most of the frame interval
+    moves to a smaller tier, one that keeps up easily for a while moves back up (never above the
+    tier it asked for).
+    """
+
+    SLOW_FRACTION = 0.8
+    FAST_FRACTION = 0.3
+    DOWN_AFTER = 5
+    UP_AFTER = 90
+
+    def __init__(self, tiers: Sequence[Tuple[float, int]] = DEFAULT_TIERS):
+        self.tiers = list(tiers)
+        self.hubs: List[FrameHub] = [FrameHub() for _ in self.tiers]
+        self.on_subscribe: Optional[Callable[[int], None]] = None
+        for i, hub in enumerate(self.hubs):
+            hub.on_subscribe = functools.partial(self._subscribed, i)
+
+    def _subscribed(self, tier: int) -> None:
+        if self.on_subscribe is not None:
+            self.on_subscribe(tier)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(h.subscribers for h in self.hubs)
+
+    def wanted_tiers(self) -> List[int]:
+        return [i for i, h in enumerate(self.hubs) if h.subscribers > 0]
+
+    def publish(self, tier: int, item: bytes) -> None:
+        self.hubs[tier].publish(item)
+
+    def close(self) -> None:
+        for h in self.hubs:
+            h.close()
+
+    def reopen(self) -> None:
+        for h in self.hubs:
+            h.reopen()
+
+    def frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        """MJPEG multipart body for one HTTP client, starting at (and never above) `tier`."""
+        best = tier = min(max(0, int(tier)), len(self.hubs) - 1)
+        sub = self.hubs[tier].subscribe()
+        slow = fast = 0
+        try:
+            while True:
+                try:
+                    part = next(sub)
+                except StopIteration:
+                    return
+                t0 = time.monotonic()
+                yield part
+                if not adaptive:
+                    continue
+                write = time.monotonic() - t0
+                period = self.hubs[tier].period or (1.0 / 30)
+                if write > self.SLOW_FRACTION * period:
+                    slow, fast = slow + 1, 0
+                elif write < self.FAST_FRACTION * period:
+                    slow, fast = 0, fast + 1
+                new = tier
+                if slow >= self.DOWN_AFTER and tier < len(self.hubs) - 1:
+                    new = tier + 1
+                elif fast >= self.UP_AFTER and tier > best:
+                    new = tier - 1
+                if new != tier:
+                    sub.close()
+                    tier, slow, fast = new, 0, 0
+                    sub = self.hubs[tier].subscribe(fresh=True)
+        finally:
+            sub.close()
+
+
+def overlay_event(meta: dict) -> bytes:
+    """One Server-Sent Events message with a frame's overlay metadata (see AnalyticsPipeline.overlay)."""
+    return b"event: overlay\ndata: " + json.dumps(meta, separators=(",", ":")).encode("utf-8") + b"\n\n"
+
+
+class FeedPublisher:
+    """
+    Sends each frame of a camera loop to the camera's three feeds:
+      video    annotated MJPEG, rendered and encoded only for tiers that have viewers
+      raw      the unannotated frame as MJPEG, at most raw_fps, for clients that draw overlays themselves
+      overlay  per-frame metadata (overlay_event) at the full analytics rate
+    Raw frames have their own encoder, so they never take buffers or threads from the annotated tiers.
+    """
+
+    def __init__(
+        self,
+        encoder: FrameEncoder,
+        raw_encoder: FrameEncoder,
+        raw_fps: Optional[float],
+        publish_video: Callable[[int, bytes], None],
+        publish_raw: Callable[[int, bytes], None],
+        publish_overlay: Callable[[bytes], None],
+    ):
+        self.encoder = encoder
+        self.raw_encoder = raw_encoder
+        self.raw_period = 1.0 / raw_fps if raw_fps else 0.0
+        self.publish_video = publish_video
+        self.publish_raw = publish_raw
+        self.publish_overlay = publish_overlay
+        self._raw_due = 0.0
+
+    def process(self, pipeline: AnalyticsPipeline, frame, tracks, video_tiers: List[int], raw_tiers: List[int], overlay: bool) -> None:
+        buf = self.encoder.acquire(frame.shape, frame.dtype) if video_tiers else None
+        frame_vis = pipeline.process(frame, tracks, out=buf, render=buf is not None)
+        if frame_vis is not None:
+            self.encoder.submit(frame_vis, video_tiers, self.publish_video)
+        if raw_tiers:
+            now = time.monotonic()
+            if now >= self._raw_due:
+                raw = self.raw_encoder.acquire(frame.shape, frame.dtype)
+                if raw is not None:
+                    self._raw_due = now + self.raw_period
+                    np.copyto(raw, frame)  # the capture may reuse its frame before the encoder gets to it
+                    self.raw_encoder.submit(raw, raw_tiers, self.publish_raw)
+        if overlay:
+            self.publish_overlay(overlay_event(pipeline.overlay()))
+
+    def shutdown(self) -> None:
+        self.encoder.shutdown()
+        self.raw_encoder.shutdown()
+
+
+class CameraStream:
+    """
+    Runs one analytics loop for a camera in a background thread and publishes annotated MJPEG parts
+    to `hub`, raw MJPEG parts to `raw_hub` and overlay metadata to `overlay_hub` (see FeedPublisher).
+    The loop starts on the first subscriber of any of them and stops after idle_timeout seconds
+    without subscribers, releasing the capture device.
+    """
+
+    def __init__(
+        self,
+        detector: PersonDetector,
+        pipeline: AnalyticsPipeline,
+        source=0,
+        conf: float = 0.35,
+        iou: float = 0.45,
+        tracker: str = "bytetrack.yaml",
+        idle_timeout: float = 10.0,
+        encoder: Optional[FrameEncoder] = None,
+        raw_fps: Optional[float] = 5.0,
+    ):
+        self.detector = detector
+        self.pipeline = pipeline
+        self.source = source
+        self.conf = conf
+        self.iou = iou
+        self.tracker = tracker
+        self.idle_timeout = float(idle_timeout)
+
+        self.encoder = encoder or FrameEncoder()
+        self.raw_fps = raw_fps
+        self.hub = TieredHub(self.encoder.tiers)
+        self.raw_hub = TieredHub(self.encoder.tiers)
+        self.overlay_hub = FrameHub()
+        self.hub.on_subscribe = self.raw_hub.on_subscribe = lambda tier: self.ensure_running()
+        self.overlay_hub.on_subscribe = self.ensure_running
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.ttff: Optional[float] = None  # seconds from loop start to the first published frame
+        self._started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def subscribers(self) -> int:
+        return self.hub.subscribers + self.raw_hub.subscribers + self.overlay_hub.subscribers
+
+    def _hubs(self) -> list:
+        return [self.hub, self.raw_hub, self.overlay_hub]
+
+    def ensure_running(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._started_at = time.monotonic()
+            for hub in self._hubs():
+                hub.reopen()
+            self._thread = threading.Thread(target=self._run, name=f"camera-{self.source}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        """MJPEG multipart body for one HTTP client."""
+        return self.hub.frames(tier, adaptive)
+
+    def raw_frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        """MJPEG multipart body of unannotated frames (at most raw_fps) for one HTTP client."""
+        return self.raw_hub.frames(tier, adaptive)
+
+    def overlay_events(self) -> Generator[bytes, None, None]:
+        """Server-Sent Events body with the overlay metadata of every frame; slow clients skip frames."""
+        return self.overlay_hub.subscribe()
+
+    def _publish(self, tier: int, part: bytes) -> None:
+        self.hub.publish(tier, part)
+        self._first_frame()
+
+    def _publish_raw(self, tier: int, part: bytes) -> None:
+        self.raw_hub.publish(tier, part)
+        self._first_frame()
+
+    def _first_frame(self) -> None:
+        started = self._started_at
+        if started is not None:
+            self._started_at = None
+            self.ttff = time.monotonic() - started
+            print(f"[camera {self.source}] first frame after {self.ttff:.2f}s")
+
+    def _idle(self, idle_since: Optional[float]) -> bool:
+        return idle_since is not None and (time.monotonic() - idle_since) >= self.idle_timeout
+
+    def _run(self) -> None:
+        self.pipeline.reset()
+        idle_since = None
+        went_idle = False
+        stream = self.detector.track_stream(source=self.source, conf=self.conf, iou=self.iou, tracker=self.tracker)
+        raw_encoder = FrameEncoder(self.encoder.tiers, threads=1, max_inflight=1)
+        feeds = FeedPublisher(self.encoder, raw_encoder, self.raw_fps, self._publish, self._publish_raw, self.overlay_hub.publish)
+        try:
+            for frame in stream:
+                if self._stop.is_set():
+                    break
+                if self.subscribers == 0:
+                    if idle_since is None:
+                        idle_since = time.monotonic()
+                    if self._idle(idle_since):
+                        went_idle = True
+                        break
+                else:
+                    idle_since = None
+                if frame is None:
+                    continue
+
+                # Render only when the encoder has room; it encodes off-thread into the wanted tiers
+                feeds.process(
+                    self.pipeline,
+                    frame,
+                    self.detector.current_tracks,
+                    self.hub.wanted_tiers(),
+                    self.raw_hub.wanted_tiers(),
+                    self.overlay_hub.subscribers > 0,
+                )
+        finally:
+            stream.close()
+            raw_encoder.shutdown()
+            if self.pipeline.history is not None:
+                self.pipeline.history.flush()  # the last partial second
+            with self._lock:
+                self._thread = None
+                # A viewer may have subscribed while we were shutting down for idleness
+                restart = went_idle and self.subscribers > 0 and not self._stop.is_set()
+                if not restart:
+                    for hub in self._hubs():
+                        hub.close()
+            if restart:
+                self.ensure_running()
@@ -0,0 +1,255 @@
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .risk import GENDER_CODES
+
+GENDER_LETTERS = {code: letter for letter, code in GENDER_CODES.items()}
+
+
+class TrackBatch(Mapping):
+    """
+    One frame's tracks as contiguous arrays: ids (N,) int64, xyxy (N, 4) float64 boxes,
+    conf (N,) float32 and cls (N,) int64, in detector order.
+    Reads like the old {track_id: {"xyxy": [x1, y1, x2, y2], "conf": float}} dict, but the
+    per-track dicts are only built for callers that index it; the frame loop uses the arrays.
+    Treat a batch as immutable: detectors build a new one per frame, so it can be kept as a
+    snapshot without copying.
+    """
+
+    def __init__(self, ids=None, xyxy=None, conf=None, cls=None):
+        self.ids = np.zeros(0, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64).reshape(-1)
+        n = len(self.ids)
+        self.xyxy = np.zeros((0, 4)) if xyxy is None else np.asarray(xyxy, dtype=np.float64).reshape(n, 4)
+        self.conf = np.ones(n, dtype=np.float32) if conf is None else np.asarray(conf, dtype=np.float32).reshape(n)
+        self.cls = np.zeros(n, dtype=np.int64) if cls is None else np.asarray(cls, dtype=np.int64).reshape(n)
+        self._rows: Optional[Dict[int, int]] = None
+
+    @classmethod
+    def from_arrays(cls, xyxy, conf, classes, ids, keep_cls: Optional[int] = 0) -> "TrackBatch":
+        """Detector output arrays, keeping only class keep_cls (COCO 0: person; None keeps all)."""
+        classes = np.asarray(classes).astype(np.int64, copy=False).reshape(-1)
+        if keep_cls is None:
+            return cls(ids, xyxy, conf, classes)
+        keep = classes == keep_cls
+        return cls(np.asarray(ids)[keep], np.asarray(xyxy).reshape(-1, 4)[keep], np.asarray(conf)[keep], classes[keep])
+
+    @classmethod
+    def from_dict(cls, tracks: Dict[int, dict]) -> "TrackBatch":
+        """Batch for a {track_id: {"xyxy": ..., "conf": ...}} dict, in its order."""
+        n = len(tracks)
+        ids = np.fromiter(tracks.keys(), dtype=np.int64, count=n)
+        xyxy = np.array([tr["xyxy"] for tr in tracks.values()], dtype=np.float64).reshape(n, 4)
+        conf = np.fromiter((tr.get("conf", 1.0) for tr in tracks.values()), dtype=np.float32, count=n)
+        return cls(ids, xyxy, conf)
+
+    def _row_of(self) -> Dict[int, int]:
+        if self._rows is None:
+            self._rows = {tid: i for i, tid in enumerate(self.ids.tolist())}
+        return self._rows
+
+    def take(self, rows) -> "TrackBatch":
+        """Sub-batch of the given rows (an index array or a boolean mask)."""
+        return TrackBatch(self.ids[rows], self.xyxy[rows], self.conf[rows], self.cls[rows])
+
+    def select(self, tids: Iterable[int]) -> "TrackBatch":
+        """Sub-batch of the given track ids, in that order; unknown ids are skipped."""
+        rows = self._row_of()
+        return self.take(np.array([rows[t] for t in tids if t in rows], dtype=np.int64))
+
+    def __getitem__(self, tid) -> dict:
+        i = self._row_of()[tid]
+        return {"xyxy": self.xyxy[i].tolist(), "conf": float(self.conf[i])}
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, tid) -> bool:
+        return tid in self._row_of()
+
+    def __repr__(self) -> str:
+        return f"TrackBatch(ids={self.ids.tolist()})"
+
+
+def as_track_batch(tracks: Union[TrackBatch, Dict[int, dict], None]) -> TrackBatch:
+    """tracks as a TrackBatch; dicts in the old current_tracks format are converted."""
+    if isinstance(tracks, TrackBatch):
+        return tracks
+    return TrackBatch.from_dict(tracks) if tracks else TrackBatch()
+
+
+class TrackStore:
+    """
+    Per-track state for live tracks in preallocated NumPy arrays.
+
+    Every ByteTrack id gets a stable slot while it is alive; arrays are indexed by slot:
+      ids (C,), hist (C, history, 2) ring buffer of centers, hist_len / hist_head (C,),
+      gender (C,) GENDER_CODES, gconf (C,), first_seen / last_seen (C,) timestamps.
+    Tracks unseen for more than `ttl` seconds are evicted and their slots reused, so memory
+    follows the number of live tracks rather than the stream's lifetime.
+    Capacity doubles when more tracks are alive at once than it can hold.
+    """
+
+    def __init__(self, capacity: int = 256, history: int = 12, ttl: float = 5.0):
+        self.history_len = int(history)
+        self.ttl = float(ttl)
+        self.now = 0.0
+        self._alloc(int(capacity))
+        self.genders = GenderView(self)
+        self.confs = ConfView(self)
+        self.centers_hist = HistoryView(self)
+
+    def _alloc(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.hist = np.zeros((capacity, self.history_len, 2), dtype=np.int32)
+        self.hist_len = np.zeros(capacity, dtype=np.int16)
+        self.hist_head = np.zeros(capacity, dtype=np.int16)
+        self.gender = np.zeros(capacity, dtype=np.int8)
+        self.gconf = np.zeros(capacity, dtype=np.float32)
+        self.first_seen = np.zeros(capacity, dtype=np.float64)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.slot_of: Dict[int, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+
+    def _grow(self) -> None:
+        old = (self.ids, self.hist, self.hist_len, self.hist_head, self.gender, self.gconf, self.first_seen, self.last_seen)
+        slot_of, n = self.slot_of, self.capacity
+        self._alloc(n * 2)
+        for dst, src in zip((self.ids, self.hist, self.hist_len, self.hist_head, self.gender, self.gconf, self.first_seen, self.last_seen), old):
+            dst[:n] = src
+        self.slot_of = slot_of
+        self._free = list(range(self.capacity - 1, n - 1, -1))
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def __contains__(self, tid) -> bool:
+        return tid in self.slot_of
+
+    def clear(self) -> None:
+        self._alloc(self.capacity)
+
+    def slot(self, tid: int, now: float = None) -> int:
+        """Slot of tid, allocating a fresh one for unknown ids."""
+        s = self.slot_of.get(tid)
+        if s is not None:
+            return s
+        if now is None:
+            now = self.now
+        if not self._free:
+            self._grow()
+        s = self._free.pop()
+        self.slot_of[tid] = s
+        self.ids[s] = tid
+        self.hist_len[s] = 0
+        self.hist_head[s] = 0
+        self.gender[s] = GENDER_CODES["U"]
+        self.gconf[s] = 0.0
+        self.first_seen[s] = now
+        self.last_seen[s] = now
+        return s
+
+    def update(self, tracks: Union[TrackBatch, Dict[int, dict]], now: float) -> np.ndarray:
+        """
+        Record this frame's tracks: mark them seen and append their box centers to the history.
+        Returns their slots in tracks order.
+        """
+        self.now = now
+        batch = as_track_batch(tracks)
+        slots = np.fromiter((self.slot(tid, now) for tid in batch.ids.tolist()), dtype=np.int64, count=len(batch))
+        if len(slots) == 0:
+            return slots
+        boxes = batch.xyxy
+        # Same truncation as utils.center_of_box
+        centers = np.stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2), axis=1).astype(np.int32)
+        head = self.hist_head[slots]
+        self.hist[slots, head] = centers
+        self.hist_head[slots] = (head + 1) % self.history_len
+        self.hist_len[slots] = np.minimum(self.hist_len[slots] + 1, self.history_len)
+        self.last_seen[slots] = now
+        return slots
+
+    def oldest_centers(self, slots: np.ndarray) -> np.ndarray:
+        """(N,2) oldest stored center per slot (the left end of the old 12-entry deque)."""
+        oldest = (self.hist_head[slots] - self.hist_len[slots]) % self.history_len
+        return self.hist[slots, oldest]
+
+    def evict(self, now: float) -> int:
+        """Drop tracks unseen for more than ttl seconds; returns how many were evicted."""
+        live = self.ids >= 0
+        dead = np.flatnonzero(live & ((now - self.last_seen) > self.ttl))
+        for s in dead:
+            del self.slot_of[int(self.ids[s])]
+            self.ids[s] = -1
+            self._free.append(int(s))
+        return len(dead)
+
+
+class GenderView(MutableMapping):
+    """dict-like {track_id: "M"/"F"/"U"} over a TrackStore; unknown ids read as "U" (like the old defaultdict)."""
+
+    def __init__(self, store: TrackStore):
+        self._store = store
+
+    def __getitem__(self, tid) -> str:
+        s = self._store.slot_of.get(tid)
+        return "U" if s is None else GENDER_LETTERS[int(self._store.gender[s])]
+
+    def get(self, tid, default=None) -> str:
+        s = self._store.slot_of.get(tid)
+        return default if s is None else GENDER_LETTERS[int(self._store.gender[s])]
+
+    def __setitem__(self, tid, g: str) -> None:
+        self._store.gender[self._store.slot(tid)] = GENDER_CODES.get(g, 0)
+
+    def __delitem__(self, tid) -> None:
+        raise TypeError("Tracks are removed by TrackStore.evict")
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._store.slot_of))
+
+    def __len__(self) -> int:
+        return len(self._store.slot_of)
+
+    def __contains__(self, tid) -> bool:
+        return tid in self._store.slot_of
+
+
+class ConfView(GenderView):
+    """dict-like {track_id: gender confidence}; unknown ids read as 0.0."""
+
+    def __getitem__(self, tid) -> float:
+        s = self._store.slot_of.get(tid)
+        return 0.0 if s is None else float(self._store.gconf[s])
+
+    def get(self, tid, default=None) -> float:
+        s = self._store.slot_of.get(tid)
+        return default if s is None else float(self._store.gconf[s])
+
+    def __setitem__(self, tid, conf: float) -> None:
+        self._store.gconf[self._store.slot(tid)] = conf
+
+
+class HistoryView(Mapping):
+    """Read-only {track_id: [centers, oldest first]} for callers of the dict-based APIs."""
+
+    def __init__(self, store: TrackStore):
+        self._store = store
+
+    def __getitem__(self, tid) -> List[Tuple[int, int]]:
+        st = self._store
+        s = st.slot_of[tid]
+        n, head = int(st.hist_len[s]), int(st.hist_head[s])
+        idx = [(head - n + k) % st.history_len for k in range(n)]
+        return [tuple(int(v) for v in st.hist[s, k]) for k in idx]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._store.slot_of))
+
+    def __len__(self) -> int:
+        return len(self._store.slot_of)
@@ -1,7 +1,10 @@
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Union
 
 import cv2
+import numpy as np
 
+from .tracks import TrackBatch, as_track_batch
 from .utils import center_of_box, distance
 
 
@@ -23,15 +26,28 @@ FONT = cv2.FONT_HERSHEY_SIMPLEX
 
 
 def _draw_transparent_rect(img, x1, y1, x2, y2, color, alpha=0.85):
+    # Blend only the rectangle (inclusive corners, clipped to the image) instead of the whole frame
     x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-    overlay = img.copy()
-    cv2.rectangle(overlay, (x1, y1), (x2, y2), color, thickness=-1)
-    cv2.addWeighted(overlay, alpha, img, 1 - alpha, 0, img)
+    H, W = img.shape[:2]
+    xa, xb = max(0, min(x1, x2)), min(W - 1, max(x1, x2))
+    ya, yb = max(0, min(y1, y2)), min(H - 1, max(y1, y2))
+    if xa > xb or ya > yb:
+        return
+    roi = img[ya : yb + 1, xa : xb + 1]
+    patch = np.empty_like(roi)
+    patch[:] = color[: roi.shape[2]] if roi.ndim == 3 else color[0]
+    cv2.addWeighted(patch, alpha, roi, 1 - alpha, 0, roi)
+
+
+@lru_cache(maxsize=4096)
+def _measure(text, font_scale, thickness):
+    # Labels repeat every frame ("ID 12 (F)", chips, events), so cache cv2.getTextSize
+    return cv2.getTextSize(text, FONT, font_scale, thickness)
 
 
 def _draw_chip(img, x, y, text, bg_color, text_color=(255, 255, 255), font_scale=0.7, thickness=2, pad_x=10, pad_y=6, alpha=0.85):
     # Measure text
-    (tw, th), baseline = cv2.getTextSize(text, FONT, font_scale, thickness)
+    (tw, th), baseline = _measure(text, font_scale, thickness)
     w, h = tw + 2 * pad_x, th + 2 * pad_y
 
     # Background
@@ -46,13 +62,13 @@ def _draw_chip(img, x, y, text, bg_color, text_color=(255, 255, 255), font_scale
 
 
 def _text_size(text, font_scale, thickness):
-    (tw, th), _ = cv2.getTextSize(text, FONT, font_scale, thickness)
+    (tw, th), _ = _measure(text, font_scale, thickness)
     return tw, th
 
 
 def draw_frame(
     frame,
-    tracks: Dict[int, dict],
+    tracks: Union[TrackBatch, Dict[int, dict]],
     genders: Dict[int, str],
     male_count: int,
     female_count: int,
@@ -61,9 +77,19 @@ def draw_frame(
     score: int,
     fps: float = None,
     compact: bool = True,  # compact HUD by default (less clutter)
+    out=None,
 ):
+    """
+    Returns an annotated copy of frame. Pass out (same shape/dtype as frame) to reuse a buffer
+    across frames, or out=frame to draw in place.
+    """
     H, W = frame.shape[:2]
-    frame_vis = frame.copy()
+    if out is None:
+        frame_vis = frame.copy()
+    else:
+        if out is not frame:
+            np.copyto(out, frame)
+        frame_vis = out
 
     # Scale UI based on width
     s = max(0.6, min(1.3, W / 1280.0))
@@ -73,14 +99,14 @@ def draw_frame(
     pad = int(10 * s)
 
     # 1) Draw person boxes and compact labels
-    for tid, tr in tracks.items():
-        x1, y1, x2, y2 = [int(v) for v in tr["xyxy"]]
+    tracks = as_track_batch(tracks)
+    for tid, (x1, y1, x2, y2) in zip(tracks.ids.tolist(), tracks.xyxy.astype(np.int64).tolist()):
         g = genders.get(tid, "U")
         color = COLORS.get(g, (200, 200, 200))
         cv2.rectangle(frame_vis, (x1, y1), (x2, y2), color, 2)
         # Shorter label: "ID 12 (F/M/U)"
         label = f"ID {tid} ({g})"
-        (tw, th), _ = cv2.getTextSize(label, FONT, small_font, thick)
+        tw, th = _text_size(label, small_font, thick)
         # Semi-transparent label background
         bx2 = x1 + tw + pad
         by1 = max(0, y1 - th - int(8 * s))
@@ -146,8 +172,8 @@ def draw_frame(
 
     # 6) Optional proximity lines (turned off in compact mode to reduce clutter)
     if not compact:
-        tids = list(tracks.keys())
-        centers = {tid: center_of_box(tracks[tid]["xyxy"]) for tid in tids}
+        tids = tracks.ids.tolist()
+        centers = {tid: center_of_box(box) for tid, box in zip(tids, tracks.xyxy.tolist())}
         frame_diag = (W**2 + H**2) ** 0.5
         for fid in [t for t in tids if genders.get(t) == "F"]:
             for mid in [t for t in tids if genders.get(t) == "M"]:
@@ -0,0 +1,575 @@
+import functools
+import multiprocessing as mp
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Generator, List, Optional
+
+from .dispatch import ALERT_BACKLOG
+from .history import HISTORY_BACKLOG
+from .encoder import FrameEncoder
+from .metrics import StageMetrics
+from .stream import CameraStream, FeedPublisher, FrameHub, TieredHub
+
+# Worker states shared with the parent through an mp.Value
+STARTING, IDLE, STREAMING, RECONNECTING, FAILED = range(5)
+STATE_NAMES = {
+    STARTING: "starting",
+    IDLE: "idle",
+    STREAMING: "streaming",
+    RECONNECTING: "reconnecting",
+    FAILED: "failed",
+}
+
+_ctx = mp.get_context("spawn")
+
+
+def _build_pipeline(cfg, gender_est=None, metrics=None, alerts=None, history=None):
+    import os
+
+    from .alert import RatioAlert
+    from .models import registry
+    from .pipeline import AnalyticsPipeline
+
+    if gender_est is None:
+        gender_est = registry.gender_estimator(providers=cfg.providers, warmup=cfg.warmup, memory_ttl=cfg.face_memory_ttl)
+    # Alerts are printed / logged by the parent's AlertDispatcher, not from the frame loop
+    ratio_alert = RatioAlert(threshold=cfg.ratio_threshold, cooldown_seconds=cfg.ratio_cooldown, require_female=True, verbose=False)
+    record_dir = os.path.join(cfg.record_dir, cfg.cam_id) if cfg.record_dir else None
+    return AnalyticsPipeline(
+        gender_est,
+        ratio_alert,
+        face_every_n=cfg.face_every_n,
+        face_async=cfg.face_async,
+        metrics=metrics,
+        record_dir=record_dir,
+        alerts=alerts,
+        history=history,
+    )
+
+
+def _build_detector(cfg, pipeline, metrics):
+    """PersonDetector for one camera; with detect_min_fps set, YOLO runs at a motion- and risk-driven rate."""
+    from .gating import AdaptiveRate
+    from .models import registry
+
+    detector = registry.person_detector(
+        cfg.model,
+        export=cfg.export,
+        warmup=cfg.warmup,
+        backend=cfg.backend,
+        quantize=cfg.quantize,
+        calibration=cfg.calibration,
+        intra_op_threads=cfg.intra_op_threads,
+        inter_op_threads=cfg.inter_op_threads,
+    )
+    detector.metrics = metrics
+    if cfg.detect_min_fps is not None:
+        detector.rate = AdaptiveRate(
+            min_fps=cfg.detect_min_fps,
+            max_fps=cfg.detect_max_fps,
+            motion_threshold=cfg.motion_threshold,
+            risk_level=lambda: pipeline.risk_level,
+        )
+    return detector
+
+
+class _WorkerChannel:
+    """
+    What a worker process gets for one camera: pipes to the parent (annotated and raw MJPEG, one per
+    tier; overlay metadata; alerts and history buckets) and the flags and counters it shares with
+    its CameraChannel.
+    """
+
+    def __init__(self, ch: "CameraChannel", conns, raw_conns, overlay_conn, outbox_conn):
+        self.conns = conns
+        self.raw_conns = raw_conns
+        self.overlay_conn = overlay_conn
+        self.outbox_conn = outbox_conn
+        self.wanted = ch.wanted
+        self.tier_wanted = ch.tier_wanted
+        self.raw_wanted = ch.raw_wanted
+        self.overlay_wanted = ch.overlay_wanted
+        self.state = ch.state
+        self.last_frame_ts = ch.last_frame_ts
+        self.metrics_buf = ch.metrics_buf
+
+    def close(self) -> None:
+        """Close the parent's copies of the child ends once the worker has them."""
+        for conn in self.conns + self.raw_conns + [self.overlay_conn, self.outbox_conn]:
+            conn.close()
+
+
+def _tier_sender(conns, stop):
+    """publish(tier, part) for FrameEncoder: one pipe per tier, each guarded against concurrent encoder threads."""
+    locks = [threading.Lock() for _ in conns]
+
+    def publish(tier: int, part: bytes) -> None:
+        try:
+            with locks[tier]:
+                conns[tier].send_bytes(part)
+        except (BrokenPipeError, EOFError, OSError):
+            stop.set()  # parent went away
+
+    return publish
+
+
+def _overlay_sender(conn, stop):
+    """publish(event) for overlay metadata; called from the frame loop only."""
+
+    def publish(event: bytes) -> None:
+        try:
+            conn.send_bytes(event)
+        except (BrokenPipeError, EOFError, OSError):
+            stop.set()  # parent went away
+
+    return publish
+
+
+def _outbox_sender(outboxes, conn, stop, interval: float = 0.1) -> None:
+    """
+    Forward a pipeline's alerts and history buckets to the parent in batches, so the frame loop
+    only appends to deques. outboxes maps a CameraChannel attribute name to the deque feeding it.
+    """
+    try:
+        while not stop.wait(interval):
+            batch = {name: [box.popleft() for _ in range(len(box))] for name, box in outboxes.items() if box}
+            if batch:
+                conn.send(batch)
+    except (BrokenPipeError, EOFError, OSError):
+        pass  # parent went away
+
+
+def _camera_loop(cfg, detector, pipeline, chan: _WorkerChannel, stop, max_backoff: float) -> None:
+    """
+    Streams one camera's feeds while `wanted` is set: every annotated tier flagged in `tier_wanted`
+    and raw tier flagged in `raw_wanted` is encoded off-thread and sent on its pipe, and overlay
+    metadata goes out per frame while `overlay_wanted` is set.
+    Reconnects with exponential backoff when the source drops.
+    """
+    encoder = FrameEncoder(cfg.jpeg_tiers, threads=cfg.encode_threads, metrics=pipeline.metrics)
+    raw_encoder = FrameEncoder(cfg.jpeg_tiers, threads=1, max_inflight=1)
+    detector.metrics = pipeline.metrics
+    feeds = FeedPublisher(
+        encoder,
+        raw_encoder,
+        cfg.raw_video_fps,
+        _tier_sender(chan.conns, stop),
+        _tier_sender(chan.raw_conns, stop),
+        _overlay_sender(chan.overlay_conn, stop),
+    )
+    wanted, tier_wanted, raw_wanted, state = chan.wanted, chan.tier_wanted, chan.raw_wanted, chan.state
+    backoff = 1.0
+    while not stop.is_set():
+        state.value = IDLE
+        if not wanted.wait(0.5):
+            continue
+
+        pipeline.reset()
+        got_frame = False
+        try:
+            for frame in detector.track_stream(source=cfg.source, conf=cfg.conf, iou=cfg.iou, tracker=cfg.tracker):
+                if stop.is_set() or not wanted.is_set():
+                    break
+                if frame is None:
+                    continue
+                feeds.process(
+                    pipeline,
+                    frame,
+                    detector.current_tracks,
+                    [t for t in range(len(tier_wanted)) if tier_wanted[t]],
+                    [t for t in range(len(raw_wanted)) if raw_wanted[t]],
+                    bool(chan.overlay_wanted.value),
+                )
+                chan.last_frame_ts.value = time.time()
+                if not got_frame:
+                    got_frame = True
+                    state.value = STREAMING
+                    backoff = 1.0
+            else:
+                # Source ended on its own (file EOF or dropped RTSP connection)
+                print(f"[camera {cfg.cam_id}] stream ended, reconnecting in {backoff:.0f}s")
+                state.value = RECONNECTING
+        except Exception as exc:
+            print(f"[camera {cfg.cam_id}] stream error: {exc!r}, reconnecting in {backoff:.0f}s")
+            state.value = RECONNECTING
+
+        if pipeline.history is not None:
+            pipeline.history.flush()  # the last partial second
+        if state.value == RECONNECTING:
+            stop.wait(backoff)
+            backoff = min(max_backoff, backoff * 2)
+    feeds.shutdown()
+
+
+def _outboxes() -> dict:
+    return {"alerts": deque(maxlen=ALERT_BACKLOG), "history": deque(maxlen=HISTORY_BACKLOG)}
+
+
+def _worker_main(cfgs, channels, stop, max_backoff: float) -> None:
+    """
+    Entry point of a worker process. A single camera runs its own PersonDetector; a batch group
+    shares one BatchedDetector and one GenderEstimator, with a pipeline thread per camera.
+    Models come from the process's ModelRegistry and are warmed up before streaming starts.
+    `channels` holds a _WorkerChannel per camera, in cfgs order.
+    """
+    t0 = time.perf_counter()
+    try:
+        if len(cfgs) == 1 and cfgs[0].batch_group is None:
+            pipelines = [_build_pipeline(cfgs[0], metrics=StageMetrics(channels[0].metrics_buf), **_outboxes())]
+            detectors = [_build_detector(cfgs[0], pipelines[0], pipelines[0].metrics)]
+        else:
+            from .models import registry
+
+            lead = cfgs[0]
+            batched = registry.batched_detector(
+                lead.model,
+                export=lead.export,
+                warmup=lead.warmup,
+                max_batch=lead.batch_size,
+                max_wait_ms=lead.batch_wait_ms,
+                iou=lead.iou,
+            )
+            detectors = [batched.add_stream(c.cam_id, c.source, conf=c.conf, tracker=c.tracker) for c in cfgs]
+            pipelines = [_build_pipeline(c, metrics=StageMetrics(ch.metrics_buf), **_outboxes()) for c, ch in zip(cfgs, channels)]
+    except Exception:
+        traceback.print_exc()
+        for ch in channels:
+            ch.state.value = FAILED
+        return
+
+    load_seconds = time.perf_counter() - t0
+    print(f"[camera worker {', '.join(c.cam_id for c in cfgs)}] models ready in {load_seconds:.1f}s")
+    for pipeline, ch in zip(pipelines, channels):
+        pipeline.metrics.set("model_load_seconds", load_seconds)
+        outboxes = {"alerts": pipeline.alerts, "history": pipeline.history.out}
+        threading.Thread(target=_outbox_sender, args=(outboxes, ch.outbox_conn, stop), name="outbox-sender", daemon=True).start()
+
+    threads = []
+    for cfg, detector, pipeline, ch in zip(cfgs, detectors, pipelines, channels):
+        args = (cfg, detector, pipeline, ch, stop, max_backoff)
+        if len(cfgs) == 1:
+            _camera_loop(*args)
+            return
+        t = threading.Thread(target=_camera_loop, args=args, name=f"camera-{cfg.cam_id}", daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+
+class ThreadCameraWorker:
+    """In-process worker around CameraStream; handy for a single local webcam and debugging."""
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.metrics = StageMetrics()
+        self.alerts = deque(maxlen=ALERT_BACKLOG)  # drained by the registry's AlertDispatcher
+        self.history = deque(maxlen=HISTORY_BACKLOG)  # drained by the registry's HistoryStore
+        self._stream: Optional[CameraStream] = None
+        self._lock = threading.Lock()
+
+    def _ensure_stream(self) -> CameraStream:
+        with self._lock:
+            if self._stream is None:
+                t0 = time.perf_counter()
+                pipeline = _build_pipeline(self.cfg, metrics=self.metrics, alerts=self.alerts, history=self.history)
+                detector = _build_detector(self.cfg, pipeline, self.metrics)
+                self.metrics.set("model_load_seconds", time.perf_counter() - t0)
+                self._stream = CameraStream(
+                    detector,
+                    pipeline,
+                    source=self.cfg.source,
+                    conf=self.cfg.conf,
+                    iou=self.cfg.iou,
+                    tracker=self.cfg.tracker,
+                    idle_timeout=self.cfg.idle_timeout,
+                    encoder=FrameEncoder(self.cfg.jpeg_tiers, threads=self.cfg.encode_threads, metrics=self.metrics),
+                    raw_fps=self.cfg.raw_video_fps,
+                )
+            return self._stream
+
+    def frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        return self._ensure_stream().frames(tier, adaptive)
+
+    def raw_frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        return self._ensure_stream().raw_frames(tier, adaptive)
+
+    def overlay_events(self) -> Generator[bytes, None, None]:
+        return self._ensure_stream().overlay_events()
+
+    def health(self) -> dict:
+        s = self._stream
+        return {
+            "worker": "thread",
+            "state": "streaming" if s is not None and s.running else "idle",
+            "subscribers": s.subscribers if s is not None else 0,
+            "overlay_subscribers": s.overlay_hub.subscribers if s is not None else 0,
+            "restarts": 0,
+            "time_to_first_frame": s.ttff if s is not None else None,
+        }
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop(timeout=5.0)
+
+
+class CameraChannel:
+    """
+    Parent-side view of one camera hosted in a ProcessCameraWorker: its viewer hubs (annotated
+    tiers, raw tiers, overlay metadata; see stream.FeedPublisher) plus the flags and counters
+    shared with the worker process. tier_wanted / raw_wanted / overlay_wanted tell the worker
+    which feeds have viewers, so only those are produced.
+    """
+
+    def __init__(self, cfg, worker: "ProcessCameraWorker"):
+        self.cfg = cfg
+        self.worker = worker
+        self.hub = TieredHub(cfg.jpeg_tiers)
+        self.raw_hub = TieredHub(cfg.jpeg_tiers)
+        self.overlay_hub = FrameHub()
+        self.wanted = _ctx.Event()
+        self.tier_wanted = _ctx.Array("b", len(cfg.jpeg_tiers), lock=False)
+        self.raw_wanted = _ctx.Array("b", len(cfg.jpeg_tiers), lock=False)
+        self.overlay_wanted = _ctx.Value("b", 0, lock=False)
+        self.hub.on_subscribe = functools.partial(self._on_subscribe, self.tier_wanted)
+        self.raw_hub.on_subscribe = functools.partial(self._on_subscribe, self.raw_wanted)
+        self.overlay_hub.on_subscribe = functools.partial(self._on_subscribe, self.overlay_wanted, None)
+        # Written by the worker process, read here for /metrics
+        self.metrics_buf = _ctx.RawArray("d", StageMetrics.SIZE)
+        self.metrics = StageMetrics(self.metrics_buf)
+        # Filled from the worker's outbox pipe, drained by the registry's AlertDispatcher / HistoryStore
+        self.alerts = deque(maxlen=ALERT_BACKLOG)
+        self.history = deque(maxlen=HISTORY_BACKLOG)
+        self.state = _ctx.Value("i", STARTING, lock=False)
+        self.last_frame_ts = _ctx.Value("d", 0.0, lock=False)
+        self.idle_since: Optional[float] = None
+        # Time to first frame: from the viewer that started streaming to the first part received
+        self.ttff: Optional[float] = None
+        self._waiting_since: Optional[float] = None
+
+    @property
+    def subscribers(self) -> int:
+        return self.hub.subscribers + self.raw_hub.subscribers + self.overlay_hub.subscribers
+
+    def _on_subscribe(self, flags, tier: Optional[int]) -> None:
+        if self._waiting_since is None and self.state.value != STREAMING:
+            self._waiting_since = time.monotonic()
+        if tier is None:
+            flags.value = 1
+        else:
+            flags[tier] = 1
+        self.wanted.set()
+        self.worker.ensure_started()
+
+    def _received(self) -> None:
+        since = self._waiting_since
+        if since is not None:
+            self._waiting_since = None
+            self.ttff = time.monotonic() - since
+            print(f"[camera {self.cfg.cam_id}] first frame after {self.ttff:.2f}s")
+
+    def update_demand(self) -> None:
+        """Stop producing feeds nobody watches, and streaming after idle_timeout without viewers."""
+        for flags, tiered in ((self.tier_wanted, self.hub), (self.raw_wanted, self.raw_hub)):
+            for t, hub in enumerate(tiered.hubs):
+                if hub.subscribers == 0:
+                    flags[t] = 0
+        if self.overlay_hub.subscribers == 0:
+            self.overlay_wanted.value = 0
+        if self.subscribers > 0:
+            self.idle_since = None
+            self.wanted.set()
+        elif self.wanted.is_set():
+            if self.idle_since is None:
+                self.idle_since = time.monotonic()
+            elif time.monotonic() - self.idle_since >= self.cfg.idle_timeout:
+                self.wanted.clear()
+
+    def stalled(self) -> bool:
+        if not self.wanted.is_set() or self.state.value != STREAMING:
+            return False
+        return (time.time() - self.last_frame_ts.value) > self.cfg.stall_timeout
+
+    def frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        return self.hub.frames(tier, adaptive)
+
+    def raw_frames(self, tier: int = 0, adaptive: bool = True) -> Generator[bytes, None, None]:
+        return self.raw_hub.frames(tier, adaptive)
+
+    def overlay_events(self) -> Generator[bytes, None, None]:
+        return self.overlay_hub.subscribe()
+
+    def _hubs(self) -> list:
+        return [self.hub, self.raw_hub, self.overlay_hub]
+
+    def health(self) -> dict:
+        proc = self.worker.proc
+        last = self.last_frame_ts.value
+        return {
+            "worker": "process",
+            "batch_group": self.cfg.batch_group,
+            "pid": proc.pid if proc is not None else None,
+            "alive": bool(proc is not None and proc.is_alive()),
+            "state": STATE_NAMES.get(self.state.value, "unknown") if proc is not None else "not started",
+            "subscribers": self.subscribers,
+            "tier_subscribers": [h.subscribers for h in self.hub.hubs],
+            "raw_tier_subscribers": [h.subscribers for h in self.raw_hub.hubs],
+            "overlay_subscribers": self.overlay_hub.subscribers,
+            "last_frame_age": (time.time() - last) if last > 0 else None,
+            "restarts": self.worker.restarts,
+            "time_to_first_frame": self.ttff,
+            "model_load_seconds": self.metrics.gauge("model_load_seconds") or None,
+        }
+
+    def stop(self) -> None:
+        self.worker.stop()
+
+
+class ProcessCameraWorker:
+    """
+    Runs one camera (or one batch group of cameras) in a dedicated process: detector, per-track
+    state and encoders all live there and the parent only fans out encoded parts (one pipe per
+    tier) and overlay metadata. A supervisor
+    thread toggles streaming on viewer demand and restarts the process (with backoff) when it
+    dies or a camera stops producing frames.
+    """
+
+    def __init__(self, cfgs: List, max_backoff: float = 30.0, poll_interval: float = 0.5):
+        self.cfgs = list(cfgs)
+        self.name = self.cfgs[0].batch_group or self.cfgs[0].cam_id
+        self.max_backoff = float(max_backoff)
+        self.poll_interval = float(poll_interval)
+        self.channels = [CameraChannel(c, self) for c in self.cfgs]
+        self.restarts = 0
+        self.proc = None
+
+        self._lock = threading.Lock()
+        self._stop = _ctx.Event()
+        self._supervisor: Optional[threading.Thread] = None
+        self._shutdown = threading.Event()
+        self._next_start = 0.0
+        self._backoff = 1.0
+
+    def _spawn(self) -> None:
+        child_channels = []
+        for ch in self.channels:
+            conns = [self._pipe(ch, hub.publish, f"reader-{t}") for t, hub in enumerate(ch.hub.hubs)]
+            raw_conns = [self._pipe(ch, hub.publish, f"raw-reader-{t}") for t, hub in enumerate(ch.raw_hub.hubs)]
+            overlay_conn = self._pipe(ch, ch.overlay_hub.publish, "overlay-reader")
+            parent_conn, outbox_conn = _ctx.Pipe(duplex=False)
+            threading.Thread(target=self._outbox_reader, args=(parent_conn, ch), name=f"camera-{ch.cfg.cam_id}-outbox", daemon=True).start()
+            ch.state.value = STARTING
+            ch.last_frame_ts.value = 0.0
+            child_channels.append(_WorkerChannel(ch, conns, raw_conns, overlay_conn, outbox_conn))
+        self._stop.clear()
+        self.proc = _ctx.Process(
+            target=_worker_main,
+            args=(self.cfgs, child_channels, self._stop, self.max_backoff),
+            name=f"camera-worker-{self.name}",
+            daemon=True,
+        )
+        self.proc.start()
+        for child in child_channels:
+            child.close()
+
+    def _pipe(self, ch: CameraChannel, publish, name: str):
+        """A pipe from the worker whose messages a reader thread passes to publish(); returns the child end."""
+        parent_conn, child_conn = _ctx.Pipe(duplex=False)
+        threading.Thread(target=self._reader, args=(parent_conn, ch, publish), name=f"camera-{ch.cfg.cam_id}-{name}", daemon=True).start()
+        return child_conn
+
+    @staticmethod
+    def _reader(conn, ch: CameraChannel, publish) -> None:
+        try:
+            while True:
+                publish(conn.recv_bytes())
+                ch._received()
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _outbox_reader(conn, ch: CameraChannel) -> None:
+        try:
+            while True:
+                for name, items in conn.recv().items():
+                    getattr(ch, name).extend(items)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def _kill(self) -> None:
+        proc = self.proc
+        if proc is None:
+            return
+        self._stop.set()
+        proc.join(3.0)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join(2.0)
+        self.proc = None
+
+    def ensure_started(self) -> None:
+        with self._lock:
+            if self._supervisor is None and not self._shutdown.is_set():
+                self._spawn()
+                self._supervisor = threading.Thread(target=self._supervise, name=f"camera-worker-{self.name}-supervisor", daemon=True)
+                self._supervisor.start()
+
+    def _supervise(self) -> None:
+        while not self._shutdown.wait(self.poll_interval):
+            for ch in self.channels:
+                ch.update_demand()
+
+            # Health: restart a dead or stalled worker, backing off on repeated failures
+            with self._lock:
+                proc = self.proc
+                dead = proc is None or not proc.is_alive()
+                stalled = [ch.cfg.cam_id for ch in self.channels if ch.stalled()]
+                if not dead and not stalled:
+                    if any(ch.state.value == STREAMING for ch in self.channels):
+                        self._backoff = 1.0
+                    continue
+                if time.monotonic() < self._next_start:
+                    continue
+                reason = "exited" if dead else f"stalled on {', '.join(stalled)}"
+                print(f"[camera worker {self.name}] {reason}, restarting")
+                self._kill()
+                self._spawn()
+                self.restarts += 1
+                self._next_start = time.monotonic() + self._backoff
+                self._backoff = min(self.max_backoff, self._backoff * 2)
+
+    def stop(self) -> None:
+        self._shutdown.set()
+        for ch in self.channels:
+            ch.wanted.clear()
+        with self._lock:
+            self._kill()
+        for ch in self.channels:
+            for hub in ch._hubs():
+                hub.close()
+
+
+def make_workers(cfgs: List) -> dict:
+    """Return {cam_id: worker} with cameras sharing a batch_group mapped to one process."""
+    workers = {}
+    groups = {}
+    for cfg in cfgs:
+        if cfg.worker == "thread":
+            workers[cfg.cam_id] = ThreadCameraWorker(cfg)
+        elif cfg.batch_group is not None:
+            groups.setdefault(cfg.batch_group, []).append(cfg)
+        else:
+            workers[cfg.cam_id] = ProcessCameraWorker([cfg]).channels[0]
+    for name, group_cfgs in groups.items():
+        if len({(c.model, c.export) for c in group_cfgs}) > 1:
+            raise ValueError(f"Batch group '{name}': all cameras must use the same model and export")
+        for ch in ProcessCameraWorker(group_cfgs).channels:
+            workers[ch.cfg.cam_id] = ch
+    # Keep config order
+    return {cfg.cam_id: workers[cfg.cam_id] for cfg in cfgs}